@@ -1,29 +1,153 @@
 import sys
 import os
+import argparse
 import logging
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-try:
-    from coco_to_yolo import Coco_to_yolo
-    import train_pt
-    import main as vision_l
-    import config
+# config and log_setup have no heavy imports, every subsystem below
+# is imported by the action that needs it, on first use.
+import config
+import log_setup
 
 
-    logging.basicConfig(
-        level = config.LOG_LEVEL,
-        format = config.LOG_FORMAT,
-        filename = str(config.LOG_FILE),
-    )
-    # from src import
+def setup_logging():
+    log_setup.setup_logging()
 
 
-
-except ImportError as e:
+def report_import_error(e):
     print(f"Import Error: {e}")
     logging.error(f"Import Error: {e}")
-    sys.exit(1)
+
+
+# --- Actions ---
+def run_convert(extra = None):
+    print("\n[Action] Starting Data Conversion...")
+    try:
+        from coco_to_yolo import Coco_to_yolo
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    # Principle: Instantiate the converter class and convert every split in one pass.
+    converter = Coco_to_yolo()
+    converter.run_splits()
+    return 0
+
+
+def run_train(extra = None):
+    print("\n[Action] Starting Model Training...")
+    try:
+        import train_pt
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    # Principle: Call the encapsulated training function.
+    try:
+        train_pt.train_custom_model()
+    except AttributeError:
+        print("Error: 'train_custom_model' function not found in train_pt.py")
+        return 1
+    return 0
+
+
+def run_vision(extra = None):
+    print("\n[Action] Launching Vision System GUI...")
+    try:
+        import main as vision_l
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    # Principle: Run the main function from your vision_app (main.py).
+    vision_l.main()
+    return 0
+
+
+def run_benchmark(extra = None):
+    try:
+        import benchmark
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    return benchmark.main(extra or [])
+
+
+def run_batch(extra = None):
+    try:
+        import batch_infer
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    return batch_infer.main(extra or [])
+
+
+def run_sweep(extra = None):
+    try:
+        import sweep
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    return sweep.main(extra or [])
+
+
+def run_cache(extra = None):
+    # Build the training image cache and report the decode time it saves
+    try:
+        import image_cache
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    image_cache.report_cache_savings()
+    return 0
+
+
+def run_calender(extra = None):
+    try:
+        from calender import Calender
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    extra = extra or []
+    calender = Calender()
+    calender.sync_log()
+    calender.print_hourly(extra[0] if extra else "Dog",
+                          int(extra[1]) if len(extra) > 1 else config.CALENDER_DAYS)
+    return 0
+
+
+def run_quantize(extra = None):
+    try:
+        import quantize
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    return quantize.main(extra or [])
+
+
+def run_importtime(extra = None):
+    try:
+        import import_benchmark
+    except ImportError as e:
+        report_import_error(e)
+        return 1
+    return import_benchmark.main(extra or [])
+
+
+# name -> (action, help, accepts extra arguments)
+COMMANDS = {
+    "convert": (run_convert, "COCO to YOLO data conversion", False),
+    "train": (run_train, "start model training", False),
+    "vision": (run_vision, "run the vision system", False),
+    "benchmark": (run_benchmark, "headless replay benchmark, options as in benchmark.py", True),
+    "batch": (run_batch, "offline detection over image folders and videos, options as in batch_infer.py", True),
+    "sweep": (run_sweep, "hyperparameter sweep over train_pt, options as in sweep.py", True),
+    "cache": (run_cache, "build the training image cache and report the decode time saved", False),
+    "calender": (run_calender, "hourly activity: [class_name] [days]", True),
+    "quantize": (run_quantize, "INT8 builds with an accuracy vs latency report, options as in quantize.py", True),
+    "importtime": (run_importtime, "import time of the entry points, options as in import_benchmark.py", True),
+}
+
+MENU_ACTIONS = {'1': run_convert, '2': run_train, '3': run_vision}
+
 
 def print_menu():
 
@@ -38,44 +162,13 @@ def print_menu():
     print("="*30)
 
 
-
-def main():
+def interactive():
     while True:
         print_menu()
         choice = input("Enter your choice (1-4): ").strip()
 
-        if choice == '1':
-            print("\n[Action] Starting Data Conversion...")
-            # Principle: Instantiate the converter class and execute processing logic.
-            converter = Coco_to_yolo()
-            converter.run(
-                config.COCO_TRAIN_JSON_PATH,
-                config.COCO_TRAIN_IMG_PATH,
-                config.TRAIN_IMAGES_DIR,
-                config.TRAIN_LABELS_DIR,
-                )
-    
-            converter.run(
-                        config.COCO_VAL_JSON_PATH,
-                        config.COCO_VAL_IMG_PATH,
-                        config.VAL_IMAGES_DIR,
-                        config.VAL_LABELS_DIR,
-                        )
-
-        elif choice == '2':
-            print("\n[Action] Starting Model Training...")
-            # Principle: Call the encapsulated training function.
-            # Ensure you have a start_training function defined in src/train.py
-            try:
-                # Replace with your actual YAML config path
-                train_pt.train_custom_model() 
-            except AttributeError:
-                print("Error: 'start_training' function not found in train.py")
-
-        elif choice == '3':
-            print("\n[Action] Launching Vision System GUI...")
-            # Principle: Run the main function from your vision_app (main.py).
-            vision_l.main()
+        if choice in MENU_ACTIONS:
+            MENU_ACTIONS[choice]()
 
         elif choice == '4':
             print("Exiting system. Goodbye!")
@@ -84,5 +177,26 @@ def main():
         else:
             print("Invalid selection, please try again.")
 
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "AI project master control, no command opens the menu")
+    subparsers = parser.add_subparsers(dest = "command")
+    for name, (_, help_text, _) in COMMANDS.items():
+        subparsers.add_parser(name, help = help_text, add_help = not COMMANDS[name][2])
+    args, extra = parser.parse_known_args(argv)
+
+    setup_logging()
+    if args.command is None:
+        if extra:
+            parser.error(f"unrecognized arguments: {' '.join(extra)}")
+        interactive()
+        return 0
+
+    action, _, accepts_extra = COMMANDS[args.command]
+    if extra and not accepts_extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return action(extra)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
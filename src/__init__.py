@@ -1,5 +1,22 @@
-from .vision_module import PETDetection
-from .train_pt import train_custom_model
-from .main import main
+import importlib
 
-__version__ = "1.0.3"
\ No newline at end of file
+__version__ = "1.0.3"
+
+# Public name -> submodule, imported on first access so `import src` stays cheap
+_LAZY_EXPORTS = {
+    "PETDetection": "vision_module",
+    "train_custom_model": "train_pt",
+    "main": "main",
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{_LAZY_EXPORTS[name]}", __name__)
+    value = getattr(module, name)
+    # Cache, later lookups no longer go through __getattr__
+    globals()[name] = value
+    return value
@@ -0,0 +1,278 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import wave
+import numpy as np
+import config
+from metrics import REGISTRY
+
+
+# --- Audio sources: yield (int16 mono chunk) of chunk_size frames ---
+class WavSource:
+    def __init__(self, path, chunk_size = None):
+        self.path = str(path)
+        self.chunk_size = chunk_size or config.AUDIO_CHUNK_SIZE
+        with wave.open(self.path, 'rb') as wav:
+            self.rate = wav.getframerate()
+
+    def __iter__(self):
+        with wave.open(self.path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"{self.path}: only 16-bit PCM WAV files are supported")
+            channels = wav.getnchannels()
+            while True:
+                data = wav.readframes(self.chunk_size)
+                if not data:
+                    return
+                chunk = np.frombuffer(data, dtype = np.int16)
+                if channels > 1:
+                    chunk = chunk.reshape(-1, channels).mean(axis = 1).astype(np.int16)
+                yield chunk
+
+
+class MicSource:
+    def __init__(self, rate = None, chunk_size = None, device = None):
+        try:
+            import sounddevice
+        except ImportError as e:
+            raise ImportError("Microphone input needs the 'sounddevice' package") from e
+        self._sounddevice = sounddevice
+        self.rate = rate or config.AUDIO_SAMPLE_RATE
+        self.chunk_size = chunk_size or config.AUDIO_CHUNK_SIZE
+        self.device = device
+        self.running = True
+
+    def __iter__(self):
+        with self._sounddevice.InputStream(samplerate = self.rate, channels = 1, dtype = 'int16',
+                                           blocksize = self.chunk_size, device = self.device) as stream:
+            while self.running:
+                data, _ = stream.read(self.chunk_size)
+                yield data[:, 0].copy()
+
+
+class EnergyVAD:
+    """
+    Energy based voice activity detection: a chunk is voiced when its RMS is above
+    `threshold`, a segment ends after `silence` seconds without voiced chunks.
+    """
+    def __init__(self, rate, chunk_size = None, threshold = None, silence = None, min_seconds = None):
+        self.rate = rate
+        self.chunk_size = chunk_size or config.AUDIO_CHUNK_SIZE
+        self.threshold = config.AUDIO_VAD_THRESHOLD if threshold is None else threshold
+        silence = config.AUDIO_SILENCE_SECONDS if silence is None else silence
+        self.silence_chunks = max(1, int(silence * rate / self.chunk_size))
+        min_seconds = config.AUDIO_MIN_SEGMENT if min_seconds is None else min_seconds
+        self.min_samples = int(min_seconds * rate)
+
+        self._chunks = []
+        self._quiet = 0
+
+    @property
+    def in_speech(self):
+        return bool(self._chunks)
+
+    def process(self, chunk):
+        # Returns a finished int16 segment or None
+        rms = float(np.sqrt(np.mean(chunk.astype(np.float32) ** 2))) if len(chunk) else 0.0
+        if rms >= self.threshold:
+            self._chunks.append(chunk)
+            self._quiet = 0
+            return None
+        if not self._chunks:
+            return None
+        # Keep trailing silence so words are not cut off
+        self._chunks.append(chunk)
+        self._quiet += 1
+        if self._quiet >= self.silence_chunks:
+            return self.flush()
+        return None
+
+    def flush(self):
+        chunks, self._chunks, self._quiet = self._chunks, [], 0
+        if not chunks:
+            return None
+        segment = np.concatenate(chunks)
+        return segment if len(segment) >= self.min_samples else None
+
+
+# --- Transcribers: picklable callables (audio float32 [-1, 1], rate) -> text ---
+class WhisperTranscriber:
+    def __init__(self, model_name = None):
+        self.model_name = model_name or config.WHISPER_MODEL_NAME
+        self._model = None
+
+    def __call__(self, audio, rate):
+        if self._model is None:
+            import whisper
+            self._model = whisper.load_model(self.model_name)
+        if rate != 16000:
+            # Whisper expects 16 kHz input
+            positions = np.linspace(0, len(audio) - 1, int(len(audio) * 16000 / rate))
+            audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+        return self._model.transcribe(audio, fp16 = False)["text"].strip()
+
+
+class NullTranscriber:
+    # Offline stand-in that only reports the segment length
+    def __call__(self, audio, rate):
+        return f"<{len(audio) / rate:.2f}s audio>"
+
+
+def _transcriber_process(factory, jobs, results):
+    # Runs in its own process so model inference never competes with the camera loop's GIL
+    transcriber = factory()
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        segment_id, audio, rate = job
+        start = time.perf_counter()
+        try:
+            text = transcriber(audio, rate)
+            error = None
+        except Exception as e:
+            text, error = "", str(e)
+        results.put({
+            "id": segment_id,
+            "text": text,
+            "error": error,
+            "audio_seconds": len(audio) / rate,
+            "processing_seconds": time.perf_counter() - start,
+        })
+
+
+class AudioListener:
+    """
+    Reads chunk_size frames at a time, runs VAD on the reader thread and sends
+    only voiced segments to a transcriber in a separate process.
+    """
+    def __init__(self, context = None, transcriber_factory = None, on_text = None, queue_size = None):
+        self.context = context
+        self.transcriber_factory = transcriber_factory or WhisperTranscriber
+        self.on_text = on_text
+        self.queue_size = queue_size or config.AUDIO_QUEUE_SIZE
+
+        mp = multiprocessing.get_context("spawn")
+        self._jobs = mp.Queue(maxsize = self.queue_size)
+        self._results = mp.Queue()
+        self._process = mp.Process(target = _transcriber_process,
+                                   args = (self.transcriber_factory, self._jobs, self._results),
+                                   name = "transcriber", daemon = True)
+        self._reader = None
+        self._collector = None
+        self._source = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.results = []
+
+        self.audio_seconds = 0.0
+        self.processing_seconds = 0.0
+        self.rtf_gauge = REGISTRY.gauge("audio_real_time_factor", "Transcription time / audio time")
+        self.depth_gauge = REGISTRY.gauge("audio_queue_depth", "Voiced segments waiting for transcription")
+        self.dropped = REGISTRY.counter("audio_segments_dropped", "Segments dropped on a full queue")
+
+    @property
+    def real_time_factor(self):
+        return self.processing_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+    @property
+    def queue_depth(self):
+        return self._pending
+
+    def start(self):
+        self._process.start()
+        self._collector = threading.Thread(target = self._collect_loop, name = "audio-results", daemon = True)
+        self._collector.start()
+        return self
+
+    def listen(self, source = None):
+        # Start reading from a source (microphone by default) on a background thread
+        self._source = source or MicSource()
+        self._reader = threading.Thread(target = self._read_loop, args = (self._source,),
+                                        name = "audio-reader", daemon = True)
+        self._reader.start()
+
+    def _submit(self, segment, rate):
+        audio = segment.astype(np.float32) / 32768.0
+        with self._lock:
+            segment_id = self._next_id
+            self._next_id += 1
+        try:
+            self._jobs.put_nowait((segment_id, audio, rate))
+        except queue.Full:
+            self.dropped.inc()
+            logging.warning("Transcriber busy, voiced segment dropped")
+            return
+        with self._lock:
+            self._pending += 1
+            self.depth_gauge.set(self._pending)
+
+    def _read_loop(self, source):
+        vad = EnergyVAD(source.rate)
+        for chunk in source:
+            segment = vad.process(chunk)
+            if self.context is not None:
+                self.context.is_listening = vad.in_speech
+            if segment is not None:
+                self._submit(segment, source.rate)
+        segment = vad.flush()
+        if segment is not None:
+            self._submit(segment, source.rate)
+        if self.context is not None:
+            self.context.is_listening = False
+
+    def _collect_loop(self):
+        while True:
+            result = self._results.get()
+            if result is None:
+                return
+            with self._lock:
+                self._pending -= 1
+                self.depth_gauge.set(self._pending)
+                self.audio_seconds += result["audio_seconds"]
+                self.processing_seconds += result["processing_seconds"]
+                self.results.append(result)
+            self.rtf_gauge.set(self.real_time_factor)
+            if result["error"]:
+                logging.error(f"Transcription failed: {result['error']}")
+            else:
+                logging.info(f"Heard: {result['text']}")
+                if self.on_text is not None:
+                    self.on_text(result["text"])
+
+    def feed_wav(self, path, timeout = 60):
+        # Offline path: run a WAV file through VAD and wait for every transcription
+        self._read_loop(WavSource(path))
+        deadline = time.time() + timeout
+        while self._pending and self._process.is_alive() and time.time() < deadline:
+            time.sleep(0.01)
+        return list(self.results)
+
+    def stop(self):
+        if isinstance(self._source, MicSource):
+            self._source.running = False
+        if self._reader is not None:
+            self._reader.join(timeout = 2)
+        try:
+            self._jobs.put(None, timeout = 2)
+        except queue.Full:
+            self._process.terminate()
+        self._process.join(timeout = 10)
+        self._results.put(None)
+        if self._collector is not None:
+            self._collector.join(timeout = 2)
+        logging.info(f"Audio listener stopped, real-time factor {self.real_time_factor:.2f}")
+
+
+if __name__ == "__main__":
+    import sys
+    config.ensure_dirs()
+    listener = AudioListener().start()
+    wav_path = sys.argv[1] if len(sys.argv) > 1 else config.AUDIO_INPUT
+    for item in listener.feed_wav(wav_path):
+        print(f"[{item['audio_seconds']:.1f}s] {item['text']}")
+    print(f"Real-time factor: {listener.real_time_factor:.2f}")
+    listener.stop()
@@ -0,0 +1,340 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import cv2
+import config
+from metrics import REGISTRY
+from overlay import Overlay
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm"}
+DETECTIONS_NAME = "detections.jsonl"
+PROGRESS_NAME = "progress.json"
+
+
+def discover_sources(root):
+    # Relative path -> "image" / "video" for every media file below root, in a stable order
+    root = Path(root)
+    if root.is_file():
+        return root.parent, {root.name: "video" if root.suffix.lower() in VIDEO_SUFFIXES else "image"}
+    sources = {}
+    for path in sorted(root.rglob("*")):
+        suffix = path.suffix.lower()
+        if suffix in IMAGE_SUFFIXES:
+            sources[path.relative_to(root).as_posix()] = "image"
+        elif suffix in VIDEO_SUFFIXES:
+            sources[path.relative_to(root).as_posix()] = "video"
+    return root, sources
+
+
+def _repair_tail(path):
+    # A crash can leave half a JSON line, cut the file back to the last full record
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        data = f.read()
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+class BatchInference:
+    """
+    Offline detection over an image folder or recorded videos.
+    A thread pool decodes the sources into a bounded queue, the main thread
+    sends batches of BATCH_INFER_SIZE frames through PETDetection.predict, so
+    classes, conf and imgsz are the same as in the live loop.
+
+    Output folder:
+      detections.jsonl   one line per frame, appended and flushed per batch
+      progress.json      videos that were decoded to the end
+      annotated/         optional annotated images / videos
+      detections.parquet optional, written from the JSONL at the end (polars)
+
+    A restart skips images already in the JSONL and continues each video after
+    the last frame it recorded.
+    """
+    def __init__(self, source, output_dir = None, batch_size = None, workers = None,
+                 save_annotated = False, parquet = None, detector = None):
+        self.root, self.sources = discover_sources(source)
+        self.output_dir = Path(output_dir or config.BATCH_INFER_OUTPUT_DIR)
+        # Annotated outputs written inside the source folder are not inputs next time
+        output = self.output_dir.resolve()
+        self.sources = {key: kind for key, kind in self.sources.items()
+                        if output not in (self.root / key).resolve().parents}
+        self.batch_size = batch_size or config.BATCH_INFER_SIZE
+        self.workers = workers or config.BATCH_INFER_WORKERS
+        self.save_annotated = save_annotated
+        self.parquet = config.BATCH_INFER_PARQUET if parquet is None else parquet
+        self.detector = detector
+        self.detections_path = self.output_dir / DETECTIONS_NAME
+        self.progress_path = self.output_dir / PROGRESS_NAME
+        self.done_videos = set()
+        self.last_frame = {}
+        self._queue = queue.Queue(maxsize = self.batch_size * config.BATCH_INFER_QUEUE_BATCHES)
+        self._stop = threading.Event()
+        self._writers = {}
+        self.frame_meter = REGISTRY.meter("batch_infer_frames", "Frames processed by batch inference")
+
+    # --- Resume state ---
+    def _load_progress(self):
+        try:
+            with open(self.progress_path, 'r') as f:
+                self.done_videos = set(json.load(f).get("done_videos", []))
+        except (OSError, ValueError):
+            self.done_videos = set()
+        _repair_tail(self.detections_path)
+        self.last_frame = {}
+        if self.detections_path.exists():
+            with open(self.detections_path, 'r') as f:
+                for line in f:
+                    record = json.loads(line)
+                    key = record["source"]
+                    self.last_frame[key] = max(self.last_frame.get(key, -1), record["frame"])
+
+    def _save_progress(self):
+        tmp_path = self.progress_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"done_videos": sorted(self.done_videos)}, f)
+        os.replace(tmp_path, self.progress_path)
+
+    def _pending(self):
+        tasks = []
+        for key, kind in self.sources.items():
+            if kind == "image" and key not in self.last_frame:
+                tasks.append((key, kind, 0))
+            elif kind == "video" and key not in self.done_videos:
+                tasks.append((key, kind, self.last_frame.get(key, -1) + 1))
+        return tasks
+
+    # --- Decode workers ---
+    def _put(self, item):
+        # Blocks while the model is behind, gives up once the run is stopping
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout = 0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self, task):
+        key, kind, first = task
+        path = self.root / key
+        try:
+            if kind == "image":
+                frame = cv2.imread(str(path))
+                if frame is None:
+                    logging.warning(f"Batch inference: could not decode {path}")
+                    return
+                self._put((key, 0, frame, None))
+                return
+
+            capture = cv2.VideoCapture(str(path))
+            if not capture.isOpened():
+                logging.warning(f"Batch inference: could not open {path}")
+                return
+            fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+            try:
+                # grab() without decoding to the frame a resumed run stopped at
+                for _ in range(first):
+                    if not capture.grab():
+                        break
+                index = first
+                while not self._stop.is_set():
+                    ret, frame = capture.read()
+                    if not ret:
+                        break
+                    if not self._put((key, index, frame, fps)):
+                        return
+                    index += 1
+            finally:
+                capture.release()
+            # End marker, the video is finished once its frames are written
+            self._put((key, None, None, fps))
+        except Exception as e:
+            logging.error(f"Batch inference: decoding {path} failed: {e}")
+
+    def _feed(self, tasks):
+        with ThreadPoolExecutor(max_workers = self.workers) as pool:
+            list(pool.map(self._decode, tasks))
+        self._put(None)
+
+    # --- Model side ---
+    def _annotated_path(self, key, first_frame):
+        target = self.output_dir / "annotated" / key
+        if self.sources[key] == "video":
+            # A resumed video continues in its own file instead of overwriting the first part
+            suffix = f"_from{first_frame}" if first_frame else ""
+            target = target.with_name(f"{target.stem}{suffix}.mp4")
+        target.parent.mkdir(parents = True, exist_ok = True)
+        return target
+
+    def _save_annotated(self, key, index, annotated, fps):
+        if self.sources[key] == "image":
+            cv2.imwrite(str(self._annotated_path(key, 0)), annotated)
+            return
+        writer = self._writers.get(key)
+        if writer is None:
+            h, w = annotated.shape[:2]
+            writer = cv2.VideoWriter(str(self._annotated_path(key, index)),
+                                     cv2.VideoWriter_fourcc(*"mp4v"), fps or 30.0, (w, h))
+            self._writers[key] = writer
+        writer.write(annotated)
+
+    def _process(self, batch, out):
+        frames = [item[2] for item in batch]
+        results = self.detector.predict(frames)
+        names = self.detector.class_name
+        for (key, index, frame, fps), result in zip(batch, results):
+            boxes = result.boxes
+            xyxy = boxes.xyxy.cpu().numpy().round(1).tolist()
+            conf = boxes.conf.cpu().numpy().round(4).tolist()
+            cls = boxes.cls.cpu().numpy().astype(int).tolist()
+            record = {
+                "source": key,
+                "frame": index,
+                "time_s": round(index / fps, 3) if fps else None,
+                "width": frame.shape[1],
+                "height": frame.shape[0],
+                "detections": [{"cls": c, "name": names.get(c, str(c)), "conf": p, "box": b}
+                               for c, p, b in zip(cls, conf, xyxy)],
+            }
+            out.write(json.dumps(record) + "\n")
+            if self.save_annotated:
+                annotated = self.detector.render(frame, Overlay.from_result(result))
+                self._save_annotated(key, index, annotated, fps)
+        # One flush per batch: a crash loses at most the batch in flight
+        out.flush()
+        self.frame_meter.mark(len(batch))
+
+    def run(self):
+        if self.detector is None:
+            from vision_module import PETDetection
+            self.detector = PETDetection()
+        if self.detector.model is None:
+            raise RuntimeError("Batch inference needs a loaded model")
+        # Offline runs keep the configured imgsz, the latency budget is for live cameras
+        self.detector.controller = None
+
+        self.output_dir.mkdir(parents = True, exist_ok = True)
+        self._load_progress()
+        tasks = self._pending()
+        print(f"Batch inference over {self.root}: {len(self.sources)} sources, {len(tasks)} to process")
+        logging.info(f"Batch inference started: {len(tasks)} of {len(self.sources)} sources, "
+                     f"batch {self.batch_size}, {self.workers} decode workers")
+
+        feeder = threading.Thread(target = self._feed, args = (tasks,), daemon = True)
+        start = time.perf_counter()
+        last_report = start
+        frames = 0
+        batch = []
+        feeder.start()
+        try:
+            with open(self.detections_path, 'a') as out:
+                while True:
+                    item = self._queue.get()
+                    if item is not None and item[1] is not None:
+                        batch.append(item)
+                        if len(batch) < self.batch_size:
+                            continue
+                    if batch:
+                        self._process(batch, out)
+                        frames += len(batch)
+                        batch = []
+                    if item is None:
+                        break
+                    if item[1] is None:
+                        # Video end marker, its frames were all written above
+                        key = item[0]
+                        writer = self._writers.pop(key, None)
+                        if writer is not None:
+                            writer.release()
+                        self.done_videos.add(key)
+                        self._save_progress()
+
+                    now = time.perf_counter()
+                    if now - last_report >= config.BATCH_INFER_REPORT_INTERVAL:
+                        print(f"  {frames} frames, {frames / (now - start):.1f} frames/s")
+                        last_report = now
+        finally:
+            self._stop.set()
+            for writer in self._writers.values():
+                writer.release()
+            self._writers = {}
+            self.detector.close()
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            "frames": frames,
+            "seconds": elapsed,
+            "fps": frames / elapsed if elapsed else 0.0,
+            "sources": len(tasks),
+            "output": str(self.detections_path),
+        }
+        if self.parquet:
+            summary["parquet"] = self.write_parquet()
+        print(f"Batch inference done: {frames} frames in {elapsed:.1f}s ({summary['fps']:.1f} frames/s)")
+        logging.info(f"Batch inference: {frames} frames at {summary['fps']:.1f} frames/s -> {self.output_dir}")
+        return summary
+
+    def write_parquet(self):
+        # One row per detection; frames without detections keep a row with null columns
+        try:
+            import polars as pl
+        except ImportError:
+            logging.warning("polars is not installed, detections stay in JSONL only")
+            return None
+        if not self.detections_path.exists() or self.detections_path.stat().st_size == 0:
+            return None
+        target = self.output_dir / "detections.parquet"
+        # Explicit schema: a run without any detection would infer detections as Null and unnest fails
+        schema = {
+            "source": pl.String,
+            "frame": pl.Int64,
+            "time_s": pl.Float64,
+            "width": pl.Int64,
+            "height": pl.Int64,
+            "detections": pl.List(pl.Struct({"cls": pl.Int64, "name": pl.String,
+                                             "conf": pl.Float64, "box": pl.List(pl.Float64)})),
+        }
+        detections = pl.col("detections")
+        frame = (pl.read_ndjson(self.detections_path, schema = schema)
+                 # Empty lists as null, explode keeps null rows on every polars version
+                 .with_columns(pl.when(detections.list.len() > 0).then(detections).alias("detections"))
+                 .explode("detections")
+                 .unnest("detections"))
+        frame.write_parquet(target)
+        return str(target)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Offline batch detection over image folders and video files")
+    parser.add_argument("source", nargs = "?", default = str(config.DATA_DIR / "raw"),
+                        help = "image / video folder or a single video file")
+    parser.add_argument("--output", default = None, help = "output folder, config.BATCH_INFER_OUTPUT_DIR otherwise")
+    parser.add_argument("--batch", type = int, default = None, help = "frames per predict call")
+    parser.add_argument("--workers", type = int, default = None, help = "decode threads")
+    parser.add_argument("--save-annotated", action = "store_true", help = "write annotated images / videos")
+    parser.add_argument("--parquet", action = "store_true", default = None,
+                        help = "also write detections.parquet (needs polars)")
+    args = parser.parse_args(argv)
+
+    config.ensure_dirs()
+    runner = BatchInference(args.source, args.output, args.batch, args.workers,
+                            args.save_annotated, args.parquet)
+    runner.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import argparse
+import json
+import logging
+import resource
+import sys
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import config
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+STAGES = ("decode", "motion_gate", "predict", "annotate")
+STATE_NAMES = {None: "startup", 1: "active", 2: "idle"}
+
+
+def iter_frames(source):
+    # Yield (frame, decode_seconds) from a video file or an image folder
+    source = Path(source)
+    if source.is_dir():
+        for path in sorted(p for p in source.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES):
+            start = time.perf_counter()
+            frame = cv2.imread(str(path))
+            elapsed = time.perf_counter() - start
+            if frame is not None:
+                yield frame, elapsed
+        return
+
+    capture = cv2.VideoCapture(str(source))
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Could not open replay source {source}")
+    try:
+        while True:
+            start = time.perf_counter()
+            ret, frame = capture.read()
+            elapsed = time.perf_counter() - start
+            if not ret:
+                break
+            yield frame, elapsed
+    finally:
+        capture.release()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {"count": len(samples), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def run_benchmark(source, detector = None, max_frames = None, warmup_frames = None, render = False):
+    """
+    Replay `source` through PETDetection.take_inference without any display.
+    render = True also draws the overlay like a watched display does ("annotate" stage),
+    without it nothing is drawn, as in a headless run.
+    Returns FPS, per stage latency percentiles, time per camera_status and peak RSS.
+    """
+    if detector is None:
+        from vision_module import PETDetection
+        detector = PETDetection()
+    warmup_frames = config.BENCHMARK_WARMUP_FRAMES if warmup_frames is None else warmup_frames
+
+    stage_samples = {stage: [] for stage in STAGES}
+    frame_samples = []
+    state_seconds = {}
+    camera_status = None
+    frames = 0
+
+    for frame, decode_time in iter_frames(source):
+        if max_frames is not None and frames >= max_frames + warmup_frames:
+            break
+        start = time.perf_counter()
+        annotated_frame, _, next_status, _ = detector.take_inference(frame, camera_status, watched = render)
+        if render and annotated_frame is not None:
+            annotate_start = time.perf_counter()
+            detector.render(annotated_frame, detector.state.overlay, f"Status: {next_status}")
+            detector.stage_times["annotate"] = time.perf_counter() - annotate_start
+        elapsed = time.perf_counter() - start
+        frames += 1
+
+        # Warm-up frames settle the model and the motion gate, they are not measured
+        if frames > warmup_frames:
+            stage_samples["decode"].append(decode_time)
+            for stage, seconds in detector.stage_times.items():
+                stage_samples.setdefault(stage, []).append(seconds)
+            frame_samples.append(decode_time + elapsed)
+            state = STATE_NAMES.get(camera_status, str(camera_status))
+            state_seconds[state] = state_seconds.get(state, 0.0) + decode_time + elapsed
+        camera_status = next_status
+
+    total = sum(frame_samples)
+    result = {
+        "source": str(source),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "frames": len(frame_samples),
+        "fps": len(frame_samples) / total if total else 0.0,
+        "frame": _percentiles(frame_samples),
+        "stages": {stage: _percentiles(samples) for stage, samples in stage_samples.items()},
+        "state_seconds": state_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return result
+
+
+def compare_to_baseline(result, baseline, tolerance = None):
+    # Returns a list of human readable regressions, empty when within tolerance
+    tolerance = config.BENCHMARK_TOLERANCE if tolerance is None else tolerance
+    regressions = []
+    if baseline.get("fps") and result["fps"] < baseline["fps"] * (1 - tolerance):
+        regressions.append(f"fps {result['fps']:.2f} < baseline {baseline['fps']:.2f}")
+
+    for stage, stats in result["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base or not base.get("count") or not stats["count"]:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if stats[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{stage} {key} {stats[key]:.2f} > baseline {base[key]:.2f}")
+
+    base_rss = baseline.get("peak_rss_mb")
+    if base_rss and result["peak_rss_mb"] > base_rss * (1 + tolerance):
+        regressions.append(f"peak RSS {result['peak_rss_mb']:.0f} MB > baseline {base_rss:.0f} MB")
+    return regressions
+
+
+def print_result(result):
+    print(f"Frames: {result['frames']}, FPS: {result['fps']:.2f}, Peak RSS: {result['peak_rss_mb']:.0f} MB")
+    for stage, stats in result["stages"].items():
+        print(f"  {stage:<12} n={stats['count']:<6} p50 {stats['p50_ms']:7.2f} ms  "
+              f"p95 {stats['p95_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms")
+    for state, seconds in result["state_seconds"].items():
+        print(f"  state {state:<8} {seconds:.2f} s")
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Headless replay benchmark for the vision path")
+    parser.add_argument("source", nargs = "?", default = str(config.TEST_SAMPLES_DIR),
+                        help = "video file or image folder")
+    parser.add_argument("--max-frames", type = int, default = None)
+    parser.add_argument("--output", default = None, help = "JSON result path")
+    parser.add_argument("--baseline", default = str(config.BENCHMARK_BASELINE))
+    parser.add_argument("--tolerance", type = float, default = config.BENCHMARK_TOLERANCE)
+    parser.add_argument("--render", action = "store_true",
+                        help = "draw the overlay on every frame, as a watched display would")
+    parser.add_argument("--save-baseline", action = "store_true",
+                        help = "store this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.source, max_frames = args.max_frames, render = args.render)
+    print_result(result)
+
+    config.BENCHMARK_DIR.mkdir(parents = True, exist_ok = True)
+    output = Path(args.output) if args.output else (
+        config.BENCHMARK_DIR / f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent = 2)
+    print(f"Result saved to {output}")
+    logging.info(f"Benchmark: {result['frames']} frames at {result['fps']:.2f} fps, saved to {output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(result, f, indent = 2)
+        print(f"Baseline updated: {baseline_path}")
+        return 0
+
+    if baseline_path.exists():
+        with open(baseline_path, 'r') as f:
+            regressions = compare_to_baseline(result, json.load(f), args.tolerance)
+        if regressions:
+            for line in regressions:
+                print(f"REGRESSION: {line}")
+                logging.warning(f"Benchmark regression: {line}")
+            return 1
+        print("No regression against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import logging
+import time
+import cv2
+import numpy as np
+import config
+from overlay import Overlay
+
+
+def box_iou(boxes_a, boxes_b):
+    # Pairwise IoU between (N, 4) and (M, 4) xyxy arrays
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype = np.float32)
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+class BoxTracker:
+    """
+    Carries the boxes of the last YOLO detection forward between detections.
+    Each box moves with a constant velocity estimated from the last two matched
+    detections, and its confidence decays every frame it is not re-detected.
+    """
+    def __init__(self, interval = None, min_confidence = None, decay = None):
+        self.interval = max(1, interval or config.TRACK_DETECT_INTERVAL)
+        self.min_confidence = config.TRACK_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.decay = config.TRACK_CONFIDENCE_DECAY if decay is None else decay
+
+        self.boxes = np.zeros((0, 4), dtype = np.float32)
+        # Boxes as last detected, step() only moves self.boxes
+        self.detected_boxes = np.zeros((0, 4), dtype = np.float32)
+        self.velocity = np.zeros((0, 4), dtype = np.float32)
+        self.confidence = np.zeros(0, dtype = np.float32)
+        self.classes = np.zeros(0, dtype = np.int64)
+        self.frames_since_detection = 0
+
+        # --- Report counters ---
+        self.detect_frames = 0
+        self.tracked_frames = 0
+        self.detect_time = 0.0
+
+    def needs_detection(self):
+        if self.detect_frames == 0 or len(self.boxes) == 0:
+            return True
+        if self.frames_since_detection + 1 >= self.interval:
+            return True
+        return bool(self.confidence.min() < self.min_confidence)
+
+    def update(self, boxes, confidence, classes, elapsed = 0.0):
+        # Feed a fresh YOLO detection (xyxy, conf, cls numpy arrays)
+        boxes = np.asarray(boxes, dtype = np.float32).reshape(-1, 4)
+        velocity = np.zeros_like(boxes)
+
+        # Matched and differenced against the last detection, not the extrapolated
+        # boxes, so the velocity is the real motion and not the prediction error
+        if len(self.detected_boxes) and len(boxes):
+            iou = box_iou(boxes, self.detected_boxes)
+            same_class = classes[:, None] == self.classes[None, :]
+            iou = np.where(same_class, iou, 0.0)
+            best = iou.argmax(axis = 1)
+            matched = iou[np.arange(len(boxes)), best] > config.TRACK_MATCH_IOU
+            # The detection frame itself is not stepped: frames apart = steps + 1
+            steps = self.frames_since_detection + 1
+            velocity[matched] = (boxes[matched] - self.detected_boxes[best[matched]]) / steps
+
+        self.boxes = boxes
+        self.detected_boxes = boxes
+        self.velocity = velocity
+        self.confidence = np.asarray(confidence, dtype = np.float32).reshape(-1)
+        self.classes = np.asarray(classes, dtype = np.int64).reshape(-1)
+        self.frames_since_detection = 0
+        self.detect_frames += 1
+        self.detect_time += elapsed
+
+    def step(self):
+        # Advance the tracks one frame without running the model
+        self.boxes = self.boxes + self.velocity
+        self.confidence = self.confidence * self.decay
+        self.frames_since_detection += 1
+        self.tracked_frames += 1
+        return self.boxes, self.confidence, self.classes
+
+    def detected_classes(self):
+        return list(set(self.classes.tolist()))
+
+    def overlay(self):
+        # Tracked boxes for the overlay renderer, step() and update() replace
+        # the arrays instead of writing into them, so no copy is needed
+        return Overlay(self.boxes, self.confidence, self.classes)
+
+    def reset(self):
+        self.boxes = np.zeros((0, 4), dtype = np.float32)
+        self.detected_boxes = np.zeros((0, 4), dtype = np.float32)
+        self.velocity = np.zeros((0, 4), dtype = np.float32)
+        self.confidence = np.zeros(0, dtype = np.float32)
+        self.classes = np.zeros(0, dtype = np.int64)
+        self.frames_since_detection = 0
+
+    def report(self):
+        total = self.detect_frames + self.tracked_frames
+        avg_detect = self.detect_time / self.detect_frames if self.detect_frames else 0.0
+        return {
+            "frames": total,
+            "detect_frames": self.detect_frames,
+            "tracked_frames": self.tracked_frames,
+            "skip_ratio": self.tracked_frames / total if total else 0.0,
+            "saved_seconds": avg_detect * self.tracked_frames,
+        }
+
+
+def _result_arrays(result):
+    boxes = result.boxes
+    return (boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int))
+
+
+def compare_with_baseline(detector, video_path, interval = None, max_frames = None):
+    """
+    Replay a recorded video with YOLO on every frame (baseline) and feed the
+    tracker only on its detection frames. Reports inference time saved and the box accuracy lost,
+    as mean IoU of tracked boxes against the baseline boxes of the same frame.
+    """
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        print(f"Error: Could not open {video_path}")
+        logging.error(f"Tracking benchmark could not open {video_path}")
+        return None
+
+    tracker = BoxTracker(interval = interval)
+    baseline_time = 0.0
+    ious = []
+    missed = 0
+    frames = 0
+
+    while max_frames is None or frames < max_frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames += 1
+
+        start = time.perf_counter()
+        base_boxes, base_conf, base_cls = _result_arrays(detector.predict(frame)[0])
+        baseline_time += time.perf_counter() - start
+
+        if tracker.needs_detection():
+            # The baseline call doubles as the tracker's detection pass
+            tracker.update(base_boxes, base_conf, base_cls, time.perf_counter() - start)
+            continue
+
+        track_boxes, _, track_cls = tracker.step()
+        for box, cls in zip(base_boxes, base_cls):
+            candidates = track_boxes[track_cls == cls]
+            if len(candidates) == 0:
+                missed += 1
+                ious.append(0.0)
+            else:
+                ious.append(float(box_iou(box[None, :], candidates).max()))
+    capture.release()
+
+    report = tracker.report()
+    report.update({
+        "video": str(video_path),
+        "baseline_seconds": baseline_time,
+        "tracked_seconds": tracker.detect_time,
+        "time_saved_ratio": 1 - tracker.detect_time / baseline_time if baseline_time else 0.0,
+        "mean_iou_vs_baseline": float(np.mean(ious)) if ious else 1.0,
+        "missed_boxes": missed,
+    })
+    logging.info(f"Tracking benchmark: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    from vision_module import PETDetection
+
+    if len(sys.argv) < 2:
+        print("Usage: python box_tracker.py <recorded_video> [detect_interval]")
+        sys.exit(1)
+    result = compare_with_baseline(
+        PETDetection(),
+        sys.argv[1],
+        interval = int(sys.argv[2]) if len(sys.argv) > 2 else None,
+        )
+    print(result)
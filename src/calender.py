@@ -0,0 +1,37 @@
+import sys
+import config
+from event_store import EventStore, LogImporter
+
+
+class Calender:
+    """
+    Calendar view of pet activity, backed by the detection event store.
+    """
+    def __init__(self, store = None):
+        self.store = store or EventStore()
+
+    def sync_log(self):
+        # Pull events written to app.log since the last sync
+        return LogImporter(self.store).run()
+
+    def hourly(self, class_name, days = 30):
+        return self.store.activity_per_hour(class_name, days)
+
+    def daily(self, days = 30):
+        return self.store.activity_per_day(days)
+
+    def print_hourly(self, class_name, days = 30):
+        rows = self.hourly(class_name, days)
+        print(f"{class_name} activity per hour, last {days} days")
+        for hour, events, seconds in rows:
+            print(f"  {hour}  {events:4d} events  {seconds / 60:6.1f} min")
+        if not rows:
+            print("  No activity recorded.")
+
+
+if __name__ == "__main__":
+    config.ensure_dirs()
+    calender = Calender()
+    calender.sync_log()
+    calender.print_hourly(sys.argv[1] if len(sys.argv) > 1 else "Dog",
+                          int(sys.argv[2]) if len(sys.argv) > 2 else config.CALENDER_DAYS)
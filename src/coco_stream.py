@@ -0,0 +1,125 @@
+import json
+import re
+
+# --- Streaming reader for the top level arrays of a COCO annotation file ---
+# Only one element (or one read chunk) is held in memory at a time, so the
+# peak memory does not depend on the size of instances_*.json.
+
+_WHITESPACE = re.compile(r'\s*')
+_STRUCTURE = re.compile(r'[\[\]{}"]')
+_STRING_TAIL = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+
+READ_CHUNK = 1 << 20
+
+
+class _JsonStream:
+    def __init__(self, f, chunk_size = READ_CHUNK):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop the consumed prefix before appending new data
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Malformed JSON: expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def decode_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def skip_value(self):
+        # Walk brackets and strings with regex instead of building Python objects.
+        if self.peek() not in "[{":
+            self.decode_value()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("Malformed JSON: unexpected end of file")
+                continue
+            char = match.group()
+            self.pos = match.end()
+            if char == '"':
+                self._skip_string()
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _skip_string(self):
+        while True:
+            match = _STRING_TAIL.match(self.buf, self.pos)
+            if match is not None:
+                self.pos = match.end()
+                return
+            if not self._fill():
+                raise ValueError("Malformed JSON: unterminated string")
+
+
+def iter_array(json_path, key, chunk_size = READ_CHUNK):
+    """
+    Yield the elements of the top level array `key` one by one.
+    Other top level values are skipped without being decoded.
+    """
+    with open(json_path, 'r', encoding = 'utf-8') as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.expect('{')
+        while stream.peek() != '}':
+            name = stream.decode_value()
+            stream.expect(':')
+
+            if name != key:
+                stream.skip_value()
+            elif stream.peek() != '[':
+                raise ValueError(f"COCO section '{key}' is not an array")
+            else:
+                stream.expect('[')
+                if stream.peek() == ']':
+                    return
+                while True:
+                    yield stream.decode_value()
+                    char = stream.peek()
+                    stream.pos += 1
+                    if char == ']':
+                        return
+                    if char != ',':
+                        raise ValueError(f"Malformed JSON in '{key}' at offset {stream.pos}")
+
+            if stream.peek() == ',':
+                stream.pos += 1
@@ -1,35 +1,139 @@
+import hashlib
 import json
 import os
-import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
 import config
+import coco_stream
+import log_setup
+from dataset_materializer import DatasetMaterializer
 import yaml
 import logging
 
+LABEL_LINE = "%d %.6f %.6f %.6f %.6f\n"
+# Image suffixes ultralytics picks up when it scans an images folder
+IMG_FORMATS = {"bmp", "dng", "jpeg", "jpg", "mpo", "png", "tif", "tiff", "webp", "pfm", "heic"}
+
 class Coco_to_yolo():
     def __init__(self):
         self.target_classes = ['cat', 'dog', 'person']
 
-        logging.basicConfig(
-            level = config.LOG_LEVEL,
-            format = config.LOG_FORMAT,
-            filename = config.LOG_FILE,
-            filemode = 'a',
-        )
-
-    def _normalize_bbox(self, bbox, img_w, img_h):
-        x_min, y_min, w, h = bbox
-        x_center = (x_min + w / 2.0) / img_w
-        y_center = (y_min + h / 2.0) / img_h
-        norm_w = w / img_w
-        norm_h = h / img_h
-        return x_center, y_center, norm_w, norm_h
-    
-    def _generate_yaml(self):
+        log_setup.setup_logging()
+
+    def _normalize_bboxes(self, boxes, sizes):
+        # boxes: (N, 4) COCO [xmin, ymin, width, height], sizes: (N, 2) [img_w, img_h]
+        norm = np.empty(boxes.shape, dtype = np.float64)
+        norm[:, 0] = (boxes[:, 0] + boxes[:, 2] / 2.0) / sizes[:, 0]
+        norm[:, 1] = (boxes[:, 1] + boxes[:, 3] / 2.0) / sizes[:, 1]
+        norm[:, 2] = boxes[:, 2] / sizes[:, 0]
+        norm[:, 3] = boxes[:, 3] / sizes[:, 1]
+        return norm
+
+    def _to_columns(self, images, img_id_to_ann):
+        # Gather every target bbox into flat arrays ordered by image,
+        # offsets[i]:offsets[i + 1] are the rows of images[i].
+        counts = np.fromiter((len(img_id_to_ann[img[0]]) for img in images),
+                             dtype = np.int64, count = len(images))
+        offsets = np.zeros(len(images) + 1, dtype = np.int64)
+        np.cumsum(counts, out = offsets[1:])
+
+        total = int(offsets[-1])
+        classes = np.empty(total, dtype = np.int64)
+        boxes = np.empty((total, 4), dtype = np.float64)
+        row = 0
+        for img_id, _, _, _ in images:
+            for class_idx, bbox in img_id_to_ann[img_id]:
+                classes[row] = class_idx
+                boxes[row] = bbox
+                row += 1
+
+        img_sizes = np.array([(img[2], img[3]) for img in images], dtype = np.float64).reshape(-1, 2)
+        sizes = np.repeat(img_sizes, counts, axis = 0)
+        return classes, self._normalize_bboxes(boxes, sizes), offsets
+
+    def _format_labels(self, classes, norm, offsets):
+        # One % operation per image builds the whole label file
+        flat = np.column_stack((classes, norm)).ravel().tolist()
+        texts = []
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            texts.append((LABEL_LINE * (end - start)) % tuple(flat[start * 5:end * 5]))
+        return texts
+
+    def _write_label_archive(self, out_lab, file_names, classes, norm, offsets):
+        # Packed alternative to one .txt per image: rows of [cls, x, y, w, h]
+        # plus an index mapping each image to its row range.
+        archive_dir = Path(out_lab).parent
+        archive_dir.mkdir(parents = True, exist_ok = True)
+        packed = np.column_stack((classes, norm)).astype(np.float32)
+        np.save(archive_dir / config.LABEL_ARCHIVE_NAME, packed)
+
+        index = {
+            "files": [os.path.splitext(name)[0] for name in file_names],
+            "offsets": offsets.tolist(),
+            "names": {i: name for i, name in enumerate(self.target_classes)},
+        }
+        with open(archive_dir / config.LABEL_ARCHIVE_INDEX, 'w') as f:
+            json.dump(index, f)
+        logging.info(f"Label archive written to {archive_dir} ({len(packed)} boxes)")
+
+    def _write_label_cache(self, out_image, out_lab, images, classes, norm, offsets):
+        """
+        Writes <split>/labels.cache in the ultralytics format, so the first training
+        run loads the labels directly instead of verifying every .txt file.
+        Skipped when the images folder holds files this conversion did not write,
+        ultralytics would not accept the cache for that folder anyway.
+        """
+        out_image, out_lab = Path(out_image), Path(out_lab)
+        rows = {img[1]: i for i, img in enumerate(images)}
+        im_files = sorted(entry.path for entry in os.scandir(out_image)
+                          if entry.name.rsplit(".", 1)[-1].lower() in IMG_FORMATS)
+        if any(os.path.basename(path) not in rows for path in im_files):
+            logging.warning(f"Label cache skipped: {out_image} contains images from another source")
+            return None
+
+        # Same values ultralytics reads back from the .txt files
+        values = np.round(norm, 6).astype(np.float32)
+        labels, label_files = [], []
+        for im_file in im_files:
+            i = rows[os.path.basename(im_file)]
+            start, end = offsets[i], offsets[i + 1]
+            labels.append({
+                "im_file": im_file,
+                "shape": (images[i][3], images[i][2]),
+                "cls": classes[start:end].astype(np.float32).reshape(-1, 1),
+                "bboxes": values[start:end],
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            })
+            label_files.append(str(out_lab / (os.path.splitext(os.path.basename(im_file))[0] + ".txt")))
+
+        # ultralytics get_hash: total size of the files plus their joined paths
+        paths = label_files + im_files
+        digest = hashlib.sha256(str(sum(os.path.getsize(p) for p in paths if os.path.exists(p))).encode())
+        digest.update("".join(paths).encode())
+        cache = {
+            "labels": labels,
+            "hash": digest.hexdigest(),
+            "results": (len(labels), 0, 0, 0, len(im_files)),
+            "msgs": [],
+            "version": config.LABEL_CACHE_VERSION,
+        }
+        cache_path = out_lab.with_suffix(".cache")
+        with open(cache_path, 'wb') as f:
+            np.save(f, cache, allow_pickle = True)
+        logging.info(f"Label cache written to {cache_path} ({len(labels)} images)")
+        return str(cache_path)
+
+    def _generate_yaml(self, split_dirs = None):
+            # split_dirs: {split name: images folder}, train / val from config by default
+            split_dirs = split_dirs or {'train': config.TRAIN_IMAGES_DIR, 'val': config.VAL_IMAGES_DIR}
             try:
                 data_config = {
                     'path' : str(config.PET_OUT_PATH),
-                    'train' : str(config.TRAIN_IMAGES_DIR),
-                    'val' : str(config.VAL_IMAGES_DIR),
+                    **{name: str(image_dir) for name, image_dir in split_dirs.items()},
                     'names' : {i: name for i, name in enumerate(self.target_classes)}
                 }
 
@@ -44,86 +148,190 @@ class Coco_to_yolo():
                 print(f"Error: Could not save to {yaml_path}")
                 logging.error("Yaml Save Status: Fail")
 
-    def run(self, input_json, input_images, out_image, out_lab):
-        # Load COCO JSON
+    def _category_index(self, categories):
+        # COCO category id -> YOLO class index (e.g., cat=0, dog=1), targets only
+        class_to_idx = {name: i 
+                        for i, name in enumerate(self.target_classes)}
+        return {
+            cat['id']: class_to_idx[cat['name']]
+            for cat in categories
+            if cat['name'] in class_to_idx
+            }
+
+    def _load_index(self, input_json, id_to_idx = None):
+        # Load the whole COCO JSON in memory
         with open(input_json, 'r') as f:
             data = json.load(f)
             if not data:
                 print('Could not found file')
                 logging.error(f'json load fail')
-                return
+                return None
 
-        # Map category IDs to names and filter target IDs
-        cat_id_map = {cat['id']: cat['name'] for cat in data['categories']}
-        target_ids = [cat['id'] for cat in data['categories'] if cat['name'] in self.target_classes]
-        
-        # Create a mapping for YOLO class indices (e.g., cat=0, dog=1)
-        class_to_idx = {name: i 
-                        for i, name in enumerate(self.target_classes)}
-        id_to_idx = {
-            cat['id']: class_to_idx[cat['name']] 
-            for cat in data['categories'] 
-            if cat['name'] in self.target_classes
-            }
+        # Map category IDs to YOLO class indices, the dict doubles as the target id set
+        if id_to_idx is None:
+            id_to_idx = self._category_index(data['categories'])
 
         # Index annotations by image_id
         img_id_to_ann = {}
         for ann in data['annotations']:
-            if ann['category_id'] in target_ids:
+            if ann['category_id'] in id_to_idx:
                 img_id = ann['image_id']
                 if img_id not in img_id_to_ann:
                     img_id_to_ann[img_id] = []
-                img_id_to_ann[img_id].append(ann)
-
-        # Process images
-        for img_info in data['images']:
-            img_id = img_info['id']
-            if img_id in img_id_to_ann:
-                file_name = img_info['file_name']
-                img_w = img_info['width']
-                img_h = img_info['height']
-
-                # Copy image to new directory
-                try:
-                    src_img_path = os.path.join(input_images, file_name)
-                    dst_img_path = os.path.join(out_image, file_name)
-                    if os.path.exists(src_img_path):
-                        shutil.copy(src_img_path, dst_img_path)
-                
-                    # Create YOLO label file
-                    base_name = os.path.splitext(file_name)[0]
-                    label_file = os.path.join(out_lab, f"{base_name}.txt")
-
-                    with open(label_file, 'w') as f_label:
-                        for ann in img_id_to_ann[img_id]:
-                            # COCO bbox: [xmin, ymin, width, height]
-                            x_center, y_center, w, h = self._normalize_bbox(ann['bbox'], img_w, img_h)
-                            
-                            class_idx = id_to_idx[ann['category_id']]
-                            f_label.write(f"{class_idx} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n")
-                            
-                except Exception as e:
-                    print("Output Save Status: Fail! please check path")
-                    logging.error(f"Image Output Status: Fail! ")
-        
-        print(f"Extraction completed. Data saved to: {config.PET_OUT_PATH}")
-        self._generate_yaml()
+                img_id_to_ann[img_id].append((id_to_idx[ann['category_id']], ann['bbox']))
+
+        images = [
+            (img_info['id'], img_info['file_name'], img_info['width'], img_info['height'])
+            for img_info in data['images']
+            if img_info['id'] in img_id_to_ann
+            ]
+        return images, img_id_to_ann
+
+    def _stream_index(self, input_json, id_to_idx = None):
+        # Read categories, annotations and images one element at a time,
+        # keeping only compact records for the target classes.
+        if id_to_idx is None:
+            id_to_idx = self._category_index(coco_stream.iter_array(input_json, 'categories'))
+        if not id_to_idx:
+            print('Could not found target categories')
+            logging.error(f'json stream fail: no target categories in {input_json}')
+            return None
+
+        img_id_to_ann = {}
+        for ann in coco_stream.iter_array(input_json, 'annotations'):
+            class_idx = id_to_idx.get(ann['category_id'])
+            if class_idx is not None:
+                img_id_to_ann.setdefault(ann['image_id'], []).append((class_idx, tuple(ann['bbox'])))
+
+        images = [
+            (img_info['id'], img_info['file_name'], img_info['width'], img_info['height'])
+            for img_info in coco_stream.iter_array(input_json, 'images')
+            if img_info['id'] in img_id_to_ann
+            ]
+        return images, img_id_to_ann
+
+    def _convert_split(self, input_json, input_images, out_image, out_lab, streaming = None, mode = None,
+                       label_format = None, id_to_idx = None):
+        # Convert one split without touching the YAML, returns a summary dict or None
+        if streaming is None:
+            streaming = config.COCO_STREAMING
+        label_format = label_format or config.LABEL_FORMAT
+
+        try:
+            if streaming:
+                index = self._stream_index(input_json, id_to_idx)
+            else:
+                index = self._load_index(input_json, id_to_idx)
+        except (OSError, ValueError) as e:
+            print(f'Could not read annotation file {input_json}')
+            logging.error(f'json load fail: {e}')
+            return
+        if index is None:
+            return
+        images, img_id_to_ann = index
+
+        # Normalise all target bboxes in one vectorized pass
+        classes, norm, offsets = self._to_columns(images, img_id_to_ann)
+        file_names = [img[1] for img in images]
+
+        if label_format in ("packed", "both"):
+            self._write_label_archive(out_lab, file_names, classes, norm, offsets)
+
+        if label_format in ("txt", "both"):
+            label_texts = self._format_labels(classes, norm, offsets)
+        else:
+            label_texts = [None] * len(images)
+
+        jobs = [
+            (file_name, os.path.join(input_images, file_name), label_text)
+            for file_name, label_text in zip(file_names, label_texts)
+            ]
+
+        # Copy / link images and write labels, skipping unchanged ones
+        try:
+            materializer = DatasetMaterializer(out_image, out_lab, mode = mode)
+            stats = materializer.materialize(jobs)
+        except Exception as e:
+            print("Output Save Status: Fail! please check path")
+            logging.error(f"Image Output Status: Fail! {e}")
+            return
+
+        cache_path = None
+        if config.LABEL_CACHE and label_format in ("txt", "both"):
+            cache_path = self._write_label_cache(out_image, out_lab, images, classes, norm, offsets)
+
+        print(f"Extraction completed. Data saved to: {out_image}")
+        # Split size and what this run wrote stay apart, a resumed run may write nothing
+        stats = dict(stats)
+        images_written = stats.pop("images")
+        return {**stats, "images_written": images_written, "images_total": len(images),
+                "boxes": int(offsets[-1]), "label_cache": cache_path}
+
+    def run(self, input_json, input_images, out_image, out_lab, streaming = None, mode = None, label_format = None):
+        # Single split, kept for callers converting one annotation file
+        result = self._convert_split(input_json, input_images, out_image, out_lab,
+                                     streaming = streaming, mode = mode, label_format = label_format)
+        if result is not None:
+            self._generate_yaml()
+        return result
+
+    def run_splits(self, splits = None, streaming = None, mode = None, label_format = None, workers = None):
+        """
+        splits: {name: (input_json, input_images, out_image, out_lab)}, config.COCO_SPLITS by default.
+        The category index is read once, splits are converted in parallel processes
+        and the YAML is written once with every split that succeeded.
+        """
+        splits = splits or config.COCO_SPLITS
+        if streaming is None:
+            streaming = config.COCO_STREAMING
+
+        # COCO splits share one category list, read it from the first annotation file
+        first_json = next(iter(splits.values()))[0]
+        try:
+            if streaming:
+                categories = list(coco_stream.iter_array(first_json, 'categories'))
+            else:
+                with open(first_json, 'r') as f:
+                    categories = json.load(f)['categories']
+        except (OSError, ValueError, KeyError) as e:
+            print(f'Could not read annotation file {first_json}')
+            logging.error(f'json load fail: {e}')
+            return {}
+        id_to_idx = self._category_index(categories)
+
+        kwargs = {"streaming": streaming, "mode": mode, "label_format": label_format, "id_to_idx": id_to_idx}
+        workers = min(workers or config.CONVERT_WORKERS, len(splits))
+        results = {}
+        if workers <= 1:
+            for name, paths in splits.items():
+                results[name] = self._convert_split(*paths, **kwargs)
+        else:
+            # Parsing is pure Python, separate processes let the splits run in parallel
+            with ProcessPoolExecutor(max_workers = workers) as pool:
+                futures = {name: pool.submit(self._convert_split, *paths, **kwargs)
+                           for name, paths in splits.items()}
+                for name, future in futures.items():
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logging.error(f"Split {name} conversion failed: {e}")
+                        results[name] = None
+
+        for name, result in results.items():
+            if result is not None:
+                logging.info(f"Split {name}: {result['images_total']} images "
+                             f"({result['images_written']} written), {result['boxes']} boxes")
+        if results.get('train') is not None and results.get('val') is not None:
+            self._generate_yaml({name: paths[2] for name, paths in splits.items()
+                                 if results.get(name) is not None})
+        else:
+            print("Warning: train or val split failed, YAML not written")
+            logging.warning("Yaml Save Status: skipped, train or val split missing")
+        return results
 
 if __name__ == "__main__":
     converter = Coco_to_yolo()
-    converter.run(
-                config.COCO_TRAIN_JSON_PATH,
-                config.COCO_TRAIN_IMG_PATH,
-                config.TRAIN_IMAGES_DIR,
-                config.TRAIN_LABELS_DIR,
-                )
-    
-    converter.run(
-                config.COCO_VAL_JSON_PATH,
-                config.COCO_VAL_IMG_PATH,
-                config.VAL_IMAGES_DIR,
-                config.VAL_LABELS_DIR,
-                )
+    converter.run_splits()
 
 
 # Example usage:
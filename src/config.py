@@ -23,60 +23,346 @@ DATA_DIR = BASE_DIR / "data"
 LOGS_DIR = BASE_DIR / "logs"
 
 
-# --- Ensure directories exist ---
-DATA_DIR.mkdir(parents = True, exist_ok = True)
-(DATA_DIR / "raw").mkdir(parents = True, exist_ok = True)
-(DATA_DIR / "result").mkdir(parents = True, exist_ok = True)
-LOGS_DIR.mkdir(parents = True, exist_ok = True)
-(DATA_DIR / "yaml").mkdir(parents = True, exist_ok = True)
-(DATA_DIR / "weights").mkdir(parents = True, exist_ok = True)
-(DATA_DIR / "user_sound").mkdir(parents = True, exist_ok = True)
-
 # --- Model Setting ---
 YOLO_MODEL_NAME = yolo_model_index
 MODEL_PATH = MODELS_DIR / YOLO_MODEL_NAME
 
 WHISPER_MODEL_NAME = whisper_model_index
 
+# --- Inference Backend Settings ---
+# "auto", "pytorch", "onnx" or "openvino", or an INT8 build from quantize.py:
+# "onnx_int8_dynamic", "onnx_int8_static" or "openvino_int8"
+INFERENCE_BACKEND = "auto"
+# "auto" picks CUDA, then Apple MPS, then CPU
+INFERENCE_DEVICE = "auto"
+# Runtimes tried in order for "auto" on CPU
+CPU_BACKEND_PREFERENCE = ["openvino", "onnx"]
+EXPORT_DIR = MODELS_DIR / "exports"
+INFERENCE_IMG_SIZE = 480
+# Dummy predictions at startup so the first frame skips graph setup
+WARMUP_RUNS = 2
+
 # ---BOX Settings ---
 CONFIDENCE_THRESHOLD = confidence_threshold
 
 # --- Camera Settings ---
 CAMERA_INDEX = camera_index
+# More than one index runs the multi-camera batched mode
+CAMERA_INDEXES = [camera_index]
 VERBOSE_STATUS = verbose
 
+# --- Display Settings ---
+# "opencv" (cv2.imshow window), "kivy" (dashboard MonitorScreen) or "mjpeg" (headless HTTP preview)
+DISPLAY_MODE = "opencv"
+# Put the frame buffer in multiprocessing.shared_memory so other processes can attach
+FRAME_SHARE_SHARED_MEMORY = False
+UI_REFRESH_FPS = 30
+# MJPEG preview, bound to localhost only
+PREVIEW_PORT = 8090
+PREVIEW_FPS = 15
+PREVIEW_JPEG_QUALITY = 75
+# Boxes and labels are drawn only while a reader polled within this many seconds
+OVERLAY_CONSUMER_IDLE = 1.0
+OVERLAY_FONT_SCALE = 0.5
+OVERLAY_LINE_WIDTH = 2
+
+# --- Detection State Settings ---
+# COCO ids for person, cat and dog
+YOLO_CLASS = [0, 15, 16]
+# Seconds without detection before returning to idle
+COOL_DOWN_TIME = 5.0
+# Changed pixels needed to wake up from idle
+APPROACH_THRESHOLD = 5000
+
+# --- Idle Motion Gate Settings ---
+# Fraction of the frame size used for differencing
+MOTION_SCALE = 0.25
+# Only every Nth idle frame is analysed
+MOTION_SAMPLE_EVERY = 3
+MOTION_BLUR_SIZE = 5
+MOTION_PIXEL_THRESHOLD = 127
+# Pixels added around the motion region before the wake-up YOLO pass
+MOTION_ROI_MARGIN = 32
+MOTION_ROI_MIN_SIZE = 32
+# Run YOLO on the motion region before waking up
+MOTION_ROI_CONFIRM = True
+MOTION_DISPLAY_BUFFERS = 3
+
+# --- Latency Budget Controller ---
+LATENCY_CONTROL = False
+# Target predict time per frame in seconds
+LATENCY_BUDGET = 0.10
+# Inference sizes the controller may choose from (multiples of 32)
+LATENCY_IMG_SIZES = [256, 320, 416, 480, 640]
+# Detect on at most one of every N active frames
+LATENCY_MAX_SKIP = 4
+LATENCY_MIN_STREAMS = 1
+# Predict calls measured per decision, and the percentile compared with the budget
+LATENCY_WINDOW = 30
+LATENCY_PERCENTILE = 90
+# Hysteresis band: degrade above budget * high, upgrade below budget * low
+LATENCY_HIGH_WATER = 1.0
+LATENCY_LOW_WATER = 0.6
+LATENCY_LOG_FILE = LOGS_DIR / "latency_decisions.jsonl"
+
+# --- Track Between Detections Settings ---
+TRACK_ENABLED = True
+# Run YOLO every N active frames, the tracker fills the frames in between
+TRACK_DETECT_INTERVAL = 5
+# Re-detect early when a tracked box confidence falls below this
+TRACK_MIN_CONFIDENCE = 0.35
+TRACK_CONFIDENCE_DECAY = 0.9
+TRACK_MATCH_IOU = 0.3
+
+# --- Pipeline Settings ---
+# Frames waiting between two stages, older frames are dropped
+PIPELINE_BUFFER_SIZE = 1
+# Seconds between stage throughput reports
+PIPELINE_REPORT_INTERVAL = 10.0
+# Multi-camera batching: frames per predict call and seconds to wait for a full batch
+BATCH_MAX_SIZE = 4
+BATCH_MAX_WAIT = 0.02
+
+# --- Benchmark Settings ---
+TEST_SAMPLES_DIR = BASE_DIR / "assets" / "test_samples"
+BENCHMARK_DIR = LOGS_DIR / "benchmark"
+BENCHMARK_BASELINE = BENCHMARK_DIR / "baseline.json"
+# Allowed slowdown before a run counts as a regression (0.10 = 10%)
+BENCHMARK_TOLERANCE = 0.10
+BENCHMARK_WARMUP_FRAMES = 5
+# Import time history of the entry points (src/import_benchmark.py)
+IMPORT_BENCHMARK_FILE = LOGS_DIR / "importtime.jsonl"
+
+# --- Batch Inference Settings ---
+BATCH_INFER_OUTPUT_DIR = DATA_DIR / "result" / "batch"
+# Frames per predict call and decode threads feeding them
+BATCH_INFER_SIZE = 8
+BATCH_INFER_WORKERS = 4
+# Decoded frames buffered ahead of the model, in batches
+BATCH_INFER_QUEUE_BATCHES = 4
+# Also write detections.parquet at the end (needs polars)
+BATCH_INFER_PARQUET = False
+# Seconds between frames/s progress lines
+BATCH_INFER_REPORT_INTERVAL = 10.0
+
+# --- Snapshot Settings ---
+# Encode and write snapshots on background threads
+SNAPSHOT_ASYNC = True
+# "jpeg", "webp" or "png"
+SNAPSHOT_ENCODING = "jpeg"
+# Quality per encoding (PNG: compression level 0-9)
+SNAPSHOT_QUALITY = {"jpeg": 90, "webp": 90, "png": 3}
+SNAPSHOT_WORKERS = 2
+# Pending snapshots, the oldest is dropped when full
+SNAPSHOT_QUEUE_SIZE = 16
+# Disk quota for snapshots in data/result and data/raw, the oldest snapshots are deleted first
+SNAPSHOT_QUOTA_MB = 2048
+# Name prefix of the files the snapshot service writes, the quota only counts and deletes these
+SNAPSHOT_PREFIX = "pet_snap_"
+SNAPSHOT_ON_DETECTION = False
+SNAPSHOT_DETECTION_INTERVAL = 10.0
+
+# --- Event Clip Settings ---
+CLIP_RECORDING = True
+CLIP_DIR = DATA_DIR / "clips"
+# Seconds kept before the pet walked in / after the camera went idle again
+CLIP_PRE_ROLL = 5.0
+CLIP_POST_ROLL = 3.0
+CLIP_MAX_SECONDS = 120.0
+# Frames are stored downscaled and JPEG compressed in the ring buffer
+CLIP_FPS = 10
+CLIP_SCALE = 0.5
+CLIP_JPEG_QUALITY = 80
+CLIP_FOURCC = "mp4v"
+CLIP_QUEUE_SIZE = 4
+# Sampled frames waiting for JPEG encoding off the inference thread
+CLIP_ENCODE_QUEUE_SIZE = 20
+
+# --- Media Player Settings ---
+# Play clips from CLIP_DIR when detection rules fire
+PLAYER_ENABLED = False
+# Clips kept in memory as JPEG frames, least recently used evicted first.
+# A clip larger than the cache plays straight from the file every time
+PLAYER_CACHE_MB = 256
+PLAYER_SCALE = 1.0
+PLAYER_JPEG_QUALITY = 90
+PLAYER_QUEUE_SIZE = 8
+# Decode the rule clips at startup so the first trigger plays from memory
+PLAYER_PRELOAD = True
+# Seconds a class must stay detected before a rule fires, and quiet time after it fired
+PLAYER_DEBOUNCE = 1.0
+PLAYER_COOLDOWN = 30.0
+# Detection gaps up to this many seconds do not restart the debounce
+PLAYER_RULE_GAP = 0.5
+# classes are the YOLO ids in YOLO_CLASS (0 person, 15 cat, 16 dog)
+PLAYER_RULES = [
+    {"name": "dog", "classes": [16], "clip": "dog.mp4"},
+    {"name": "cat", "classes": [15], "clip": "cat.mp4"},
+]
+
+# --- Detection Event Store Settings ---
+EVENT_STORE_ENABLED = True
+EVENT_DB_PATH = DATA_DIR / "events.db"
+# Buffered events are written after this many rows or seconds
+EVENT_FLUSH_SIZE = 50
+EVENT_FLUSH_INTERVAL = 5.0
+CALENDER_DAYS = 30
+
+# --- Audio Listener Settings ---
+AUDIO_ENABLED = False
+AUDIO_INPUT = DATA_DIR / "user_sound" / sound_input
+AUDIO_SAMPLE_RATE = 16000
+# Frames read per chunk, the VAD decides once per chunk
+AUDIO_CHUNK_SIZE = chunk_size
+# RMS level (int16 scale) above which a chunk counts as speech
+AUDIO_VAD_THRESHOLD = threshold
+# Seconds of quiet that end a voiced segment
+AUDIO_SILENCE_SECONDS = silence
+# Shorter segments are treated as clicks and discarded
+AUDIO_MIN_SEGMENT = 0.3
+# Voiced segments waiting for the transcriber, newer ones are dropped when full
+AUDIO_QUEUE_SIZE = 8
+
+# --- Metrics Settings ---
+METRICS_ENABLED = True
+# Prometheus text endpoint, bound to localhost only
+METRICS_PORT = 9108
+METRICS_SNAPSHOT_FILE = LOGS_DIR / "metrics.jsonl"
+METRICS_SNAPSHOT_INTERVAL = 30.0
+# Histogram bucket bounds in seconds
+METRICS_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+# Smoothing of the FPS meter, higher reacts faster
+METRICS_RATE_ALPHA = 0.1
+
 # --- Logging Settings ---
 LOG_FILE = LOGS_DIR / "app.log"
 LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 LOG_LEVEL = logging.INFO
+# "size" rotates at LOG_MAX_BYTES, "time" at LOG_ROTATE_WHEN; old files are gzipped
+LOG_ROTATION = "size"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_ROTATE_WHEN = "midnight"
+LOG_BACKUP_COUNT = 5
+LOG_COMPRESS = True
+# Records waiting for the writer thread, more are dropped instead of blocking the caller
+LOG_QUEUE_SIZE = 10000
+# Structured JSON lines from log_setup.log_event
+LOG_EVENTS_ENABLED = True
+LOG_EVENTS_FILE = LOGS_DIR / "events.jsonl"
+# Repeated messages at this level and above: LOG_RATE_LIMIT_BURST per window
+LOG_RATE_LIMIT_LEVEL = logging.WARNING
+LOG_RATE_LIMIT_WINDOW = 60.0
+LOG_RATE_LIMIT_BURST = 5
 
 # --- train Setup ---
 YAML_PATH = DATA_DIR / "yaml"
 TRAIN_DATA = YAML_PATH / train_data
 PROJECT_TRAIN_DIR = YAML_PATH / project_name
-PROJECT_TRAIN_DIR.mkdir(parents = True, exist_ok = True)
 TRAIN_LABELS_DIR = PROJECT_TRAIN_DIR / "train/labels"
-TRAIN_LABELS_DIR.mkdir(parents = True, exist_ok = True)
 TRAIN_IMAGES_DIR = PROJECT_TRAIN_DIR / "train/images"
-TRAIN_IMAGES_DIR.mkdir(parents = True, exist_ok = True)
 VAL_LABELS_DIR = PROJECT_TRAIN_DIR / "val/labels"
-VAL_LABELS_DIR.mkdir(parents = True, exist_ok = True)
 VAL_IMAGES_DIR = PROJECT_TRAIN_DIR / "val/images"
-VAL_IMAGES_DIR.mkdir(parents = True, exist_ok = True)
 WEIGHTS_PATH = DATA_DIR / "weights"
 INPUT_YAML_SMT = YAML_PATH
 TRAIN_EPOCHS = 100
 IMG_SIZE = 640
 
+# --- Hyperparameter Sweep ---
+SWEEP_NAME = "sweep"
+SWEEP_DIR = WEIGHTS_PATH / "sweeps"
+# Grid of model.train arguments, sampled down to SWEEP_MAX_TRIALS
+SWEEP_SPACE = {
+    "lr0": [0.01, 0.005, 0.001],
+    "imgsz": [480, 640],
+    "mosaic": [1.0, 0.5],
+}
+SWEEP_MAX_TRIALS = 8
+# Trials running at the same time, each pinned to its own SWEEP_THREADS_PER_TRIAL cores
+SWEEP_WORKERS = 2
+SWEEP_THREADS_PER_TRIAL = 4
+SWEEP_DATALOADER_WORKERS = 2
+# Median stopping: after the grace epochs, stop trials below the median of the others
+SWEEP_METRIC = "metrics/mAP50-95(B)"
+SWEEP_GRACE_EPOCHS = 5
+SWEEP_MIN_TRIALS_TO_PRUNE = 2
+
+# --- Training Image Cache ---
+# Decode and resize every training image once into memory-mapped shards
+IMAGE_CACHE_ENABLED = False
+IMAGE_CACHE_DIR = DATA_DIR / "cache"
+# Images per shard file (IMG_SIZE 640: about 1.2 MB per image)
+IMAGE_CACHE_SHARD_SIZE = 512
+IMAGE_CACHE_WORKERS = 8
+# Images timed when reporting the decode savings
+IMAGE_CACHE_BENCH_SAMPLE = 200
+
 # --- COCO2017 train Setup ---
 COCO_TRAIN_IMG_PATH = DATA_DIR / "yaml/coco2017/train/data"
 COCO_TRAIN_JSON_PATH = DATA_DIR / "yaml/coco2017/annotations/instances_train2017.json"
 COCO_VAL_IMG_PATH = DATA_DIR / "yaml/coco2017/validation/data"
 COCO_VAL_JSON_PATH = DATA_DIR / "yaml/coco2017/annotations/instances_val2017.json"
+# Read annotation files incrementally instead of json.load (low memory)
+COCO_STREAMING = True
+# How images reach the dataset folder: "copy", "hardlink" or "symlink"
+MATERIALIZE_MODE = "copy"
+MATERIALIZE_WORKERS = 8
+MATERIALIZE_MANIFEST = ".manifest.json"
+# Label output: "txt" (one file per image), "packed" (single archive) or "both"
+LABEL_FORMAT = "txt"
+LABEL_ARCHIVE_NAME = "labels_packed.npy"
+LABEL_ARCHIVE_INDEX = "labels_packed.json"
+# Splits converted by run_splits: name -> (annotation json, source images, output images, output labels)
+COCO_SPLITS = {
+    "train": (COCO_TRAIN_JSON_PATH, COCO_TRAIN_IMG_PATH, TRAIN_IMAGES_DIR, TRAIN_LABELS_DIR),
+    "val": (COCO_VAL_JSON_PATH, COCO_VAL_IMG_PATH, VAL_IMAGES_DIR, VAL_LABELS_DIR),
+}
+# Splits converted at the same time, each in its own process
+CONVERT_WORKERS = 2
+# Write <split>/labels.cache for ultralytics next to the label folder
+LABEL_CACHE = True
+# Must match ultralytics DATASET_CACHE_VERSION, otherwise it rescans the labels
+LABEL_CACHE_VERSION = "1.0.3"
 
 # --- pet train setup ---
 PET_OUT_PATH = YAML_PATH / project_name
-PET_OUT_PATH.mkdir(parents = True, exist_ok = True)
 PET_YAML_PATH = YAML_PATH / "pet.yaml"
 
+# --- INT8 Quantization and Evaluation ---
+# Validation images used to calibrate the static ONNX Runtime quantization
+QUANT_CALIBRATION_IMAGES = 300
+# Only these ops are quantized, the box decoding head stays in float
+QUANT_OP_TYPES = ["Conv", "MatMul"]
+# Dataset yaml and share of its val split used for OpenVINO (NNCF) calibration
+QUANT_DATA = PET_YAML_PATH
+QUANT_DATA_FRACTION = 1.0
+# An INT8 variant losing more mAP50 than this against FP32 is rejected
+QUANT_MAX_MAP_DROP = 0.02
+QUANT_REPORT_FILE = LOGS_DIR / "quantization.jsonl"
+# Low confidence / standard NMS IoU for mAP, recall uses CONFIDENCE_THRESHOLD
+EVAL_CONF = 0.001
+EVAL_NMS_IOU = 0.7
+EVAL_MAX_IMAGES = 500
+# Class names of the converted dataset when pet.yaml is missing (Coco_to_yolo order)
+EVAL_DATASET_NAMES = ["cat", "dog", "person"]
+
+
+# --- Directories, created by ensure_dirs() instead of at import time ---
+REQUIRED_DIRS = (
+    DATA_DIR,
+    DATA_DIR / "raw",
+    DATA_DIR / "result",
+    LOGS_DIR,
+    YAML_PATH,
+    WEIGHTS_PATH,
+    DATA_DIR / "user_sound",
+    TRAIN_LABELS_DIR,
+    TRAIN_IMAGES_DIR,
+    VAL_LABELS_DIR,
+    VAL_IMAGES_DIR,
+    PET_OUT_PATH,
+)
 
+def ensure_dirs():
+    # Called once by each entry point before it writes logs or data
+    for path in REQUIRED_DIRS:
+        path.mkdir(parents = True, exist_ok = True)
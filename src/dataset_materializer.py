@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import config
+
+MODES = ("copy", "hardlink", "symlink")
+
+
+class DatasetMaterializer:
+    """
+    Writes images and YOLO label files for one split with a worker pool.
+    A manifest keeps source size, mtime and annotation hash per image,
+    so a re-run only touches images or labels that changed.
+    """
+    def __init__(self, out_image, out_lab, mode = None, workers = None):
+        self.out_image = Path(out_image)
+        self.out_lab = Path(out_lab)
+        self.mode = mode or config.MATERIALIZE_MODE
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown materialize mode '{self.mode}', use one of {MODES}")
+        self.workers = workers or config.MATERIALIZE_WORKERS
+        self.manifest_path = self.out_image.parent / config.MATERIALIZE_MANIFEST
+
+        self._lock = threading.Lock()
+        self.stats = {"images": 0, "labels": 0, "skipped": 0, "missing": 0, "failed": 0, "bytes": 0}
+
+    # --- Manifest ---
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # A manifest written with another mode does not describe the files on disk
+        if manifest.get("mode") != self.mode:
+            return {}
+        return manifest.get("files", {})
+
+    def _save_manifest(self, files):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"mode": self.mode, "files": files}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    # --- Image transfer ---
+    def _place_image(self, src, dst):
+        if os.path.lexists(dst):
+            os.remove(dst)
+        if self.mode == "symlink":
+            os.symlink(os.path.abspath(src), dst)
+            return 0
+        if self.mode == "hardlink":
+            try:
+                os.link(src, dst)
+                return 0
+            except OSError:
+                # Different filesystem, fall back to a real copy
+                pass
+        shutil.copyfile(src, dst)
+        return os.path.getsize(dst)
+
+    def _process(self, job, previous):
+        file_name, src_img_path, label_text = job
+        # label_text is None when labels only go to the packed archive
+        ann_hash = hashlib.sha1(label_text.encode()).hexdigest() if label_text is not None else None
+        dst_img_path = self.out_image / file_name
+        label_file = self.out_lab / f"{os.path.splitext(file_name)[0]}.txt"
+
+        try:
+            src_stat = os.stat(src_img_path)
+        except OSError:
+            src_stat = None
+
+        entry = {
+            "size": src_stat.st_size if src_stat else None,
+            "mtime_ns": src_stat.st_mtime_ns if src_stat else None,
+            "ann_hash": ann_hash,
+        }
+
+        image_fresh = (
+            previous is not None
+            and src_stat is not None
+            and previous.get("size") == entry["size"]
+            and previous.get("mtime_ns") == entry["mtime_ns"]
+            and os.path.lexists(dst_img_path)
+        )
+        label_fresh = label_text is None or (
+            previous is not None
+            and previous.get("ann_hash") == ann_hash
+            and label_file.exists()
+        )
+
+        copied = 0
+        wrote_image = wrote_label = False
+        if src_stat is None:
+            logging.warning(f"Source image missing: {src_img_path}")
+        elif not image_fresh:
+            copied = self._place_image(src_img_path, dst_img_path)
+            wrote_image = True
+
+        if not label_fresh:
+            with open(label_file, 'w') as f_label:
+                f_label.write(label_text)
+            wrote_label = True
+
+        with self._lock:
+            self.stats["bytes"] += copied
+            self.stats["images"] += wrote_image
+            self.stats["labels"] += wrote_label
+            self.stats["missing"] += src_stat is None
+            self.stats["skipped"] += not (wrote_image or wrote_label)
+        return file_name, entry
+
+    def materialize(self, jobs):
+        """
+        jobs: iterable of (file_name, src_img_path, label_text or None).
+        Returns the stats dict including files/s and bytes/s.
+        """
+        self.out_image.mkdir(parents = True, exist_ok = True)
+        self.out_lab.mkdir(parents = True, exist_ok = True)
+        manifest = self._load_manifest()
+        new_manifest = {}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers = self.workers) as pool:
+            futures = [pool.submit(self._process, job, manifest.get(job[0])) for job in jobs]
+            for future in futures:
+                try:
+                    file_name, entry = future.result()
+                    new_manifest[file_name] = entry
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logging.error(f"Image Output Status: Fail! {e}")
+
+        self._save_manifest(new_manifest)
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        files = self.stats["images"] + self.stats["labels"]
+        self.stats["seconds"] = elapsed
+        self.stats["files_per_s"] = files / elapsed
+        self.stats["bytes_per_s"] = self.stats["bytes"] / elapsed
+
+        summary = (f"Materialized {self.stats['images']} images, {self.stats['labels']} labels "
+                   f"({self.stats['skipped']} unchanged, {self.stats['missing']} missing, "
+                   f"{self.stats['failed']} failed) in {elapsed:.1f}s: "
+                   f"{self.stats['files_per_s']:.1f} files/s, "
+                   f"{self.stats['bytes_per_s'] / 1e6:.1f} MB/s")
+        print(summary)
+        logging.info(summary)
+        return self.stats
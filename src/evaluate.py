@@ -0,0 +1,166 @@
+import logging
+import os
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import config
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def box_iou_matrix(a, b):
+    # (N, 4) x (M, 4) xyxy -> (N, M) IoU, one broadcast instead of a double loop
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis = 2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis = 1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis = 1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_predictions(pred_boxes, pred_cls, gt_boxes, gt_cls):
+    # (N, 10) bool: prediction i is a true positive at IoU threshold j,
+    # each ground truth box is matched at most once, highest IoU first.
+    correct = np.zeros((len(pred_boxes), len(IOU_THRESHOLDS)), dtype = bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return correct
+    iou = box_iou_matrix(pred_boxes, gt_boxes) * (pred_cls[:, None] == gt_cls[None, :])
+    for j, threshold in enumerate(IOU_THRESHOLDS):
+        pred_idx, gt_idx = np.nonzero(iou >= threshold)
+        if len(pred_idx) == 0:
+            continue
+        order = np.argsort(-iou[pred_idx, gt_idx], kind = "stable")
+        pred_idx, gt_idx = pred_idx[order], gt_idx[order]
+        _, first = np.unique(pred_idx, return_index = True)
+        pred_idx, gt_idx = pred_idx[first], gt_idx[first]
+        order = np.argsort(-iou[pred_idx, gt_idx], kind = "stable")
+        pred_idx, gt_idx = pred_idx[order], gt_idx[order]
+        _, first = np.unique(gt_idx, return_index = True)
+        correct[pred_idx[first], j] = True
+    return correct
+
+
+def average_precision(recall, precision):
+    # COCO style: precision envelope averaged at 101 recall points
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    idx = np.searchsorted(mrec, np.linspace(0, 1, 101), side = 'left')
+    return float(mpre[np.minimum(idx, len(mpre) - 1)].mean())
+
+
+def ap_per_class(correct, conf, pred_cls, gt_counts):
+    # (classes, 10) AP table; correct: (N, 10), gt_counts: {class: number of boxes}
+    order = np.argsort(-conf, kind = "stable")
+    correct, pred_cls = correct[order], pred_cls[order]
+    ap = np.zeros((len(gt_counts), len(IOU_THRESHOLDS)))
+    for row, (cls, n_gt) in enumerate(gt_counts.items()):
+        mask = pred_cls == cls
+        if n_gt == 0 or not mask.any():
+            continue
+        tp = np.cumsum(correct[mask], axis = 0)
+        fp = np.cumsum(~correct[mask], axis = 0)
+        recall = tp / n_gt
+        precision = tp / (tp + fp)
+        for j in range(len(IOU_THRESHOLDS)):
+            ap[row, j] = average_precision(recall[:, j], precision[:, j])
+    return ap
+
+
+def load_labels(label_path, width, height, label_names):
+    # YOLO .txt (cls xc yc w h, normalized) -> xyxy pixels and class names
+    if not os.path.exists(label_path) or os.path.getsize(label_path) == 0:
+        return np.zeros((0, 4)), np.array([], dtype = object)
+    data = np.loadtxt(label_path, ndmin = 2)
+    xc, yc = data[:, 1] * width, data[:, 2] * height
+    w, h = data[:, 3] * width, data[:, 4] * height
+    boxes = np.stack((xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2), axis = 1)
+    names = np.array([label_names.get(int(c), str(int(c))) for c in data[:, 0]], dtype = object)
+    return boxes, names
+
+
+def dataset_names():
+    # Class index -> name of the converted dataset, as written to pet.yaml
+    try:
+        import yaml
+        with open(config.PET_YAML_PATH, 'r') as f:
+            return {int(k): v.lower() for k, v in yaml.safe_load(f)['names'].items()}
+    except (OSError, KeyError, TypeError, ImportError):
+        return {i: name for i, name in enumerate(config.EVAL_DATASET_NAMES)}
+
+
+def evaluate_model(model, image_dir = None, label_dir = None, imgsz = None, max_images = None, device = "cpu"):
+    """
+    mAP50, mAP50-95 and recall per class on a converted YOLO split, plus predict latency.
+    Model and dataset classes are matched by name (the model predicts COCO ids
+    0 / 15 / 16, the dataset stores cat=0, dog=1, person=2).
+    """
+    image_dir = Path(image_dir or config.VAL_IMAGES_DIR)
+    label_dir = Path(label_dir or config.VAL_LABELS_DIR)
+    imgsz = imgsz or config.INFERENCE_IMG_SIZE
+    label_names = dataset_names()
+    model_names = {int(k): str(v).lower() for k, v in model.names.items()}
+    classes = [name for name in label_names.values() if name in model_names.values()]
+    # Predict filter in the model's own ids, COCO weights and dataset-trained weights differ
+    class_ids = [i for i, name in model_names.items() if name in classes]
+
+    images = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if max_images:
+        images = images[:max_images]
+
+    all_correct, all_conf, all_cls, latencies = [], [], [], []
+    gt_counts = {name: 0 for name in classes}
+    for path in images:
+        frame = cv2.imread(str(path))
+        if frame is None:
+            continue
+        height, width = frame.shape[:2]
+        gt_boxes, gt_names = load_labels(label_dir / f"{path.stem}.txt", width, height, label_names)
+        for name in gt_names:
+            if name in gt_counts:
+                gt_counts[name] += 1
+
+        start = time.perf_counter()
+        result = model.predict(frame, imgsz = imgsz, conf = config.EVAL_CONF, iou = config.EVAL_NMS_IOU,
+                               classes = class_ids, device = device, verbose = False)[0]
+        latencies.append(time.perf_counter() - start)
+
+        boxes = result.boxes
+        pred_boxes = boxes.xyxy.cpu().numpy()
+        pred_names = np.array([model_names[int(c)] for c in boxes.cls.cpu().numpy()], dtype = object)
+        all_correct.append(match_predictions(pred_boxes, pred_names, gt_boxes, gt_names))
+        all_conf.append(boxes.conf.cpu().numpy())
+        all_cls.append(pred_names)
+
+    if not latencies:
+        raise ValueError(f"No readable images in {image_dir}")
+    correct = np.concatenate(all_correct)
+    conf = np.concatenate(all_conf)
+    pred_cls = np.concatenate(all_cls)
+    ap = ap_per_class(correct, conf, pred_cls, gt_counts)
+    # Classes without ground truth in the split do not count towards mAP
+    present = np.array([n > 0 for n in gt_counts.values()], dtype = bool)
+
+    # Recall at the deployed confidence threshold and IoU 0.5
+    deployed = conf >= config.CONFIDENCE_THRESHOLD
+    recall = {name: (float((correct[:, 0] & deployed & (pred_cls == name)).sum() / n) if n else None)
+              for name, n in gt_counts.items()}
+
+    ms = np.array(latencies) * 1000
+    report = {
+        "images": len(latencies),
+        "mAP50": float(ap[present, 0].mean()) if present.any() else 0.0,
+        "mAP50_95": float(ap[present].mean()) if present.any() else 0.0,
+        "ap50": {name: (float(ap[i, 0]) if n else None) for i, (name, n) in enumerate(gt_counts.items())},
+        "recall": recall,
+        "latency_p50_ms": float(np.percentile(ms, 50)),
+        "latency_p95_ms": float(np.percentile(ms, 95)),
+        "latency_mean_ms": float(ms.mean()),
+    }
+    logging.info(f"Evaluation on {len(latencies)} images: mAP50 {report['mAP50']:.3f}, "
+                 f"mAP50-95 {report['mAP50_95']:.3f}, p50 {report['latency_p50_ms']:.1f} ms")
+    return report
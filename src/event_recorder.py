@@ -0,0 +1,168 @@
+import collections
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import config
+from metrics import REGISTRY
+
+
+class EventRecorder:
+    """
+    Keeps the last CLIP_PRE_ROLL seconds of frames as downscaled JPEGs in a fixed
+    size ring buffer. When a camera goes from idle (2) to active (1) the pre-roll
+    and every following frame are collected until the camera has been idle for
+    CLIP_POST_ROLL seconds, then the clip is written to an .mp4 on a worker thread.
+    push() only samples and queues the raw frame: resizing and JPEG encoding run
+    on the clip-encoder thread, which owns the ring buffer and the open clip.
+    """
+    def __init__(self, pre_roll = None, post_roll = None, fps = None, scale = None,
+                 clip_dir = None, camera_id = 0):
+        self.pre_roll = config.CLIP_PRE_ROLL if pre_roll is None else pre_roll
+        self.post_roll = config.CLIP_POST_ROLL if post_roll is None else post_roll
+        self.fps = fps or config.CLIP_FPS
+        self.scale = scale or config.CLIP_SCALE
+        self.clip_dir = Path(clip_dir or config.CLIP_DIR)
+        self.camera_id = camera_id
+
+        self._ring = collections.deque(maxlen = max(1, int(self.pre_roll * self.fps)))
+        self._interval = 1.0 / self.fps
+        self._last_sample = 0.0
+        self._prev_status = None
+        # Producer side state, the encoder thread keeps the frames themselves
+        self._recording = False
+        self._clip_started = 0.0
+        self._idle_since = None
+        self._clip = None
+
+        # Raw frames and start / finish marks in order; unbounded so marks are never
+        # lost, frames are dropped past CLIP_ENCODE_QUEUE_SIZE instead
+        self._frames = queue.Queue()
+        self._jobs = queue.Queue(maxsize = config.CLIP_QUEUE_SIZE)
+        self._encoder_thread = threading.Thread(target = self._encoder, name = "clip-encoder", daemon = True)
+        self._thread = threading.Thread(target = self._worker, name = "clip-writer", daemon = True)
+        self.last_clip = None
+
+        self.clips_written = REGISTRY.counter("clips_written", "Event clips written")
+        self.clips_dropped = REGISTRY.counter("clips_dropped", "Event clips dropped on a full queue")
+        self.frames_dropped = REGISTRY.counter("clip_frames_dropped", "Clip frames dropped while the encoder was behind")
+
+    def start(self):
+        self.clip_dir.mkdir(parents = True, exist_ok = True)
+        self._encoder_thread.start()
+        self._thread.start()
+        return self
+
+    def _compress(self, frame):
+        if self.scale != 1.0:
+            frame = cv2.resize(frame, None, fx = self.scale, fy = self.scale, interpolation = cv2.INTER_AREA)
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, config.CLIP_JPEG_QUALITY])
+        return buffer.tobytes() if ok else None
+
+    def push(self, frame, camera_status):
+        # Called from the capture / inference loop, never blocks on disk or encoding.
+        # The frame is queued as is: capture hands out a new array for every frame.
+        now = time.time()
+        started = self._prev_status == 2 and camera_status == 1
+        self._prev_status = camera_status
+
+        if started and not self._recording:
+            self._recording = True
+            self._clip_started = now
+            self._idle_since = None
+            self._frames.put(("start", now, None))
+            logging.info(f"Event clip started on camera {self.camera_id}")
+
+        if self._recording:
+            if camera_status == 1:
+                self._idle_since = None
+            elif self._idle_since is None:
+                self._idle_since = now
+            cooled_down = self._idle_since is not None and now - self._idle_since >= self.post_roll
+            too_long = now - self._clip_started >= config.CLIP_MAX_SECONDS
+            if cooled_down or too_long:
+                self._recording = False
+                self._idle_since = None
+                self._frames.put(("finish", now, None))
+
+        # Sample down to the clip frame rate
+        if now - self._last_sample < self._interval:
+            return
+        self._last_sample = now
+        if self._frames.qsize() >= config.CLIP_ENCODE_QUEUE_SIZE:
+            self.frames_dropped.inc()
+            return
+        self._frames.put(("frame", now, frame))
+
+    # --- Encoder thread ---
+    def _encoder(self):
+        while True:
+            item = self._frames.get()
+            if item is None:
+                break
+            kind, now, frame = item
+            try:
+                if kind == "start":
+                    self._clip = list(self._ring)
+                elif kind == "finish":
+                    self._finish()
+                else:
+                    encoded = self._compress(frame)
+                    if encoded is None:
+                        continue
+                    self._ring.append((now, encoded))
+                    if self._clip is not None:
+                        self._clip.append((now, encoded))
+            except Exception as e:
+                logging.error(f"Event clip encoder error: {e}")
+        # An event still in progress is written before the writer stops
+        self._finish()
+        self._jobs.put(None)
+
+    def _finish(self):
+        clip, self._clip = self._clip, None
+        if not clip:
+            return
+        try:
+            self._jobs.put_nowait(clip)
+        except queue.Full:
+            self.clips_dropped.inc()
+            logging.warning("Clip writer busy, event clip dropped")
+
+    def _worker(self):
+        while True:
+            clip = self._jobs.get()
+            if clip is None:
+                return
+            try:
+                self._write_clip(clip)
+            except Exception as e:
+                logging.error(f"Event clip could not be written: {e}")
+
+    def _write_clip(self, clip):
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(clip[0][0]))
+        path = self.clip_dir / f"cam{self.camera_id}_{stamp}.mp4"
+        writer = None
+        for _, encoded in clip:
+            frame = cv2.imdecode(np.frombuffer(encoded, dtype = np.uint8), cv2.IMREAD_COLOR)
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*config.CLIP_FOURCC),
+                                         self.fps, (w, h))
+            writer.write(frame)
+        if writer is not None:
+            writer.release()
+        self.last_clip = path
+        self.clips_written.inc()
+        duration = clip[-1][0] - clip[0][0]
+        logging.info(f"Event clip saved to {path} ({len(clip)} frames, {duration:.1f}s)")
+
+    def stop(self):
+        # The encoder flushes an event still in progress, then the writer finishes
+        self._recording = False
+        self._frames.put(None)
+        self._encoder_thread.join(timeout = 10)
+        self._thread.join(timeout = 10)
@@ -0,0 +1,200 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera INTEGER NOT NULL,
+    class_name TEXT NOT NULL,
+    confidence REAL,
+    duration REAL,
+    UNIQUE (ts, camera, class_name)
+);
+CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections (ts);
+-- Covering index: hourly queries never touch the table itself
+CREATE INDEX IF NOT EXISTS idx_detections_class_ts ON detections (class_name, ts, duration);
+CREATE TABLE IF NOT EXISTS import_state (
+    path TEXT PRIMARY KEY,
+    inode INTEGER,
+    offset INTEGER
+);
+"""
+
+# Line written to app.log for every finished event, parsed back by LogImporter
+EVENT_LOG_PATTERN = re.compile(
+    r"Detection event: start=(?P<ts>[\d.]+) camera=(?P<camera>\d+) "
+    r"classes=(?P<classes>[\w,]*) confidence=(?P<confidence>[\d.]+) duration=(?P<duration>[\d.]+)"
+)
+
+
+class EventStore:
+    """
+    SQLite (WAL) store of detection events, one row per class per event,
+    indexed by time and by (class, time) for calendar queries.
+    Appends are buffered and written in one transaction per flush.
+    """
+    def __init__(self, db_path = None):
+        self.db_path = str(db_path or config.EVENT_DB_PATH)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread = False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.time()
+
+    def append(self, ts, camera, classes, confidence, duration):
+        rows = [(round(ts, 3), camera, name, confidence, duration) for name in classes]
+        with self._lock:
+            self._pending.extend(rows)
+            due = (len(self._pending) >= config.EVENT_FLUSH_SIZE
+                   or time.time() - self._last_flush >= config.EVENT_FLUSH_INTERVAL)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._last_flush = time.time()
+            if not rows:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO detections (ts, camera, class_name, confidence, duration) "
+                    "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def activity_per_hour(self, class_name, days = 30):
+        # [(hour "YYYY-MM-DD HH:00", events, seconds)] for one class
+        self.flush()
+        since = time.time() - days * 86400
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT CAST(ts / 3600 AS INTEGER) AS bucket, COUNT(*), COALESCE(SUM(duration), 0) "
+                "FROM detections WHERE class_name = ? AND ts >= ? GROUP BY bucket ORDER BY bucket",
+                (class_name, since)).fetchall()
+        # Format only the few hundred buckets, not every row
+        return [(time.strftime("%Y-%m-%d %H:00", time.localtime(bucket * 3600)), events, seconds)
+                for bucket, events, seconds in rows]
+
+    def activity_per_day(self, days = 30):
+        # [(day, class_name, events, seconds)] for every class
+        self.flush()
+        since = time.time() - days * 86400
+        with self._lock:
+            return self._conn.execute(
+                "SELECT date(ts, 'unixepoch', 'localtime') AS day, class_name, "
+                "COUNT(*), COALESCE(SUM(duration), 0) FROM detections "
+                "WHERE ts >= ? GROUP BY day, class_name ORDER BY day",
+                (since,)).fetchall()
+
+    def events_between(self, start_ts, end_ts, class_name = None):
+        self.flush()
+        query = ("SELECT ts, camera, class_name, confidence, duration FROM detections "
+                 "WHERE ts >= ? AND ts < ?")
+        params = [start_ts, end_ts]
+        if class_name is not None:
+            query += " AND class_name = ?"
+            params.append(class_name)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY ts", params).fetchall()
+
+    # --- Import bookkeeping ---
+    def get_import_state(self, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT inode, offset FROM import_state WHERE path = ?", (str(path),)).fetchone()
+        return row if row else (None, 0)
+
+    def set_import_state(self, path, inode, offset):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO import_state (path, inode, offset) VALUES (?, ?, ?)",
+                (str(path), inode, offset))
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+class DetectionEventTracker:
+    """
+    Turns the per-frame output of take_inference into events: an event starts
+    with the first detected class and ends when the camera returns to idle.
+    """
+    def __init__(self, store, class_name, camera = 0):
+        self.store = store
+        self.class_name = class_name
+        self.camera = camera
+        self._start = None
+        self._classes = set()
+        self._confidence = 0.0
+
+    def update(self, camera_status, detected_classes, results = None):
+        if detected_classes:
+            if self._start is None:
+                self._start = time.time()
+            self._classes.update(int(cls) for cls in detected_classes)
+            if results is not None and len(results.boxes):
+                self._confidence = max(self._confidence, float(results.boxes.conf.max()))
+        elif camera_status == 2 and self._start is not None:
+            self.close()
+
+    def close(self):
+        if self._start is None:
+            return
+        names = sorted(self.class_name.get(cls, str(cls)) for cls in self._classes)
+        duration = time.time() - self._start
+        self.store.append(self._start, self.camera, names, self._confidence, duration)
+        logging.info(f"Detection event: start={self._start:.3f} camera={self.camera} "
+                     f"classes={','.join(names)} confidence={self._confidence:.3f} duration={duration:.1f}")
+        self._start = None
+        self._classes = set()
+        self._confidence = 0.0
+
+
+class LogImporter:
+    """
+    Tails app.log from the offset stored in the database, so each run only
+    reads the lines appended since the last import. A rotated or truncated
+    file (new inode or smaller size) is read again from the start.
+    """
+    def __init__(self, store, log_path = None):
+        self.store = store
+        self.log_path = str(log_path or config.LOG_FILE)
+
+    def run(self):
+        try:
+            stat = os.stat(self.log_path)
+        except OSError:
+            return 0
+        inode, offset = self.store.get_import_state(self.log_path)
+        if inode != stat.st_ino or stat.st_size < offset:
+            offset = 0
+
+        imported = 0
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            for raw_line in f:
+                # Leave a partially written last line for the next run
+                if not raw_line.endswith(b"\n"):
+                    break
+                offset += len(raw_line)
+                match = EVENT_LOG_PATTERN.search(raw_line.decode('utf-8', errors = 'replace'))
+                if match is None:
+                    continue
+                classes = [name for name in match["classes"].split(",") if name]
+                self.store.append(float(match["ts"]), int(match["camera"]), classes,
+                                  float(match["confidence"]), float(match["duration"]))
+                imported += 1
+
+        self.store.flush()
+        self.store.set_import_state(self.log_path, stat.st_ino, offset)
+        if imported:
+            logging.info(f"Imported {imported} detection events from {self.log_path}")
+        return imported
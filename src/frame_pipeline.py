@@ -0,0 +1,218 @@
+import threading
+import time
+import logging
+import config
+from metrics import REGISTRY
+from event_recorder import EventRecorder
+from event_store import DetectionEventTracker, EventStore
+from player_module import TriggerEngine
+
+
+class LatestFrameBuffer:
+    """
+    Bounded hand-off slot between two pipeline stages.
+    A new frame always replaces the one waiting, so the reader never sees stale frames.
+    """
+    def __init__(self, capacity = 1):
+        self.capacity = max(1, capacity)
+        self._items = []
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.capacity:
+                # --- Latest frame wins: discard the oldest waiting frame ---
+                self._items.pop(0)
+                self.dropped += 1
+            self._items.append(item)
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, timeout = None):
+        # Block until a frame is available, return None on timeout or close.
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.pop(0)
+
+    def peek(self):
+        # Return the newest frame without consuming it.
+        with self._cond:
+            return self._items[-1] if self._items else None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def sequence(self):
+        return self._seq
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.dropped = 0
+        self.busy_time = 0.0
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        self.timer = REGISTRY.timer("pipeline_stage_seconds", "Busy time per pipeline stage", {"stage": name})
+
+    def record(self, elapsed):
+        self.timer.observe(elapsed)
+        with self._lock:
+            self.processed += 1
+            self.busy_time += elapsed
+
+    def snapshot(self):
+        with self._lock:
+            wall = max(time.perf_counter() - self.started_at, 1e-9)
+            avg_ms = (self.busy_time / self.processed * 1000) if self.processed else 0.0
+            return {
+                "stage": self.name,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "fps": self.processed / wall,
+                "avg_ms": avg_ms,
+            }
+
+
+class VisionPipeline:
+    """
+    Runs capture and inference as their own threads, rendering stays on the caller
+    thread because cv2.imshow / waitKey must run on the main thread.
+    """
+    def __init__(self, capture, detector, context):
+        self.capture = capture
+        self.detector = detector
+        self.context = context
+        self.camera_status = None
+        # Set by the render stage: False while no window, preview client or monitor shows frames
+        self.watched = True
+        self._last_snapshot = 0.0
+        # Pre-roll ring buffer, writes a clip around each idle -> active transition
+        self.recorder = EventRecorder().start() if config.CLIP_RECORDING else None
+        # Detection events for the calendar
+        self.events = None
+        if config.EVENT_STORE_ENABLED:
+            self.events = DetectionEventTracker(EventStore(), detector.class_name)
+        # Clips played by detection rules, one player worker for the whole run
+        self.triggers = TriggerEngine().start() if config.PLAYER_ENABLED else None
+
+        self.stats = {
+            "capture": StageStats("capture"),
+            "inference": StageStats("inference"),
+            "render": StageStats("render"),
+        }
+        self._threads = []
+
+    # --- Stage: Capture ---
+    def _capture_loop(self):
+        stats = self.stats["capture"]
+        while self.context.is_running:
+            start = time.perf_counter()
+            ret, frame = self.capture.read()
+            if not ret:
+                print("Failed to receive frame, exiting...")
+                logging.error("Could not generate frame, please check camera")
+                self.context.is_running = False
+                break
+            stats.record(time.perf_counter() - start)
+            self.context.raw_frames.put((frame, time.time()))
+        self.context.raw_frames.close()
+
+    # --- Stage: Inference ---
+    def _inference_loop(self):
+        stats = self.stats["inference"]
+        while self.context.is_running:
+            item = self.context.raw_frames.get(timeout = 0.5)
+            if item is None:
+                continue
+            frame, captured_at = item
+            start = time.perf_counter()
+            try:
+                annotated_frame, results, self.camera_status, detected_classes = (
+                    self.detector.take_inference(frame, self.camera_status, watched = self.watched)
+                )
+            except Exception as e:
+                logging.error(f"Inference stage error: {e}")
+                continue
+            stats.record(time.perf_counter() - start)
+
+            if annotated_frame is None:
+                annotated_frame = frame
+            overlay = self.detector.state.overlay
+            self.context.current_frame = frame
+            self.context.visual_info = detected_classes
+            self._auto_snapshot(annotated_frame, frame, overlay, detected_classes)
+            if self.recorder is not None:
+                self.recorder.push(frame, self.camera_status)
+            if self.events is not None:
+                self.events.update(self.camera_status, detected_classes, results)
+            if self.triggers is not None:
+                self.triggers.update(detected_classes)
+            self.context.annotated_frames.put((annotated_frame, frame, captured_at, self.camera_status, overlay))
+        self.context.annotated_frames.close()
+
+    def _auto_snapshot(self, annotated_frame, frame, overlay, detected_classes):
+        # Save on detection, at most once per SNAPSHOT_DETECTION_INTERVAL
+        if not config.SNAPSHOT_ON_DETECTION or not detected_classes:
+            return
+        now = time.time()
+        if now - self._last_snapshot < config.SNAPSHOT_DETECTION_INTERVAL:
+            return
+        self._last_snapshot = now
+        # Drawn only for the snapshot, in a copy: the render thread owns the display buffer
+        annotated_frame = self.detector.render(annotated_frame, overlay, copy = True)
+        self.detector._img_save(annotated_frame, frame, tag = "detect")
+
+    def start(self):
+        for name, target in (("capture", self._capture_loop), ("inference", self._inference_loop)):
+            thread = threading.Thread(target = target, name = f"pipeline-{name}", daemon = True)
+            thread.start()
+            self._threads.append(thread)
+
+    def next_frame(self, timeout = 0.5):
+        # Called by the render stage, returns (frame, raw_frame, captured_at, camera_status, overlay),
+        # frame is not drawn on yet: the render stage draws the overlay if it shows it.
+        return self.context.annotated_frames.get(timeout = timeout)
+
+    def record_render(self, elapsed):
+        self.stats["render"].record(elapsed)
+
+    def stop(self):
+        self.context.is_running = False
+        self.context.raw_frames.close()
+        self.context.annotated_frames.close()
+        for thread in self._threads:
+            thread.join(timeout = 2)
+        if self.recorder is not None:
+            self.recorder.stop()
+        if self.events is not None:
+            self.events.close()
+            self.events.store.close()
+        if self.triggers is not None:
+            self.triggers.stop()
+
+    def report(self):
+        # Drops are counted where a frame is overwritten before the next stage picks it up.
+        self.stats["capture"].dropped = self.context.raw_frames.dropped
+        self.stats["inference"].dropped = self.context.annotated_frames.dropped
+        for name, stats in self.stats.items():
+            REGISTRY.gauge("pipeline_dropped_frames", "Frames overwritten before use",
+                           {"stage": name}).set(stats.dropped)
+        return [stats.snapshot() for stats in self.stats.values()]
+
+    def log_report(self):
+        for row in self.report():
+            line = (f"Stage {row['stage']}: {row['fps']:.2f} fps, "
+                    f"avg {row['avg_ms']:.1f} ms, dropped {row['dropped']}")
+            print(line)
+            logging.info(line)
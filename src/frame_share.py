@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+import config
+
+# Header: [sequence, latest slot, height, width, channels, last read in ms] as int64
+HEADER_FIELDS = 6
+SLOTS = 3
+
+
+class SharedFrameBuffer:
+    """
+    Preallocated triple buffer for the newest annotated frame. The vision loop
+    copies each frame into the next slot and then bumps the sequence number, so
+    readers always find a complete frame without allocating anything per frame.
+    With three slots the writer needs two more publishes before it reaches the
+    slot a reader is currently uploading.
+
+    shared = True places the buffer in multiprocessing.shared_memory, another
+    process can then open it with SharedFrameBuffer.attach(name, shape).
+    """
+    def __init__(self, shape = None, shared = False, name = None):
+        self.shared = shared
+        self.name = name
+        self._shm = None
+        self._header = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if shape is not None:
+            self._allocate(tuple(shape))
+        elif shared:
+            raise ValueError("A shared frame buffer needs the frame shape up front")
+
+    @classmethod
+    def attach(cls, name, shape):
+        # Open a buffer created by another process
+        buffer = cls.__new__(cls)
+        buffer.shared = True
+        buffer.name = name
+        buffer._lock = threading.Lock()
+        buffer._allocate(tuple(shape), create = False)
+        return buffer
+
+    def _allocate(self, shape, create = True):
+        frame_bytes = int(np.prod(shape))
+        header_bytes = HEADER_FIELDS * 8
+        if self.shared:
+            from multiprocessing import shared_memory
+            self._shm = shared_memory.SharedMemory(name = self.name, create = create,
+                                                   size = header_bytes + SLOTS * frame_bytes)
+            self.name = self._shm.name
+            raw = self._shm.buf
+        else:
+            raw = np.zeros(header_bytes + SLOTS * frame_bytes, dtype = np.uint8).data
+        self._header = np.ndarray((HEADER_FIELDS,), dtype = np.int64, buffer = raw)
+        self._slots = np.ndarray((SLOTS,) + shape, dtype = np.uint8, buffer = raw, offset = header_bytes)
+        self._owner = create
+        if create:
+            self._header[:] = (0, 0) + shape + (0,)
+
+    @property
+    def shape(self):
+        return None if self._slots is None else self._slots.shape[1:]
+
+    @property
+    def sequence(self):
+        return 0 if self._header is None else int(self._header[0])
+
+    def publish(self, frame):
+        # Called by the vision loop, one copy into preallocated memory
+        with self._lock:
+            if self._slots is None:
+                self._allocate(frame.shape)
+            slot = (int(self._header[1]) + 1) % SLOTS
+            target = self._slots[slot]
+            if frame.shape == target.shape:
+                np.copyto(target, frame)
+            else:
+                # Camera changed resolution, scale into the existing slot
+                cv2.resize(frame, (target.shape[1], target.shape[0]), dst = target)
+            self._header[1] = slot
+            self._header[0] += 1
+
+    def has_consumers(self, idle = None):
+        # True while some reader polled within `idle` seconds, the vision loop
+        # skips drawing and publishing otherwise. Before the first frame the
+        # readers have nothing to poll, so publish that one.
+        if self._header is None:
+            return True
+        idle = config.OVERLAY_CONSUMER_IDLE if idle is None else idle
+        return time.time() * 1000 - int(self._header[5]) < idle * 1000
+
+    def latest(self, last_sequence = -1):
+        # (frame view, sequence), frame is None when nothing new since last_sequence
+        if self._header is None:
+            return None, 0
+        # Every poll counts as a consumer, also across processes in shared memory
+        self._header[5] = int(time.time() * 1000)
+        sequence = int(self._header[0])
+        if sequence == 0 or sequence == last_sequence:
+            return None, sequence
+        return self._slots[int(self._header[1])], sequence
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._header = self._slots = None
+        self._shm.close()
+        # The creating process removes the segment
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+
+class MJPEGServer(ThreadingHTTPServer):
+    """
+    Local preview for boxes without a display, open http://127.0.0.1:<port>/.
+    Each new frame is JPEG encoded once and sent to every connected client.
+    """
+    daemon_threads = True
+
+    def __init__(self, frame_buffer, host = "127.0.0.1", port = None, fps = None, quality = None):
+        super().__init__((host, port or config.PREVIEW_PORT), _MJPEGHandler)
+        self.frame_buffer = frame_buffer
+        self.interval = 1.0 / (fps or config.PREVIEW_FPS)
+        self.quality = quality or config.PREVIEW_JPEG_QUALITY
+        self._encode_lock = threading.Lock()
+        self._jpeg = None
+        self._jpeg_sequence = 0
+        self.running = True
+
+    def jpeg(self, last_sequence):
+        # (jpeg bytes, sequence) of the newest frame, None when unchanged
+        with self._encode_lock:
+            # Polled even without a new frame, that is what keeps frames coming
+            frame, sequence = self.frame_buffer.latest(self._jpeg_sequence)
+            if frame is not None:
+                ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if ok:
+                    self._jpeg, self._jpeg_sequence = encoded.tobytes(), sequence
+            if self._jpeg is None or self._jpeg_sequence == last_sequence:
+                return None, last_sequence
+            return self._jpeg, self._jpeg_sequence
+
+    def shutdown(self):
+        self.running = False
+        super().shutdown()
+        self.server_close()
+
+
+class _MJPEGHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "":
+            body = b'<html><body style="margin:0;background:#000"><img src="/stream"></body></html>'
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path != "/stream":
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        sequence = -1
+        try:
+            while self.server.running:
+                jpeg, sequence_now = self.server.jpeg(sequence)
+                if jpeg is None:
+                    time.sleep(self.server.interval)
+                    continue
+                sequence = sequence_now
+                self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+                time.sleep(self.server.interval)
+        except (BrokenPipeError, ConnectionResetError):
+            # Browser tab closed
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_preview(frame_buffer, port = None, host = "127.0.0.1"):
+    # MJPEG preview from a daemon thread, bound to localhost only
+    server = MJPEGServer(frame_buffer, host = host, port = port)
+    thread = threading.Thread(target = server.serve_forever, name = "preview-http", daemon = True)
+    thread.start()
+    logging.info(f"Preview stream on http://{host}:{server.server_port}/")
+    return server
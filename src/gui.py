@@ -1,5 +1,10 @@
+from pathlib import Path
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.app import App
+from kivy.clock import Clock
+from kivy.graphics.texture import Texture
+from kivy.lang import Builder
+import config
 
 class WindowManager(ScreenManager):
     pass
@@ -8,14 +13,50 @@ class MainScreen(Screen):
     def logic_action(self):
         App.get_running_app().stop()
 
+class MenuScreen(MainScreen):
+
+    pass
+
 class ControlScreen(Screen):
 
     pass
 
 class MonitorScreen(Screen):
-    
-    pass
+    # Shows the newest frame of the app's SharedFrameBuffer at the UI refresh rate
+
+    def on_enter(self):
+        self._sequence = -1
+        self._event = Clock.schedule_interval(self._refresh, 1.0 / config.UI_REFRESH_FPS)
+
+    def on_leave(self):
+        self._event.cancel()
+
+    def _refresh(self, dt):
+        frame_buffer = App.get_running_app().frame_buffer
+        frame, sequence = frame_buffer.latest(self._sequence)
+        if frame is None:
+            return
+        self._sequence = sequence
+        preview = self.ids.preview
+        height, width = frame.shape[:2]
+        texture = preview.texture
+        if texture is None or texture.size != (width, height):
+            # Only on the first frame or a resolution change
+            texture = Texture.create(size = (width, height), colorfmt = 'bgr')
+            texture.flip_vertical()
+            preview.texture = texture
+        # Upload straight from the shared slot, BGR as OpenCV produced it
+        texture.blit_buffer(frame.reshape(-1), colorfmt = 'bgr', bufferfmt = 'ubyte')
+        preview.canvas.ask_update()
 
 class SettingScreen(Screen):
 
     pass
+
+class DashboardApp(App):
+    def __init__(self, frame_buffer, **kwargs):
+        super().__init__(**kwargs)
+        self.frame_buffer = frame_buffer
+
+    def build(self):
+        return Builder.load_file(str(Path(__file__).with_name("dashboard.kv")))
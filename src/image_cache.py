@@ -0,0 +1,297 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import cv2
+import numpy as np
+import config
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+INDEX_NAME = "index.json"
+
+
+def resize_to(img, size):
+    # Exactly ultralytics BaseDataset.load_image (rect_mode): long side = size,
+    # ceil() for the short side and INTER_LINEAR both ways, so pixels match
+    h0, w0 = img.shape[:2]
+    r = size / max(h0, w0)
+    if r != 1:
+        img = cv2.resize(img, (min(math.ceil(w0 * r), size), min(math.ceil(h0 * r), size)),
+                         interpolation = cv2.INTER_LINEAR)
+    return img
+
+
+def cache_dir_for(image_dir):
+    # One cache per split folder, e.g. data/cache/train_1a2b3c4d
+    image_dir = Path(image_dir).resolve()
+    digest = hashlib.sha1(str(image_dir).encode()).hexdigest()[:8]
+    return Path(config.IMAGE_CACHE_DIR) / f"{image_dir.parent.name}_{digest}"
+
+
+class ImageCache:
+    """
+    Decoded training images stored once at IMG_SIZE in memory-mapped .npy shards.
+    Each shard holds shard_size slots of size x size x 3, an image sits in the top
+    left corner of its slot (zero padded) and the index records its real size,
+    so readers get the same array ultralytics would decode from the JPEG.
+    """
+    def __init__(self, image_dir, cache_dir = None, img_size = None, shard_size = None):
+        self.image_dir = Path(image_dir)
+        self.cache_dir = Path(cache_dir or cache_dir_for(image_dir))
+        self.img_size = img_size or config.IMG_SIZE
+        self.shard_size = shard_size or config.IMAGE_CACHE_SHARD_SIZE
+        self.entries = {}
+        self._shards = {}
+        self._load_index()
+
+    def _load_index(self):
+        index_path = self.cache_dir / INDEX_NAME
+        if not index_path.exists():
+            return
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        if index.get("img_size") == self.img_size and index.get("shard_size") == self.shard_size:
+            self.entries = index["entries"]
+
+    def _source_files(self):
+        files = {}
+        for entry in os.scandir(self.image_dir):
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_SUFFIXES:
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, int(stat.st_mtime))
+        return files
+
+    def is_current(self):
+        files = self._source_files()
+        return bool(files) and len(files) == len(self.entries) and all(
+            name in self.entries and tuple(self.entries[name][6:8]) == stat for name, stat in files.items())
+
+    def build(self, workers = None):
+        # Decode every image once, rebuilds only when the folder changed
+        if self.is_current():
+            logging.info(f"Image cache {self.cache_dir} is up to date ({len(self.entries)} images)")
+            return 0
+        files = sorted(self._source_files().items())
+        self.cache_dir.mkdir(parents = True, exist_ok = True)
+        self.close()
+        for old in self.cache_dir.glob("shard_*.npy"):
+            old.unlink()
+
+        start = time.perf_counter()
+        size = self.img_size
+        entries = {}
+        for shard_id, first in enumerate(range(0, len(files), self.shard_size)):
+            chunk = files[first:first + self.shard_size]
+            shard = np.lib.format.open_memmap(self.cache_dir / f"shard_{shard_id:04d}.npy", mode = 'w+',
+                                              dtype = np.uint8, shape = (len(chunk), size, size, 3))
+
+            def fill(row):
+                name, (file_size, mtime) = chunk[row]
+                img = cv2.imread(str(self.image_dir / name), cv2.IMREAD_COLOR)
+                if img is None:
+                    return name, None
+                h0, w0 = img.shape[:2]
+                img = resize_to(img, size)
+                h, w = img.shape[:2]
+                shard[row, :h, :w] = img
+                return name, [shard_id, row, h, w, h0, w0, file_size, mtime]
+
+            # cv2 releases the GIL while decoding, threads are enough
+            with ThreadPoolExecutor(max_workers = workers or config.IMAGE_CACHE_WORKERS) as pool:
+                for name, entry in pool.map(fill, range(len(chunk))):
+                    if entry is None:
+                        logging.warning(f"Image cache: could not decode {name}")
+                        continue
+                    entries[name] = entry
+            shard.flush()
+            del shard
+
+        self.entries = entries
+        with open(self.cache_dir / INDEX_NAME, 'w') as f:
+            json.dump({"img_size": self.img_size, "shard_size": self.shard_size, "entries": entries}, f)
+        elapsed = time.perf_counter() - start
+        print(f"Image cache built: {len(entries)} images in {elapsed:.1f}s -> {self.cache_dir}")
+        logging.info(f"Image cache built: {len(entries)} images in {elapsed:.1f}s at {self.cache_dir}")
+        return len(entries)
+
+    def _shard(self, shard_id):
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            # Read only mapping, pages are shared by every dataloader worker
+            shard = np.load(self.cache_dir / f"shard_{shard_id:04d}.npy", mmap_mode = 'r')
+            self._shards[shard_id] = shard
+        return shard
+
+    def get(self, image_path):
+        # (image, (h0, w0), (h, w)) like ultralytics load_image, None on a cache miss
+        entry = self.entries.get(Path(image_path).name)
+        if entry is None:
+            return None
+        shard_id, row, h, w, h0, w0 = entry[:6]
+        # Copy out of the read only map, augmentations may write into the image
+        img = np.array(self._shard(shard_id)[row, :h, :w])
+        return img, (h0, w0), (h, w)
+
+    def close(self):
+        self._shards = {}
+
+    def __getstate__(self):
+        # Workers reopen the shards themselves instead of receiving a copy of the data
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def measure_decode_savings(cache, sample = None, epochs = None):
+    # Time JPEG decode + resize against the cache on a sample of images. The per
+    # epoch figures are an estimate scaled from that sample, not a timed epoch,
+    # use time_epoch() for a real one.
+    names = sorted(cache.entries)[:sample or config.IMAGE_CACHE_BENCH_SAMPLE]
+    if not names:
+        return None
+    start = time.perf_counter()
+    for name in names:
+        resize_to(cv2.imread(str(cache.image_dir / name), cv2.IMREAD_COLOR), cache.img_size)
+    decode_time = (time.perf_counter() - start) / len(names)
+
+    start = time.perf_counter()
+    for name in names:
+        cache.get(name)
+    cache_time = (time.perf_counter() - start) / len(names)
+
+    epochs = epochs or config.TRAIN_EPOCHS
+    saved_per_epoch = (decode_time - cache_time) * len(cache)
+    return {
+        "images": len(cache),
+        "decode_ms": decode_time * 1000,
+        "cache_ms": cache_time * 1000,
+        "sample": len(names),
+        "est_saved_per_epoch_s": saved_per_epoch,
+        "est_saved_total_s": saved_per_epoch * epochs,
+        "epochs": epochs,
+    }
+
+
+def time_epoch(image_dir, data_yaml = None, img_size = None):
+    """
+    One real pass over a training split with the train augmentations (mosaic
+    included), once decoding the JPEGs and once from the cache. Returns seconds
+    for both, the model forward / backward is left out since it is the same.
+    """
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+
+    img_size = img_size or config.IMG_SIZE
+    cfg = get_cfg(overrides = {"imgsz": img_size})
+    data = check_det_dataset(str(data_yaml or config.TRAIN_DATA))
+    cache = ImageCache(image_dir, img_size = img_size)
+    cached_class = _cached_classes()[0]
+    timings = {}
+    for mode in ("decode", "cache"):
+        dataset = build_yolo_dataset(cfg, str(image_dir), cfg.batch, data, mode = "train")
+        if mode == "cache":
+            dataset.__class__ = cached_class
+            dataset.image_cache = cache
+        start = time.perf_counter()
+        for i in range(len(dataset)):
+            dataset[i]
+        timings[f"{mode}_epoch_s"] = time.perf_counter() - start
+    timings["images"] = len(cache)
+    return timings
+
+
+def build_training_caches(image_dirs = None):
+    # Build (or reuse) the caches of the train and val splits
+    image_dirs = image_dirs or [config.TRAIN_IMAGES_DIR, config.VAL_IMAGES_DIR]
+    caches = []
+    for image_dir in image_dirs:
+        cache = ImageCache(image_dir)
+        cache.build()
+        caches.append(cache)
+    return caches
+
+
+def _cached_classes():
+    # Built on first use so importing this module never pulls in ultralytics
+    global CachedYOLODataset, CachedDetectionTrainer
+    from ultralytics.data import YOLODataset
+    from ultralytics.models.yolo.detect import DetectionTrainer
+
+    class CachedYOLODataset(YOLODataset):
+        image_cache = None
+
+        def load_image(self, i, rect_mode = True):
+            # Images already in the buffer and square-stretch mode (rect_mode False) go the usual way
+            if self.ims[i] is not None or not rect_mode or self.image_cache is None:
+                return super().load_image(i, rect_mode)
+            hit = self.image_cache.get(self.im_files[i])
+            if hit is None:
+                return super().load_image(i, rect_mode)
+            im, hw0, hw = hit
+            # Same bookkeeping as BaseDataset.load_image: Mosaic picks its extra
+            # images from self.buffer, an empty buffer fails the first batch
+            if self.augment:
+                self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, hw
+                self.buffer.append(i)
+                if 1 < len(self.buffer) >= self.max_buffer_length:
+                    j = self.buffer.pop(0)
+                    if self.cache != "ram":
+                        self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+            return im, hw0, hw
+
+    class CachedDetectionTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode = "train", batch = None):
+            dataset = super().build_dataset(img_path, mode, batch)
+            # Only a cache built at this imgsz loads its index, sweeps may train at several sizes
+            cache = ImageCache(img_path, img_size = self.args.imgsz)
+            if type(dataset) is not YOLODataset or len(cache) == 0:
+                logging.warning(f"No image cache for {img_path} at imgsz {self.args.imgsz}, decoding JPEGs")
+                return dataset
+            dataset.__class__ = CachedYOLODataset
+            dataset.image_cache = cache
+            logging.info(f"{mode} dataset reads {len(cache)} images from {cache.cache_dir}")
+            return dataset
+
+    return CachedYOLODataset, CachedDetectionTrainer
+
+
+def __getattr__(name):
+    # Module level names keep the dataset picklable for spawned dataloader workers
+    if name in ("CachedYOLODataset", "CachedDetectionTrainer"):
+        classes = dict(zip(("CachedYOLODataset", "CachedDetectionTrainer"), _cached_classes()))
+        return classes[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def report_cache_savings():
+    # Build the caches, then print the decode time they save per epoch
+    for cache in build_training_caches():
+        result = measure_decode_savings(cache)
+        if result is None:
+            print(f"{cache.image_dir}: no images")
+            continue
+        line = (f"{cache.image_dir.parent.name}: decode {result['decode_ms']:.2f} ms vs cache "
+                f"{result['cache_ms']:.2f} ms per image over {result['sample']} images, estimated "
+                f"{result['est_saved_per_epoch_s']:.1f}s saved per epoch "
+                f"({result['est_saved_total_s'] / 60:.1f} min over {result['epochs']} epochs)")
+        print(line)
+        logging.info(line)
+
+
+if __name__ == "__main__":
+    config.ensure_dirs()
+    report_cache_savings()
+    if "--epoch" in sys.argv:
+        # Measured instead of estimated: a full augmented pass over the train split
+        result = time_epoch(config.TRAIN_IMAGES_DIR)
+        print(f"train epoch ({result['images']} images): decode {result['decode_epoch_s']:.1f}s, "
+              f"cache {result['cache_epoch_s']:.1f}s")
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import config
+
+# Modules whose import cost we track, run.py must stay cheap
+DEFAULT_TARGETS = ["run", "config", "coco_to_yolo", "train_pt", "main"]
+
+
+def parse_importtime(stderr):
+    # `-X importtime` lines: "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            # One space follows the bar, nested imports are indented by two more
+            rows.append((name.rstrip()[1:], int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(target, runs = 3):
+    # Fresh interpreter per run, best of `runs` to reduce noise
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(config.BASE_DIR), str(config.BASE_DIR / "src"), env.get("PYTHONPATH", "")])
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"],
+                              capture_output = True, text = True, env = env, cwd = str(config.BASE_DIR))
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+            return {"target": target, "error": error}
+        rows = parse_importtime(proc.stderr)
+        total_us = sum(self_us for _, self_us, _ in rows)
+        if best is None or total_us < best["import_ms"] * 1000:
+            # Direct imports of the target (one indent level) show where its time goes
+            heaviest = sorted((row for row in rows if row[0].startswith("  ") and not row[0].startswith("    ")),
+                              key = lambda row: row[2], reverse = True)[:5]
+            best = {
+                "target": target,
+                "import_ms": total_us / 1000,
+                "wall_ms": wall * 1000,
+                "modules": len(rows),
+                "heaviest": [{"module": name.strip(), "cumulative_ms": cum / 1000}
+                             for name, _, cum in heaviest],
+            }
+    return best
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Import time of the project entry points")
+    parser.add_argument("targets", nargs = "*", default = DEFAULT_TARGETS)
+    parser.add_argument("--runs", type = int, default = 3)
+    parser.add_argument("--output", default = str(config.IMPORT_BENCHMARK_FILE),
+                        help = "JSONL file the results are appended to")
+    args = parser.parse_args(argv)
+
+    results = [measure(target, args.runs) for target in args.targets]
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    for result in results:
+        if "error" in result:
+            print(f"{result['target']:<14} FAILED: {result['error']}")
+            continue
+        heaviest = ", ".join(f"{row['module']} {row['cumulative_ms']:.0f} ms" for row in result["heaviest"][:3])
+        print(f"{result['target']:<14} {result['import_ms']:8.1f} ms import  "
+              f"{result['wall_ms']:8.1f} ms process  {result['modules']:5d} modules  ({heaviest})")
+
+    config.ensure_dirs()
+    with open(args.output, 'a') as f:
+        for result in results:
+            f.write(json.dumps({"time": stamp, **result}) + "\n")
+    print(f"Results appended to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import hashlib
+import importlib.util
+import logging
+import shutil
+import time
+from pathlib import Path
+import numpy as np
+from ultralytics import YOLO
+import config
+
+# Backend name -> ultralytics export format and the python package it needs at runtime
+EXPORT_FORMATS = {
+    "onnx": ("onnx", "onnxruntime"),
+    "openvino": ("openvino", "openvino"),
+}
+# INT8 backend name -> the FP32 export it is quantized from (built by quantize.py)
+INT8_VARIANTS = {
+    "onnx_int8_dynamic": "onnx",
+    "onnx_int8_static": "onnx",
+    "openvino_int8": "openvino",
+}
+
+
+def detect_device():
+    # Pick the best device torch can see: CUDA, Apple MPS, then CPU
+    if config.INFERENCE_DEVICE != "auto":
+        return config.INFERENCE_DEVICE
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    if torch.cuda.is_available():
+        return "0"
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def weights_hash(weights_path, length = 12):
+    digest = hashlib.sha256()
+    with open(weights_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+class InferenceBackend:
+    """
+    Loads the detection model for PETDetection.
+    On CPU the .pt weights are exported once to ONNX Runtime or OpenVINO and the
+    artefact is cached under models/exports, keyed by the weights hash.
+    """
+    def __init__(self, weights = None, backend = None, device = None, imgsz = None):
+        self.weights = Path(weights or config.MODEL_PATH)
+        self.device = device or detect_device()
+        self.imgsz = imgsz or config.INFERENCE_IMG_SIZE
+        self.backend = self._resolve_backend(backend or config.INFERENCE_BACKEND)
+
+    def _resolve_backend(self, backend):
+        if backend != "auto":
+            return backend
+        # GPUs run the PyTorch weights directly, CPUs use the first installed runtime
+        if self.device != "cpu":
+            return "pytorch"
+        for name in config.CPU_BACKEND_PREFERENCE:
+            if importlib.util.find_spec(EXPORT_FORMATS[name][1]) is not None:
+                return name
+        return "pytorch"
+
+    def _export_path(self, name):
+        fmt = EXPORT_FORMATS[name][0]
+        key = f"{self.weights.stem}_{weights_hash(self.weights)}_{fmt}"
+        return config.EXPORT_DIR / key
+
+    def _export(self, name):
+        cache_dir = self._export_path(name)
+        if cache_dir.exists() and any(cache_dir.iterdir()):
+            logging.info(f"Using cached {name} export at {cache_dir}")
+            return next(cache_dir.iterdir())
+
+        print(f"Exporting {self.weights.name} to {name}, this only happens once per weights file...")
+        start = time.perf_counter()
+        exported = YOLO(str(self.weights)).export(
+            format = EXPORT_FORMATS[name][0],
+            imgsz = self.imgsz,
+            # Dynamic axes keep batched and resized predict calls working
+            dynamic = True,
+            device = "cpu",
+            )
+        cache_dir.mkdir(parents = True, exist_ok = True)
+        target = cache_dir / Path(exported).name
+        shutil.move(str(exported), str(target))
+        logging.info(f"Exported {self.weights.name} to {target} in {time.perf_counter() - start:.1f}s")
+        return target
+
+    def load(self):
+        model_path = self.weights
+        if self.backend in EXPORT_FORMATS or self.backend in INT8_VARIANTS:
+            try:
+                if self.backend in EXPORT_FORMATS:
+                    model_path = self._export(self.backend)
+                else:
+                    # INT8 builds live in quantize.py, which imports this module
+                    import quantize
+                    model_path = quantize.build_int8(self, self.backend)
+            except Exception as e:
+                print(f"Warning: {self.backend} export failed, falling back to PyTorch: {e}")
+                logging.warning(f"Backend {self.backend} export failed: {e}")
+                self.backend = "pytorch"
+                model_path = self.weights
+
+        model = YOLO(str(model_path), task = "detect")
+        logging.info(f"Inference backend: {self.backend} on {self.device} ({model_path})")
+        self.warmup(model)
+        return model
+
+    def warmup(self, model, runs = None):
+        # The first predict builds graphs and allocates memory, pay it at startup
+        runs = config.WARMUP_RUNS if runs is None else runs
+        if runs <= 0:
+            return
+        dummy = np.zeros((self.imgsz, self.imgsz, 3), dtype = np.uint8)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model.predict(dummy, imgsz = self.imgsz, device = self.device, verbose = False)
+        logging.info(f"Warm-up: {runs} runs in {(time.perf_counter() - start) * 1000:.0f} ms")
@@ -0,0 +1,129 @@
+import collections
+import json
+import logging
+import threading
+import time
+import config
+from metrics import REGISTRY
+
+
+class LatencyController:
+    """
+    Keeps predict latency inside a per-frame budget. Over budget it degrades in
+    steps: smaller inference size, then skipping frames, then fewer streams.
+    Under budget it restores them in reverse order.
+
+    Hysteresis: a decision needs a full window of measurements, degrading uses
+    the high water mark and upgrading the low one, and an upgrade only happens
+    when the latency scaled to the larger size still fits the budget.
+    Every change is appended to LATENCY_LOG_FILE as one JSON line.
+    """
+    def __init__(self, budget = None, sizes = None, max_skip = None, window = None, log_path = None):
+        self.budget = budget or config.LATENCY_BUDGET
+        self.sizes = sorted(sizes or config.LATENCY_IMG_SIZES)
+        self.max_skip = max_skip or config.LATENCY_MAX_SKIP
+        self.log_path = log_path or config.LATENCY_LOG_FILE
+
+        # Start at the configured size, or the nearest allowed one
+        self.size_index = min(range(len(self.sizes)),
+                              key = lambda i: abs(self.sizes[i] - config.INFERENCE_IMG_SIZE))
+        self.frame_skip = 1
+        self.stream_limit = None
+        self.stream_count = None
+
+        self._window = collections.deque(maxlen = window or config.LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+        self.imgsz_gauge = REGISTRY.gauge("latency_imgsz", "Inference size chosen by the latency controller")
+        self.skip_gauge = REGISTRY.gauge("latency_frame_skip", "Detect on one of every N frames")
+        self.streams_gauge = REGISTRY.gauge("latency_stream_limit", "Streams allowed to run detection")
+        self.decisions = REGISTRY.counter("latency_decisions", "Settings changed by the latency controller")
+        self._publish()
+
+    @property
+    def imgsz(self):
+        return self.sizes[self.size_index]
+
+    def set_stream_count(self, count):
+        # Multi-camera mode: the controller may also pause streams
+        self.stream_count = count
+        self.stream_limit = count
+        self._publish()
+
+    def stream_allowed(self, stream_id):
+        return self.stream_limit is None or stream_id < self.stream_limit
+
+    def observe(self, seconds):
+        # One predict call, returns the action taken or None
+        with self._lock:
+            self._window.append(seconds)
+            if len(self._window) < self._window.maxlen:
+                return None
+            ordered = sorted(self._window)
+            latency = ordered[min(len(ordered) - 1, int(len(ordered) * config.LATENCY_PERCENTILE / 100))]
+
+            if latency > self.budget * config.LATENCY_HIGH_WATER:
+                action = self._degrade()
+            elif latency < self.budget * config.LATENCY_LOW_WATER:
+                action = self._upgrade(latency)
+            else:
+                action = None
+            if action is None:
+                return None
+            # Measure the new settings from scratch
+            self._window.clear()
+            self._record(action, latency)
+            return action
+
+    def _degrade(self):
+        if self.size_index > 0:
+            self.size_index -= 1
+            return "imgsz_down"
+        if self.frame_skip < self.max_skip:
+            self.frame_skip += 1
+            return "skip_up"
+        if self.stream_limit is not None and self.stream_limit > config.LATENCY_MIN_STREAMS:
+            self.stream_limit -= 1
+            return "streams_down"
+        return None
+
+    def _upgrade(self, latency):
+        if self.stream_limit is not None and self.stream_limit < self.stream_count:
+            self.stream_limit += 1
+            return "streams_up"
+        if self.frame_skip > 1:
+            self.frame_skip -= 1
+            return "skip_down"
+        if self.size_index < len(self.sizes) - 1:
+            # Predict cost grows roughly with the pixel count
+            scale = (self.sizes[self.size_index + 1] / self.imgsz) ** 2
+            if latency * scale < self.budget * config.LATENCY_HIGH_WATER:
+                self.size_index += 1
+                return "imgsz_up"
+        return None
+
+    def _publish(self):
+        self.imgsz_gauge.set(self.imgsz)
+        self.skip_gauge.set(self.frame_skip)
+        if self.stream_limit is not None:
+            self.streams_gauge.set(self.stream_limit)
+
+    def _record(self, action, latency):
+        self._publish()
+        self.decisions.inc()
+        decision = {
+            "time": time.time(),
+            "action": action,
+            "latency_ms": latency * 1000,
+            "budget_ms": self.budget * 1000,
+            "imgsz": self.imgsz,
+            "frame_skip": self.frame_skip,
+            "stream_limit": self.stream_limit,
+        }
+        logging.info(f"Latency controller: {action} at p{config.LATENCY_PERCENTILE} {latency * 1000:.1f} ms "
+                     f"-> imgsz {self.imgsz}, skip {self.frame_skip}, streams {self.stream_limit}")
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(decision) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write latency decision: {e}")
@@ -0,0 +1,206 @@
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import config
+
+EVENT_LOGGER = "pet.events"
+_NUMBER = re.compile(r"\d+(\.\d+)?")
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    # Runs on the listener thread, never on the thread that logged
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets LOG_RATE_LIMIT_BURST copies of a message through per LOG_RATE_LIMIT_WINDOW
+    seconds and drops the rest. Numbers are ignored when comparing messages, so
+    "frame 812 failed" and "frame 813 failed" count as the same error. The first
+    message of the next window reports how many were dropped.
+    """
+    def __init__(self, window = None, burst = None, level = None):
+        super().__init__()
+        self.window = window or config.LOG_RATE_LIMIT_WINDOW
+        self.burst = burst or config.LOG_RATE_LIMIT_BURST
+        self.level = level or config.LOG_RATE_LIMIT_LEVEL
+        # key -> [window start, passed, suppressed]
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.name, record.levelno, _NUMBER.sub("#", str(record.msg))[:200])
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] > self.window:
+                suppressed = entry[2] if entry else 0
+                self._seen[key] = [now, 1, 0]
+                if len(self._seen) > 1024:
+                    # Forget windows that ended long ago
+                    self._seen = {k: v for k, v in self._seen.items() if now - v[0] <= self.window}
+                if suppressed:
+                    record.msg = f"{record.getMessage()} [{suppressed} similar messages suppressed]"
+                    record.args = None
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Never blocks the caller: with a full queue the record is counted and dropped
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line: time, level, event and the fields passed to log_event
+    def format(self, record):
+        event = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        event.update(getattr(record, "fields", {}))
+        return json.dumps(event, default = str)
+
+
+class _ExcludeEvents(logging.Filter):
+    def filter(self, record):
+        return not record.name.startswith(EVENT_LOGGER)
+
+
+def _file_handler(path, child):
+    if child:
+        # Worker processes leave rotation to the main process and reopen the file after it
+        return logging.handlers.WatchedFileHandler(path, encoding = 'utf-8')
+    if config.LOG_ROTATION == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when = config.LOG_ROTATE_WHEN, backupCount = config.LOG_BACKUP_COUNT, encoding = 'utf-8')
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes = config.LOG_MAX_BYTES, backupCount = config.LOG_BACKUP_COUNT, encoding = 'utf-8')
+    if config.LOG_COMPRESS:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def _build_handlers(child):
+    app_handler = _file_handler(config.LOG_FILE, child)
+    app_handler.setFormatter(logging.Formatter(config.LOG_FORMAT))
+    app_handler.addFilter(_ExcludeEvents())
+    handlers = [app_handler]
+    if config.LOG_EVENTS_ENABLED:
+        event_handler = _file_handler(config.LOG_EVENTS_FILE, child)
+        event_handler.setFormatter(JsonFormatter())
+        event_handler.addFilter(logging.Filter(EVENT_LOGGER))
+        handlers.append(event_handler)
+    return handlers
+
+
+def _reset_root(handlers, level):
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def setup_logging(level = None):
+    """
+    Configure the root logger once per process: callers only enqueue records,
+    a QueueListener thread formats them and writes the rotating app.log and
+    the JSON event log. Replaces every logging.basicConfig call.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return _queue_handler
+        config.ensure_dirs()
+        level = level or config.LOG_LEVEL
+        child = multiprocessing.parent_process() is not None
+
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize = config.LOG_QUEUE_SIZE))
+        # Filtering on the caller side: suppressed records never reach the queue
+        _queue_handler.addFilter(RateLimitFilter())
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *_build_handlers(child),
+                                                   respect_handler_level = True)
+        _listener.start()
+        _reset_root([_queue_handler], level)
+        logging.captureWarnings(True)
+        return _queue_handler
+
+
+def shutdown_logging():
+    # Drains the queue; registered with atexit so the last records reach the disk
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        if DroppingQueueHandler.dropped:
+            logging.warning(f"{DroppingQueueHandler.dropped} log records dropped on a full queue")
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = None
+        _queue_handler = None
+
+
+def _after_fork_in_child():
+    # A forked worker inherits the queue handler but not the listener thread,
+    # it writes directly to the files instead
+    global _listener, _queue_handler, _lock
+    _lock = threading.Lock()
+    if _listener is None:
+        return
+    _listener = None
+    _queue_handler = None
+    _reset_root(_build_handlers(child = True), logging.getLogger().level)
+
+
+def log_event(event, level = logging.INFO, **fields):
+    """
+    Structured record for the JSON event log (LOG_EVENTS_FILE), e.g.
+    log_event("state_change", stream = 0, to = "active").
+    """
+    logger = logging.getLogger(EVENT_LOGGER)
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra = {"fields": fields})
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child = _after_fork_in_child)
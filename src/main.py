@@ -2,11 +2,12 @@ import cv2
 from vision_module import PETDetection as PETs
 import logging
 import time
-from src import config
-from kivy.app import App
-from kivy.lang import Builder
-from gui import WindowManager
+import config
+import log_setup
 import threading
+from frame_pipeline import LatestFrameBuffer, VisionPipeline
+from metrics import REGISTRY, MetricsSnapshotWriter, serve_metrics
+from frame_share import SharedFrameBuffer, serve_preview
 
 class SharedContext:
     def __init__ (self):
@@ -15,15 +16,15 @@ class SharedContext:
         self.is_running = True
         self.is_listening = False
 
+        # --- Frame exchange between pipeline stages ---
+        self.raw_frames = LatestFrameBuffer(config.PIPELINE_BUFFER_SIZE)
+        self.annotated_frames = LatestFrameBuffer(config.PIPELINE_BUFFER_SIZE)
+
 # --- GUI loop --- 
 def main():
 
     # ----- Initialize Logging -----
-    logging.basicConfig(
-        level = config.LOG_LEVEL,
-        format = config.LOG_FORMAT,
-        filename = str(config.LOG_FILE),
-    )
+    log_setup.setup_logging()
 
     try:
         # --- Take Vision system ---
@@ -34,6 +35,12 @@ def main():
         logging.error(f"Error: System can not take:{e}")
         return
 
+    # --- Several cameras share one batched model ---
+    if len(config.CAMERA_INDEXES) > 1:
+        from multi_stream import run_multi_camera
+        run_multi_camera(pet_system)
+        return
+
     # --- Camera Loading ---
     Mac_cap = cv2.VideoCapture(config.CAMERA_INDEX)
 
@@ -45,44 +52,108 @@ def main():
         print("System Running... Press 's' to get image , 'q' to exit.")
         logging.info("System status: Running")
 
-    try:
-        while True:
-            start = time.time()
-            ret, frame = Mac_cap.read()
-
-            if not ret:
-                print("Failed to receive frame, exiting...")
-                logging.error("Could not generate frame, please check camera")
-                break
-            
-            # --- Vision Loading ---
-            annotated_frame, results = pet_system.take_inference(frame)
+    # --- Metrics: localhost Prometheus endpoint and JSONL snapshots ---
+    frame_meter = REGISTRY.meter("vision_frames", "Frames shown")
+    annotate_timer = REGISTRY.timer("vision_stage_seconds", "Time per vision stage", {"stage": "annotate"})
+    display_timer = REGISTRY.timer("vision_stage_seconds", "Time per vision stage", {"stage": "display"})
+    metrics_server = metrics_writer = None
+    if config.METRICS_ENABLED:
+        try:
+            metrics_server = serve_metrics()
+        except OSError as e:
+            logging.warning(f"Metrics endpoint not started: {e}")
+        metrics_writer = MetricsSnapshotWriter().start()
+
+    context = SharedContext()
+    pipeline = VisionPipeline(Mac_cap, pet_system, context)
+    pipeline.start()
+    # --- Audio: VAD on its own thread, transcription in its own process ---
+    listener = None
+    if config.AUDIO_ENABLED:
+        from audio_listener import AudioListener
+        try:
+            listener = AudioListener(context).start()
+            listener.listen()
+        except Exception as e:
+            logging.warning(f"Audio listener not started: {e}")
+    last_report = time.time()
+
+    # --- Display: OpenCV window, Kivy MonitorScreen or headless MJPEG preview ---
+    display_mode = config.DISPLAY_MODE
+    frame_buffer = preview_server = None
+    if display_mode in ("kivy", "mjpeg"):
+        shape = None
+        if config.FRAME_SHARE_SHARED_MEMORY:
+            shape = (int(Mac_cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(Mac_cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        frame_buffer = SharedFrameBuffer(shape, shared = config.FRAME_SHARE_SHARED_MEMORY)
+    if display_mode == "mjpeg":
+        preview_server = serve_preview(frame_buffer)
+        print(f"Preview on http://127.0.0.1:{preview_server.server_port}/ , Ctrl+C to exit.")
+
+    def render_loop():
+        nonlocal last_report
+        while context.is_running:
+            item = pipeline.next_frame()
+            if item is None:
+                continue
+            start = time.perf_counter()
+            frame, raw_frame, captured_at, camera_status, overlay = item
+            frame_meter.mark()
+            REGISTRY.timer("vision_frame_latency_seconds", "Capture to display latency").observe(
+                time.time() - captured_at)
+
+            if time.time() - last_report > config.PIPELINE_REPORT_INTERVAL:
+                pipeline.log_report()
+                last_report = time.time()
+
+            # --- Draw only for a consumer: the window, a preview client or the Kivy monitor ---
+            watched = display_mode == "opencv" or frame_buffer.has_consumers()
+            # The inference stage skips the idle motion view as well
+            pipeline.watched = watched
+            if not watched:
+                pipeline.record_render(time.perf_counter() - start)
+                continue
 
             # -----show fps-----
-            fps = 1/(time.time() - start)
+            fps = frame_meter.rate
             
-            cv2.putText(annotated_frame,
-                        f"FPS: {fps:.2f}, Status: AI Idle",
-                        (10,60),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.5,
-                        (255, 0, 0),
-                        2,
-                        cv2.LINE_AA
-            )
+            annotate_start = time.perf_counter()
+            annotated_frame = pet_system.render(frame, overlay, f"FPS: {fps:.2f}, Status: {camera_status}")
+            annotate_timer.observe_since(annotate_start)
 
             
             # --- Show GUI ---
-            cv2.imshow("Read_PET", annotated_frame)
+            display_start = time.perf_counter()
+            input_key = -1
+            if frame_buffer is not None:
+                frame_buffer.publish(annotated_frame)
+            if display_mode == "opencv":
+                cv2.imshow("Read_PET", annotated_frame)
+                # Clip frames from the player worker are shown here, on the HighGUI thread
+                clip_frame = pipeline.triggers.player.take_frame() if pipeline.triggers is not None else None
+                if clip_frame is not None:
+                    cv2.imshow("PET_Player", clip_frame)
+                input_key = cv2.waitKey(1) & 0xFF
+            display_timer.observe_since(display_start)
+            pipeline.record_render(time.perf_counter() - start)
 
-            input_key = cv2.waitKey(1) & 0xFF
             if input_key == ord('q'):
                 print("System shutdown safely")
                 logging.info("System shutdown safely")
                 break
             
             elif input_key == ord('s'):
-                pet_system._img_save(annotated_frame)
+                pet_system._img_save(annotated_frame, raw_frame)
+
+    try:
+        if display_mode == "kivy":
+            # Kivy owns the main thread, rendering moves to a worker thread
+            from gui import DashboardApp
+            render_thread = threading.Thread(target = render_loop, name = "render", daemon = True)
+            render_thread.start()
+            DashboardApp(frame_buffer).run()
+        else:
+            render_loop()
 
     except KeyboardInterrupt:
         logging.info("System by pass")
@@ -93,6 +164,19 @@ def main():
         logging.error(f"System Error for {e}")
     
     finally:
+        pipeline.stop()
+        pipeline.log_report()
+        if preview_server is not None:
+            preview_server.shutdown()
+        if frame_buffer is not None:
+            frame_buffer.close()
+        if listener is not None:
+            listener.stop()
+        pet_system.close()
+        if metrics_writer is not None:
+            metrics_writer.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
         if Mac_cap.isOpened():
             Mac_cap.release()
         cv2.destroyAllWindows()
@@ -100,7 +184,7 @@ def main():
         logging.info("Camera Status: Release successfully")
 
 if __name__ == "__main__":
-    main().run()
+    main()
 
 
 
@@ -0,0 +1,264 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _label_text(key, extra = None):
+    items = list(key) + (list(extra) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount = 1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [("_total", (), self.value)]
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        return [("", (), self.value)]
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Fixed bucket histogram, observe() is one bisect and a few additions.
+    """
+    kind = "histogram"
+
+    def __init__(self, buckets = None):
+        self.buckets = list(buckets or config.METRICS_BUCKETS)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= target:
+                    return bound
+            return self.max
+
+    def samples(self):
+        rows = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            rows.append(("_bucket", (("le", f"{bound:g}"),), cumulative))
+        rows.append(("_bucket", (("le", "+Inf"),), self.count))
+        rows.append(("_sum", (), self.sum))
+        rows.append(("_count", (), self.count))
+        return rows
+
+    def snapshot(self):
+        mean = self.sum / self.count if self.count else 0.0
+        return {"count": self.count, "mean": mean, "p50": self.quantile(0.5),
+                "p95": self.quantile(0.95), "max": self.max}
+
+
+class Timer(Histogram):
+    # Histogram of durations in seconds with a context manager helper
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def observe_since(self, start):
+        self.observe(time.perf_counter() - start)
+
+
+class Meter(Counter):
+    # Event counter with an exponentially weighted events-per-second rate
+
+    def __init__(self, alpha = None):
+        super().__init__()
+        self.alpha = alpha or config.METRICS_RATE_ALPHA
+        self.rate = 0.0
+        self._last = None
+
+    def mark(self, amount = 1):
+        now = time.perf_counter()
+        with self._lock:
+            self.value += amount
+            if self._last is not None:
+                interval = now - self._last
+                if interval > 0:
+                    self.rate += self.alpha * (amount / interval - self.rate)
+            self._last = now
+
+    def snapshot(self):
+        return {"total": self.value, "rate": self.rate}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels):
+        key = _label_key(labels)
+        family = self._families.get(name)
+        if family is None or key not in family["metrics"]:
+            with self._lock:
+                family = self._families.setdefault(
+                    name, {"cls": cls, "help": help_text, "metrics": {}})
+                family["metrics"].setdefault(key, cls())
+        return family["metrics"][key]
+
+    def counter(self, name, help_text = "", labels = None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text = "", labels = None):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text = "", labels = None):
+        return self._get(Histogram, name, help_text, labels)
+
+    def timer(self, name, help_text = "", labels = None):
+        return self._get(Timer, name, help_text, labels)
+
+    def meter(self, name, help_text = "", labels = None):
+        return self._get(Meter, name, help_text, labels)
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            families = list(self._families.items())
+        for name, family in families:
+            kind = family["cls"].kind
+            if family["help"]:
+                lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in list(family["metrics"].items()):
+                for suffix, extra, value in metric.samples():
+                    lines.append(f"{name}{suffix}{_label_text(key, extra)} {value}")
+            if issubclass(family["cls"], Meter):
+                # A counter family only holds _total, the rate is its own gauge family
+                lines.append(f"# HELP {name}_rate Events per second of {name}")
+                lines.append(f"# TYPE {name}_rate gauge")
+                for key, metric in list(family["metrics"].items()):
+                    lines.append(f"{name}_rate{_label_text(key)} {metric.rate}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        data = {}
+        with self._lock:
+            families = list(self._families.items())
+        for name, family in families:
+            for key, metric in list(family["metrics"].items()):
+                data[f"{name}{_label_text(key)}"] = metric.snapshot()
+        return data
+
+
+# --- Process wide registry used by the vision loop ---
+REGISTRY = MetricsRegistry()
+
+
+def serve_metrics(registry = REGISTRY, port = None, host = "127.0.0.1"):
+    # Prometheus text endpoint on localhost, served from a daemon thread
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port or config.METRICS_PORT), _Handler)
+    thread = threading.Thread(target = server.serve_forever, name = "metrics-http", daemon = True)
+    thread.start()
+    logging.info(f"Metrics endpoint on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+class MetricsSnapshotWriter:
+    """
+    Appends one JSON line with every metric to logs/metrics.jsonl at a fixed interval.
+    """
+    def __init__(self, registry = REGISTRY, path = None, interval = None):
+        self.registry = registry
+        self.path = path or config.METRICS_SNAPSHOT_FILE
+        self.interval = interval or config.METRICS_SNAPSHOT_INTERVAL
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._loop, name = "metrics-snapshot", daemon = True)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        line = json.dumps({"ts": time.time(), "metrics": self.registry.snapshot()})
+        try:
+            with open(self.path, 'a') as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logging.error(f"Metrics snapshot failed: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.write()
@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+import config
+
+
+class MotionGate:
+    """
+    Low cost motion detector for the idle state.
+    Frames are downscaled before differencing, only every Nth frame is analysed
+    and all intermediate images live in buffers allocated once per stream.
+    """
+    def __init__(self, scale = None, sample_every = None, blur_size = None,
+                 pixel_threshold = None, roi_margin = None):
+        self.scale = scale or config.MOTION_SCALE
+        self.sample_every = max(1, sample_every or config.MOTION_SAMPLE_EVERY)
+        self.blur_size = blur_size or config.MOTION_BLUR_SIZE
+        self.pixel_threshold = pixel_threshold or config.MOTION_PIXEL_THRESHOLD
+        self.roi_margin = config.MOTION_ROI_MARGIN if roi_margin is None else roi_margin
+
+        self.frame_index = 0
+        self._shape = None
+        self._primed = False
+        self._display_slot = 0
+
+        # --- Last result, returned on frames that are not sampled ---
+        self.changed_pixels = 0
+        self.roi = None
+
+    def _allocate(self, frame):
+        h, w = frame.shape[:2]
+        small_w = max(1, int(w * self.scale))
+        small_h = max(1, int(h * self.scale))
+        self._shape = frame.shape
+        self._small_size = (small_w, small_h)
+        self._small = np.empty((small_h, small_w, 3), dtype = np.uint8)
+        self._gray = np.empty((small_h, small_w), dtype = np.uint8)
+        self._blur = np.empty((small_h, small_w), dtype = np.uint8)
+        self._prev = np.empty((small_h, small_w), dtype = np.uint8)
+        self._delta = np.empty((small_h, small_w), dtype = np.uint8)
+        self._mask = np.zeros((small_h, small_w), dtype = np.uint8)
+        self._mask_bgr = np.empty((small_h, small_w, 3), dtype = np.uint8)
+        # A few display buffers so the render thread never reads a frame being rewritten
+        self._display = [np.zeros((h, w, 3), dtype = np.uint8)
+                         for _ in range(config.MOTION_DISPLAY_BUFFERS)]
+        self._primed = False
+
+    def update(self, frame):
+        """
+        Returns (sampled, changed_pixels, roi). changed_pixels is scaled back to
+        full resolution, roi is (x, y, w, h) in full resolution or None.
+        """
+        if self._shape != frame.shape:
+            self._allocate(frame)
+
+        self.frame_index += 1
+        if self._primed and self.frame_index % self.sample_every:
+            return False, self.changed_pixels, self.roi
+
+        # --- Preprocessing on the downscaled frame ---
+        cv2.resize(frame, self._small_size, dst = self._small, interpolation = cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst = self._gray)
+        cv2.GaussianBlur(self._gray, (self.blur_size, self.blur_size), 0, dst = self._blur)
+
+        if not self._primed:
+            self._prev, self._blur = self._blur, self._prev
+            self._primed = True
+            return True, 0, None
+
+        # --- Binarization ---
+        cv2.absdiff(self._prev, self._blur, dst = self._delta)
+        cv2.threshold(self._delta, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst = self._mask)
+        white_count = cv2.countNonZero(self._mask)
+
+        # Swap instead of copy, the current blur becomes the reference frame
+        self._prev, self._blur = self._blur, self._prev
+
+        self.changed_pixels = int(white_count / (self.scale * self.scale))
+        self.roi = self._bounding_roi() if white_count else None
+        return True, self.changed_pixels, self.roi
+
+    def _bounding_roi(self):
+        x, y, w, h = cv2.boundingRect(self._mask)
+        frame_h, frame_w = self._shape[:2]
+        inv = 1.0 / self.scale
+        margin = self.roi_margin
+        x0 = max(0, int(x * inv) - margin)
+        y0 = max(0, int(y * inv) - margin)
+        x1 = min(frame_w, int((x + w) * inv) + margin)
+        y1 = min(frame_h, int((y + h) * inv) + margin)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def display(self):
+        # Full size BGR view of the latest motion mask, drawn into a reused buffer
+        if self._shape is None:
+            return None
+        frame_h, frame_w = self._shape[:2]
+        self._display_slot = (self._display_slot + 1) % len(self._display)
+        target = self._display[self._display_slot]
+        cv2.cvtColor(self._mask, cv2.COLOR_GRAY2BGR, dst = self._mask_bgr)
+        cv2.resize(self._mask_bgr, (frame_w, frame_h), dst = target, interpolation = cv2.INTER_NEAREST)
+        return target
+
+    def reset(self):
+        self._primed = False
+        self.changed_pixels = 0
+        self.roi = None
@@ -0,0 +1,221 @@
+import cv2
+import logging
+import threading
+import time
+import config
+from event_store import DetectionEventTracker, EventStore
+from frame_pipeline import LatestFrameBuffer, StageStats
+from vision_module import StreamState
+
+
+class CameraStream:
+    def __init__(self, stream_id, source):
+        self.stream_id = stream_id
+        self.source = source
+        self.capture = None
+        self.state = StreamState(stream_id)
+        self.frames = LatestFrameBuffer(config.PIPELINE_BUFFER_SIZE)
+        self.outputs = LatestFrameBuffer(config.PIPELINE_BUFFER_SIZE)
+        self.stats = StageStats(f"camera-{stream_id}")
+        # Detection events of this camera for the calendar
+        self.events = None
+
+
+class MultiStreamDetector:
+    """
+    Watches several cameras with one PETDetection model.
+    Frames of active streams are collected into one batched predict call,
+    idle streams only run the cheap motion gate.
+    """
+    def __init__(self, detector, max_batch = None, max_wait = None):
+        self.detector = detector
+        self.max_batch = max_batch or config.BATCH_MAX_SIZE
+        self.max_wait = config.BATCH_MAX_WAIT if max_wait is None else max_wait
+
+        self.streams = {}
+        # One store shared by the per-camera event trackers
+        self.store = EventStore() if config.EVENT_STORE_ENABLED else None
+        self.is_running = False
+        self._frame_event = threading.Event()
+        self._threads = []
+
+        self.batch_count = 0
+        self.batched_frames = 0
+        self.predict_time = 0.0
+
+    def add_stream(self, stream_id, source):
+        stream = CameraStream(stream_id, source)
+        stream.capture = cv2.VideoCapture(source)
+        if not stream.capture.isOpened():
+            logging.error(f"Camera {source} could not be opened.")
+            print(f"Error: No camera input on {source}, please check...")
+            return None
+        if self.store is not None:
+            stream.events = DetectionEventTracker(self.store, self.detector.class_name, camera = stream_id)
+        self.streams[stream_id] = stream
+        return stream
+
+    def _record_event(self, stream, output):
+        # output is the (frame, results, camera_status, detected_classes) of take_inference / apply_detection
+        if stream.events is not None:
+            _, results, camera_status, detected_classes = output
+            stream.events.update(camera_status, detected_classes, results)
+
+    # --- Capture: one thread per camera ---
+    def _capture_loop(self, stream):
+        while self.is_running:
+            ret, frame = stream.capture.read()
+            if not ret:
+                logging.error(f"Camera {stream.source} stopped delivering frames")
+                break
+            stream.frames.put((frame, time.time()))
+            self._frame_event.set()
+        stream.frames.close()
+
+    # --- Batching ---
+    def _collect_ready(self):
+        # Wait for the first frame, then up to max_wait for the batch to fill
+        self._frame_event.wait(0.5)
+        deadline = time.perf_counter() + self.max_wait
+        while self.is_running:
+            self._frame_event.clear()
+            ready = [stream for stream in self.streams.values() if stream.frames.peek() is not None]
+            remaining = deadline - time.perf_counter()
+            if len(ready) >= min(self.max_batch, len(self.streams)) or remaining <= 0:
+                return ready
+            self._frame_event.wait(remaining)
+        return []
+
+    def _batch_loop(self):
+        while self.is_running:
+            batch = []
+            for stream in self._collect_ready():
+                item = stream.frames.get(timeout = 0)
+                if item is None:
+                    continue
+                frame, captured_at = item
+
+                # Streams paused by the latency controller keep showing their last frame
+                controller = self.detector.controller
+                if controller is not None and not controller.stream_allowed(stream.stream_id):
+                    continue
+
+                if (stream.state.camera_status == 1 and len(batch) < self.max_batch
+                        and self.detector.wants_detection(stream.state)):
+                    batch.append((stream, frame, captured_at))
+                    continue
+
+                # Idle streams stay on the motion gate, tracked streams on the tracker
+                start = time.perf_counter()
+                output = self.detector.take_inference(frame, stream.state.camera_status, stream.state)
+                stream.stats.record(time.perf_counter() - start)
+                self._record_event(stream, output)
+                stream.outputs.put((output, captured_at, stream.state.overlay))
+
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        start = time.perf_counter()
+        try:
+            results = self.detector.predict([frame for _, frame, _ in batch])
+        except Exception as e:
+            logging.error(f"Batched inference error: {e}")
+            return
+        elapsed = time.perf_counter() - start
+
+        self.batch_count += 1
+        self.batched_frames += len(batch)
+        self.predict_time += elapsed
+
+        for (stream, frame, captured_at), result in zip(batch, results):
+            output = self.detector.apply_detection(frame, result, 1, stream.state, elapsed / len(batch))
+            stream.stats.record(elapsed / len(batch))
+            self._record_event(stream, output)
+            stream.outputs.put((output, captured_at, stream.state.overlay))
+
+    def start(self):
+        self.is_running = True
+        if self.detector.controller is not None:
+            self.detector.controller.set_stream_count(len(self.streams))
+        for stream in self.streams.values():
+            thread = threading.Thread(target = self._capture_loop, args = (stream,),
+                                      name = f"capture-{stream.stream_id}", daemon = True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target = self._batch_loop, name = "batch-inference", daemon = True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self.is_running = False
+        self._frame_event.set()
+        for thread in self._threads:
+            thread.join(timeout = 2)
+        for stream in self.streams.values():
+            stream.outputs.close()
+            if stream.events is not None:
+                stream.events.close()
+            if stream.capture is not None and stream.capture.isOpened():
+                stream.capture.release()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def report(self):
+        rows = []
+        for stream in self.streams.values():
+            row = stream.stats.snapshot()
+            row["dropped"] = stream.frames.dropped
+            rows.append(row)
+        avg_batch = self.batched_frames / self.batch_count if self.batch_count else 0.0
+        avg_ms = self.predict_time / self.batch_count * 1000 if self.batch_count else 0.0
+        line = f"Batches: {self.batch_count}, avg size {avg_batch:.2f}, avg predict {avg_ms:.1f} ms"
+        print(line)
+        logging.info(line)
+        for row in rows:
+            line = (f"Stream {row['stage']}: {row['fps']:.2f} fps, "
+                    f"avg {row['avg_ms']:.1f} ms per frame, dropped {row['dropped']}")
+            print(line)
+            logging.info(line)
+        return rows
+
+
+def run_multi_camera(detector, sources = None):
+    # Display loop for multi-camera mode, one window per camera
+    multi = MultiStreamDetector(detector)
+    for stream_id, source in enumerate(sources or config.CAMERA_INDEXES):
+        multi.add_stream(stream_id, source)
+    if not multi.streams:
+        return
+
+    print("Multi-camera system running... Press 'q' to exit.")
+    logging.info(f"System status: Running {len(multi.streams)} cameras")
+    multi.start()
+    last_report = time.time()
+
+    try:
+        while multi.is_running:
+            for stream in multi.streams.values():
+                item = stream.outputs.get(timeout = 0)
+                if item is None:
+                    continue
+                (frame, _, _, _), _, overlay = item
+                if frame is not None:
+                    # Drawn here, every window is shown right away so one buffer per size is enough
+                    cv2.imshow(f"Read_PET_{stream.stream_id}", detector.render(frame, overlay))
+
+            if time.time() - last_report > config.PIPELINE_REPORT_INTERVAL:
+                multi.report()
+                last_report = time.time()
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("System shutdown safely")
+                logging.info("System shutdown safely")
+                break
+    except KeyboardInterrupt:
+        logging.info("System by pass")
+    finally:
+        multi.stop()
+        multi.report()
+        cv2.destroyAllWindows()
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+import config
+
+# BGR colours per class id, other classes fall back to the first one
+CLASS_COLORS = {0: (56, 56, 255), 15: (255, 149, 0), 16: (0, 200, 255)}
+STATUS_COLOR = (255, 0, 0)
+
+
+class Overlay:
+    """
+    Boxes to draw on one frame: xyxy, conf and cls numpy arrays.
+    The inference stage only records them, drawing is left to the renderer
+    of whoever displays the frame.
+    """
+    __slots__ = ("boxes", "conf", "cls")
+
+    def __init__(self, boxes = None, conf = None, cls = None):
+        self.boxes = np.zeros((0, 4), dtype = np.float32) if boxes is None else boxes
+        self.conf = np.zeros(0, dtype = np.float32) if conf is None else conf
+        self.cls = np.zeros(0, dtype = np.int64) if cls is None else cls
+
+    @classmethod
+    def from_result(cls, result):
+        boxes = result.boxes
+        return cls(boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int))
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+class OverlayRenderer:
+    """
+    Draws boxes, labels and the status line in place into a display buffer that
+    is reused for every frame of the same size, instead of the new copy
+    Results.plot() allocates per frame. Call it only when someone looks at the
+    frame; copy = True returns a fresh array for consumers that keep the frame.
+    """
+    def __init__(self, names, font_scale = None, thickness = None):
+        self.names = names
+        self.font_scale = font_scale or config.OVERLAY_FONT_SCALE
+        self.thickness = thickness or config.OVERLAY_LINE_WIDTH
+        # One buffer per frame size, multi-camera windows may differ
+        self._buffers = {}
+        self._label_sizes = {}
+
+    def _buffer(self, frame):
+        buffer = self._buffers.get(frame.shape)
+        if buffer is None:
+            buffer = np.empty_like(frame)
+            self._buffers[frame.shape] = buffer
+        return buffer
+
+    def _label_size(self, text):
+        # Text metrics only depend on the string, labels repeat every frame
+        size = self._label_sizes.get(text)
+        if size is None:
+            size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 1)
+            if len(self._label_sizes) < 1024:
+                self._label_sizes[text] = size
+        return size
+
+    def render(self, frame, overlay = None, status = None, copy = False):
+        target = frame.copy() if copy else self._buffer(frame)
+        if not copy:
+            np.copyto(target, frame)
+        if overlay is not None and len(overlay):
+            self.draw_boxes(target, overlay)
+        if status:
+            cv2.putText(target, status, (10, 60), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5, STATUS_COLOR, 2, cv2.LINE_AA)
+        return target
+
+    def draw_boxes(self, target, overlay):
+        height, width = target.shape[:2]
+        boxes = np.clip(overlay.boxes, 0, [width - 1, height - 1, width - 1, height - 1]).astype(int)
+        for (x1, y1, x2, y2), conf, cls in zip(boxes.tolist(), overlay.conf.tolist(), overlay.cls.tolist()):
+            color = CLASS_COLORS.get(cls, CLASS_COLORS[0])
+            cv2.rectangle(target, (x1, y1), (x2, y2), color, self.thickness)
+            label = f"{self.names.get(cls, cls)} {conf:.2f}"
+            (text_w, text_h), baseline = self._label_size(label)
+            # Label above the box, inside it when the box touches the top edge
+            top = y1 - text_h - baseline if y1 >= text_h + baseline else y1
+            cv2.rectangle(target, (x1, top), (x1 + text_w, top + text_h + baseline), color, -1)
+            cv2.putText(target, label, (x1, top + text_h), cv2.FONT_HERSHEY_SIMPLEX,
+                        self.font_scale, (255, 255, 255), 1, cv2.LINE_AA)
+        return target
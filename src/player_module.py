@@ -1,37 +1,347 @@
-import time
+import collections
+import logging
+import queue
 import threading
+import time
+from pathlib import Path
+import cv2
+import config
+from log_setup import log_event
+from metrics import REGISTRY
+
+
+class Clip:
+    # JPEG-encoded frames of one media file, decoded again one frame at a time when played
+    def __init__(self, frames, fps):
+        self.frames = frames
+        self.fps = fps
+        self.nbytes = sum(frame.nbytes for frame in frames)
+
+    def __iter__(self):
+        for frame in self.frames:
+            yield cv2.imdecode(frame, cv2.IMREAD_COLOR)
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class ClipCache:
+    """
+    Played clips kept in memory as JPEG frames, least recently used evicted first
+    once the total size passes max_bytes. A clip is cached once per file version
+    (size and mtime), so repeated triggers never touch the disk.
+    A clip that is not cached plays while it decodes; it is encoded into the cache
+    on the way, unless it outgrows max_bytes, then it keeps streaming from disk.
+    """
+    def __init__(self, max_bytes = None, scale = None, quality = None):
+        self.max_bytes = max_bytes or config.PLAYER_CACHE_MB * 1024 * 1024
+        self.scale = scale or config.PLAYER_SCALE
+        self.quality = quality or config.PLAYER_JPEG_QUALITY
+        self._clips = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = REGISTRY.counter("player_cache_hits", "Clips served from memory")
+        self.misses = REGISTRY.counter("player_cache_misses", "Clips decoded from disk")
+        self.size_gauge = REGISTRY.gauge("player_cache_bytes", "Encoded clip bytes held in memory")
+
+    @staticmethod
+    def _key(path):
+        stat = path.stat()
+        return str(path), stat.st_size, int(stat.st_mtime)
+
+    def _stream(self, path, key):
+        capture = cv2.VideoCapture(str(path))
+        fps = capture.get(cv2.CAP_PROP_FPS) or 10
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        encoded, size = [], 0
+        start = time.perf_counter()
+        try:
+            while True:
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                if self.scale != 1.0:
+                    frame = cv2.resize(frame, None, fx = self.scale, fy = self.scale, interpolation = cv2.INTER_AREA)
+                if encoded is not None:
+                    ok, jpeg = cv2.imencode(".jpg", frame, params)
+                    size += jpeg.nbytes
+                    if size > self.max_bytes:
+                        # Over budget: stop collecting, the rest of the clip only streams
+                        logging.warning(f"Clip {path.name} is larger than the player cache, it is not kept")
+                        encoded = None
+                    else:
+                        encoded.append(jpeg)
+                yield frame, fps
+        finally:
+            capture.release()
+        # Only reached when the clip was read to the end
+        if encoded:
+            logging.info(f"Player cached {path.name}: {len(encoded)} frames, "
+                         f"{size / 1e6:.1f} MB in {(time.perf_counter() - start) * 1000:.0f} ms")
+            self._store(key, Clip(encoded, fps))
+
+    def _store(self, key, clip):
+        with self._lock:
+            self._clips[key] = clip
+            self.bytes += clip.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._clips.popitem(last = False)
+                self.bytes -= evicted.nbytes
+            self.size_gauge.set(self.bytes)
+
+    def frames(self, path):
+        # (frame, fps) pairs of the clip, from memory when cached, straight from the decoder otherwise
+        key = self._key(path)
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is not None:
+                self._clips.move_to_end(key)
+        if clip is not None:
+            self.hits.inc()
+            return ((frame, clip.fps) for frame in clip)
+        self.misses.inc()
+        return self._stream(path, key)
+
+    def load(self, path):
+        # Decode and cache without playing, for preloading
+        for _ in self.frames(path):
+            pass
+
+    def __len__(self):
+        return len(self._clips)
+
 
 class VideoPlayer:
     """
-    Independent Video Player Module designed for asynchronous execution.
+    Playback engine with one long-lived worker thread fed by a command queue.
+    trigger_play() only enqueues and returns, clips come from the ClipCache
+    and frames are paced against the clip fps on a monotonic clock.
+    The worker never opens a window (HighGUI is not thread safe): frames go to
+    on_frame, or wait in a latest-frame slot for the render loop (take_frame).
     """
-    def __init__(self):
-        self.is_playing = False
+    def __init__(self, on_frame = None, cache = None):
+        self.on_frame = on_frame
+        self._frame = None
+        self._frame_lock = threading.Lock()
+        self.cache = ClipCache() if cache is None else cache
+        self._commands = queue.Queue(maxsize = config.PLAYER_QUEUE_SIZE)
+        self._playing = threading.Event()
+        self._interrupt = threading.Event()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._busy_lock = threading.Lock()
+        self.latency = REGISTRY.timer("player_trigger_latency_seconds", "Detection to first played frame")
+        self.ignored = REGISTRY.counter("player_triggers_ignored", "Triggers dropped while busy or queue full")
 
-    def _play_logic(self, video_name):
-        # Simulate a blocking playback process
-        self.is_playing = True
-        print(f"[Player] Initializing media: {video_name}")
-        
-        # Simulate video duration
-        for second in range(1, 4):
-            print(f"[Player] Playing... {second}s")
-            time.sleep(1)
-        
-        print("[Player] Playback completed.")
-        self.is_playing = False
+    @property
+    def is_playing(self):
+        return self._playing.is_set()
+
+    def start(self):
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target = self._run, name = "player", daemon = True)
+                self._worker.start()
+        return self
+
+    def _resolve(self, video_name):
+        # Accept a full path or a clip name from data/clips
+        for candidate in (Path(video_name), config.CLIP_DIR / video_name):
+            if candidate.is_file():
+                return candidate
+        return None
 
-    def trigger_play(self, video_name):
+    def _send(self, command):
+        self.start()
+        try:
+            self._commands.put_nowait(command)
+            return True
+        except queue.Full:
+            self.ignored.inc()
+            logging.warning(f"Player command queue full, {command[0]} dropped")
+            return False
+
+    def trigger_play(self, video_name, requested_at = None):
         """
-        Creates a new thread to run the playback logic without blocking the caller.
+        Queues a clip for the worker without blocking the caller.
+        requested_at (time.time() of the detection) is the start of the latency measurement.
         """
-        if not self.is_playing:
-            # Create a detached thread for video playback
-            playback_thread = threading.Thread(
-                target=self._play_logic, 
-                args=(video_name,),
-                daemon=True # Ensures the thread exits when the main program stops
-            )
-            playback_thread.start()
+        with self._busy_lock:
+            if self.is_playing:
+                self.ignored.inc()
+                print("[System Notice] Player is busy. Trigger ignored.")
+                return False
+            # Busy from the moment the clip is queued, the worker clears it when done
+            self._playing.set()
+        if not self._send(("play", video_name, requested_at or time.time())):
+            self._playing.clear()
+            return False
+        return True
+
+    def take_frame(self):
+        # Newest clip frame not shown yet, for the thread that owns the display
+        with self._frame_lock:
+            frame, self._frame = self._frame, None
+        return frame
+
+    def preload(self, video_name):
+        # Decode into the cache ahead of the first trigger
+        return self._send(("preload", video_name, None))
+
+    def interrupt(self):
+        # Ends the clip that is playing now
+        self._interrupt.set()
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._interrupt.set()
+        # Queued clips are dropped, otherwise the next one would start playing
+        while True:
+            try:
+                self._commands.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self._commands.put(None, timeout = 1)
+        except queue.Full:
+            pass
+        self._worker.join(timeout = 2)
+        self._worker = None
+
+    # --- Worker ---
+    def _run(self):
+        while True:
+            command = self._commands.get()
+            if command is None:
+                break
+            action, video_name, requested_at = command
+            try:
+                if action == "preload":
+                    path = self._resolve(video_name)
+                    if path is not None:
+                        self.cache.load(path)
+                elif action == "play":
+                    self._play_logic(video_name, requested_at)
+            except Exception as e:
+                logging.error(f"Player {action} {video_name} failed: {e}")
+                self._playing.clear()
+
+    def _play_logic(self, video_name, requested_at):
+        self._interrupt.clear()
+        print(f"[Player] Initializing media: {video_name}")
+
+        path = self._resolve(video_name)
+        if path is not None:
+            self._play_clip(self.cache.frames(path), requested_at)
         else:
-            print("[System Notice] Player is busy. Trigger ignored.")
\ No newline at end of file
+            logging.warning(f"Player: no playable clip {video_name}")
+            # Simulate video duration
+            for second in range(1, 4):
+                print(f"[Player] Playing... {second}s")
+                if self._interrupt.wait(1):
+                    break
+
+        print("[Player] Playback completed.")
+        self._playing.clear()
+
+    def _show(self, frame):
+        if self.on_frame is not None:
+            self.on_frame(frame)
+        else:
+            with self._frame_lock:
+                self._frame = frame
+
+    def _play_clip(self, frames, requested_at):
+        next_due = time.monotonic()
+        played = 0
+        fps = None
+        try:
+            for frame, fps in frames:
+                if self._interrupt.is_set():
+                    break
+                self._show(frame)
+                if played == 0:
+                    latency = time.time() - requested_at
+                    self.latency.observe(latency)
+                    logging.info(f"Player: detection to first frame {latency * 1000:.0f} ms")
+                played += 1
+                # Paced against the schedule, slow frames do not stretch the clip
+                next_due += 1.0 / fps
+                remaining = next_due - time.monotonic()
+                if remaining > 0:
+                    self._interrupt.wait(remaining)
+        finally:
+            # An interrupted stream releases its decoder and is not cached
+            close = getattr(frames, "close", None)
+            if close is not None:
+                close()
+        if fps:
+            print(f"[Player] Played {played} frames ({played / fps:.1f}s)")
+
+
+class TriggerRule:
+    """
+    Plays `clip` once any of `classes` was detected for `debounce` seconds
+    without a gap longer than PLAYER_RULE_GAP, then stays quiet for `cooldown`.
+    """
+    def __init__(self, name, classes, clip, debounce = None, cooldown = None):
+        self.name = name
+        self.classes = set(classes)
+        self.clip = clip
+        self.debounce = config.PLAYER_DEBOUNCE if debounce is None else debounce
+        self.cooldown = config.PLAYER_COOLDOWN if cooldown is None else cooldown
+        self.first_seen = None
+        self.last_seen = None
+        self.last_fired = None
+
+    def update(self, detected_classes, now, ready = True):
+        # True when the rule may fire on this frame; the engine sets last_fired once the clip is queued
+        if self.classes.isdisjoint(detected_classes):
+            if self.last_seen is not None and now - self.last_seen > config.PLAYER_RULE_GAP:
+                self.first_seen = self.last_seen = None
+            return False
+        if self.first_seen is None:
+            self.first_seen = now
+        self.last_seen = now
+        if now - self.first_seen < self.debounce:
+            return False
+        if not ready or (self.last_fired is not None and now - self.last_fired < self.cooldown):
+            return False
+        return True
+
+
+class TriggerEngine:
+    """
+    Turns the detected_classes of each take_inference call into playback.
+    Rules come from config.PLAYER_RULES, their clips are preloaded on start.
+    """
+    def __init__(self, player = None, rules = None):
+        self.player = player or VideoPlayer()
+        self.rules = [TriggerRule(**rule) for rule in (rules or config.PLAYER_RULES)]
+        self.fired = REGISTRY.counter("player_triggers_fired", "Trigger rules that fired")
+
+    def start(self):
+        self.player.start()
+        if config.PLAYER_PRELOAD:
+            for rule in self.rules:
+                self.player.preload(rule.clip)
+        return self
+
+    def update(self, detected_classes, detected_at = None):
+        now = detected_at or time.time()
+        detected = set(int(c) for c in detected_classes or ())
+        ready = not self.player.is_playing
+        for rule in self.rules:
+            # A rejected play (busy or worker down) leaves the cooldown unused
+            if rule.update(detected, now, ready) and self.player.trigger_play(rule.clip, now):
+                rule.last_fired = now
+                self.fired.inc()
+                logging.info(f"Trigger {rule.name}: playing {rule.clip}")
+                log_event("player_trigger", rule = rule.name, clip = rule.clip,
+                          classes = sorted(detected & rule.classes))
+                return rule
+        return None
+
+    def stop(self):
+        self.player.stop()
@@ -0,0 +1,232 @@
+import argparse
+import json
+import logging
+import shutil
+import sys
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from ultralytics import YOLO
+import config
+from inference_backend import INT8_VARIANTS, InferenceBackend
+
+# Variants compared by default: the FP32 baselines and every INT8 build
+DEFAULT_VARIANTS = ["pytorch", "onnx", "onnx_int8_dynamic", "onnx_int8_static", "openvino", "openvino_int8"]
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def calibration_images(image_dir = None, count = None):
+    # Evenly spaced over the sorted split, so every run calibrates on the same images
+    image_dir = Path(image_dir or config.VAL_IMAGES_DIR)
+    images = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    count = count or config.QUANT_CALIBRATION_IMAGES
+    if len(images) > count:
+        images = [images[i] for i in np.linspace(0, len(images) - 1, count).astype(int)]
+    return images
+
+
+def letterbox_tensor(img, size):
+    # Same input as ultralytics predict: centred letterbox, grey 114 padding, RGB, NCHW, 0-1
+    h0, w0 = img.shape[:2]
+    r = min(size / h0, size / w0)
+    h, w = round(h0 * r), round(w0 * r)
+    if (h, w) != (h0, w0):
+        img = cv2.resize(img, (w, h), interpolation = cv2.INTER_LINEAR)
+    top, left = (size - h) // 2, (size - w) // 2
+    canvas = np.full((size, size, 3), 114, dtype = np.uint8)
+    canvas[top:top + h, left:left + w] = img
+    return np.ascontiguousarray(canvas[..., ::-1].transpose(2, 0, 1)[None], dtype = np.float32) / 255.0
+
+
+class ImageCalibrationReader:
+    """
+    onnxruntime CalibrationDataReader over validation images (quantize_static only
+    calls get_next, so the class does not need onnxruntime at import time).
+    """
+    def __init__(self, images, input_name, size):
+        self.images = list(images)
+        self.input_name = input_name
+        self.size = size
+        self._next = 0
+
+    def get_next(self):
+        while self._next < len(self.images):
+            img = cv2.imread(str(self.images[self._next]))
+            self._next += 1
+            if img is not None:
+                return {self.input_name: letterbox_tensor(img, self.size)}
+        return None
+
+    def rewind(self):
+        self._next = 0
+
+
+def _variant_dir(backend, variant):
+    # Next to the FP32 export and keyed by the same weights hash
+    fp32_dir = backend._export_path(INT8_VARIANTS[variant])
+    return fp32_dir.with_name(f"{fp32_dir.name}_{variant.split('_', 1)[1]}")
+
+
+def _copy_onnx_metadata(source, target):
+    # ultralytics reads names / stride / imgsz from the model metadata
+    import onnx
+    model = onnx.load(str(target))
+    del model.metadata_props[:]
+    model.metadata_props.extend(onnx.load(str(source), load_external_data = False).metadata_props)
+    onnx.save(model, str(target))
+
+
+def _quantize_onnx(backend, variant, target):
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    fp32 = backend._export("onnx")
+    if variant == "onnx_int8_dynamic":
+        # Weights only, activations are quantized per batch at run time.
+        # ConvInteger on CPU takes uint8 weights.
+        quantize_dynamic(str(fp32), str(target), weight_type = QuantType.QUInt8,
+                         op_types_to_quantize = config.QUANT_OP_TYPES)
+    else:
+        source = fp32
+        try:
+            # Shape inference and graph cleanup make the calibration ranges more reliable
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+            source = target.with_name("prep.onnx")
+            quant_pre_process(str(fp32), str(source))
+        except Exception as e:
+            logging.warning(f"ONNX quantization pre-processing skipped: {e}")
+            source = fp32
+        import onnxruntime
+        input_name = onnxruntime.InferenceSession(str(source), providers = ["CPUExecutionProvider"]).get_inputs()[0].name
+        reader = ImageCalibrationReader(calibration_images(), input_name, backend.imgsz)
+        quantize_static(str(source), str(target), reader,
+                        quant_format = QuantFormat.QDQ,
+                        activation_type = QuantType.QUInt8,
+                        weight_type = QuantType.QInt8,
+                        per_channel = True,
+                        calibrate_method = CalibrationMethod.MinMax,
+                        op_types_to_quantize = config.QUANT_OP_TYPES)
+        if source != fp32:
+            source.unlink(missing_ok = True)
+    _copy_onnx_metadata(fp32, target)
+    return target
+
+
+def _quantize_openvino(backend, target_dir):
+    # ultralytics calibrates OpenVINO INT8 (NNCF) on the val split of the dataset yaml
+    exported = YOLO(str(backend.weights)).export(
+        format = "openvino",
+        int8 = True,
+        data = str(config.QUANT_DATA),
+        fraction = config.QUANT_DATA_FRACTION,
+        imgsz = backend.imgsz,
+        dynamic = True,
+        device = "cpu",
+        )
+    target = target_dir / Path(exported).name
+    shutil.move(str(exported), str(target))
+    return target
+
+
+def build_int8(backend, variant):
+    # Path of the INT8 model for a variant, quantized once per weights file
+    target_dir = _variant_dir(backend, variant)
+    if target_dir.exists() and any(target_dir.iterdir()):
+        logging.info(f"Using cached {variant} model at {target_dir}")
+        return next(target_dir.iterdir())
+
+    print(f"Quantizing {backend.weights.name} to {variant}, this only happens once per weights file...")
+    start = time.perf_counter()
+    target_dir.mkdir(parents = True, exist_ok = True)
+    try:
+        if INT8_VARIANTS[variant] == "onnx":
+            target = _quantize_onnx(backend, variant, target_dir / f"{backend.weights.stem}_int8.onnx")
+        else:
+            target = _quantize_openvino(backend, target_dir)
+    except Exception:
+        # No half-written artefact may look like a cached model next time
+        shutil.rmtree(target_dir, ignore_errors = True)
+        raise
+    logging.info(f"Quantized {backend.weights.name} to {variant} at {target} in {time.perf_counter() - start:.1f}s")
+    return target
+
+
+def model_path_for(backend, variant):
+    if variant == "pytorch":
+        return backend.weights
+    if variant in INT8_VARIANTS:
+        return build_int8(backend, variant)
+    return backend._export(variant)
+
+
+def model_size_mb(path):
+    path = Path(path)
+    files = path.rglob("*") if path.is_dir() else [path]
+    return sum(p.stat().st_size for p in files if p.is_file()) / 1e6
+
+
+def compare(variants = None, weights = None, max_images = None):
+    """
+    Accuracy next to latency for every variant on the validation split.
+    FP32 PyTorch is the reference; an INT8 variant whose mAP50 drops more than
+    QUANT_MAX_MAP_DROP below it is marked as rejected.
+    """
+    import evaluate
+    backend = InferenceBackend(weights, backend = "pytorch", device = "cpu")
+    max_images = max_images or config.EVAL_MAX_IMAGES
+    rows = []
+    for variant in variants or DEFAULT_VARIANTS:
+        try:
+            path = model_path_for(backend, variant)
+            model = YOLO(str(path), task = "detect")
+            backend.warmup(model)
+            report = evaluate.evaluate_model(model, imgsz = backend.imgsz, max_images = max_images)
+        except Exception as e:
+            print(f"{variant}: skipped ({e})")
+            logging.warning(f"Quantization compare: {variant} failed: {e}")
+            continue
+        rows.append({"variant": variant, "path": str(path), "size_mb": model_size_mb(path), **report})
+
+    reference = next((row for row in rows if row["variant"] == "pytorch"), rows[0] if rows else None)
+    for row in rows:
+        row["map50_drop"] = reference["mAP50"] - row["mAP50"]
+        row["speedup"] = reference["latency_p50_ms"] / row["latency_p50_ms"]
+        row["accepted"] = row["map50_drop"] <= config.QUANT_MAX_MAP_DROP
+
+    with open(config.QUANT_REPORT_FILE, 'a') as f:
+        f.write(json.dumps({"time": time.time(), "weights": str(backend.weights),
+                            "imgsz": backend.imgsz, "variants": rows}) + "\n")
+    return rows
+
+
+def print_report(rows):
+    if not rows:
+        print("No variant could be evaluated")
+        return
+    classes = list(rows[0]["recall"])
+    header = f"{'variant':<18} {'MB':>6} {'mAP50':>6} {'50-95':>6} " + \
+             " ".join(f"{'R ' + name:>8}" for name in classes) + f" {'p50 ms':>7} {'p95 ms':>7} {'speed':>6}"
+    print(header)
+    for row in rows:
+        recall = " ".join("       -" if row["recall"][name] is None else f"{row['recall'][name]:>8.3f}"
+                          for name in classes)
+        flag = "" if row["accepted"] else "  rejected: mAP50 drop"
+        print(f"{row['variant']:<18} {row['size_mb']:>6.1f} {row['mAP50']:>6.3f} {row['mAP50_95']:>6.3f} {recall} "
+              f"{row['latency_p50_ms']:>7.1f} {row['latency_p95_ms']:>7.1f} {row['speedup']:>5.2f}x{flag}")
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "CPU INT8 quantization with an accuracy vs latency report")
+    parser.add_argument("--variants", nargs = "+", default = None, choices = DEFAULT_VARIANTS)
+    parser.add_argument("--weights", default = None, help = "config.MODEL_PATH otherwise")
+    parser.add_argument("--images", type = int, default = None, help = "validation images evaluated per variant")
+    args = parser.parse_args(argv)
+
+    config.ensure_dirs()
+    rows = compare(args.variants, args.weights, args.images)
+    print_report(rows)
+    print(f"Report appended to {config.QUANT_REPORT_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
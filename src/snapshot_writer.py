@@ -0,0 +1,158 @@
+import collections
+import itertools
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+import cv2
+import config
+from metrics import REGISTRY
+
+# Format name -> (file suffix, cv2 quality flag)
+ENCODINGS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION),
+}
+
+
+class SnapshotWriter:
+    """
+    Background snapshot service. save() only queues the frames, encoding and disk
+    writes happen on worker threads. A full queue drops its oldest request, and the
+    snapshots are kept under a disk quota by deleting the oldest ones. Only files
+    this service wrote (SNAPSHOT_PREFIX names) count and are ever deleted, other
+    images and clips in the same folders are left alone.
+    """
+    def __init__(self, encoding = None, quality = None, workers = None, queue_size = None,
+                 quota_mb = None, result_dir = None, raw_dir = None):
+        self.encoding = encoding or config.SNAPSHOT_ENCODING
+        if self.encoding not in ENCODINGS:
+            raise ValueError(f"Unknown snapshot encoding '{self.encoding}', use one of {list(ENCODINGS)}")
+        self.quality = config.SNAPSHOT_QUALITY[self.encoding] if quality is None else quality
+        self.workers = workers or config.SNAPSHOT_WORKERS
+        self.queue_size = queue_size or config.SNAPSHOT_QUEUE_SIZE
+        self.quota_bytes = int((quota_mb or config.SNAPSHOT_QUOTA_MB) * 1024 * 1024)
+        self.result_dir = Path(result_dir or config.DATA_DIR / "result")
+        self.raw_dir = Path(raw_dir or config.DATA_DIR / "raw")
+        self.prefix = config.SNAPSHOT_PREFIX
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads = []
+        self._quota_lock = threading.Lock()
+        self._used_bytes = None
+        # Keeps file names unique for several snapshots in the same second
+        self._sequence = itertools.count()
+
+        self.dropped = REGISTRY.counter("snapshot_dropped", "Snapshots dropped on a full queue")
+        self.written = REGISTRY.counter("snapshot_written", "Snapshot files written")
+        self.evicted = REGISTRY.counter("snapshot_evicted", "Snapshot files deleted by the quota")
+        self.depth = REGISTRY.gauge("snapshot_queue_depth", "Snapshots waiting to be written")
+        self.encode_timer = REGISTRY.timer("vision_snapshot_save_seconds", "Time to save one snapshot")
+
+    def start(self):
+        self.result_dir.mkdir(parents = True, exist_ok = True)
+        self.raw_dir.mkdir(parents = True, exist_ok = True)
+        self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target = self._worker, name = f"snapshot-{i}", daemon = True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def save(self, annotated_frame, raw_frame = None, tag = "snap"):
+        # Called from the display loop: no encoding, no disk access
+        stamp = f"{time.strftime('%Y%m%d_%H%M%S')}_{next(self._sequence):05d}"
+        with self._cond:
+            if len(self._queue) >= self.queue_size:
+                self._queue.popleft()
+                self.dropped.inc()
+                logging.warning("Snapshot queue full, oldest snapshot dropped")
+            # Copies: the display loop keeps drawing into its frame buffers
+            self._queue.append((stamp, tag, annotated_frame.copy(),
+                                None if raw_frame is None else raw_frame.copy()))
+            self.depth.set(len(self._queue))
+            self._cond.notify()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and self._running:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                stamp, tag, annotated_frame, raw_frame = self._queue.popleft()
+                self.depth.set(len(self._queue))
+
+            # README layout: raw frame in data/raw, annotated frame in data/result
+            self._write(self.result_dir / f"{self.prefix}{stamp}_{tag}", annotated_frame)
+            if raw_frame is not None:
+                self._write(self.raw_dir / f"{self.prefix}{stamp}", raw_frame)
+
+    def _write(self, base_path, frame):
+        suffix, flag = ENCODINGS[self.encoding]
+        save_path = base_path.with_suffix(suffix)
+        start = time.perf_counter()
+        ok, buffer = cv2.imencode(suffix, frame, [flag, self.quality])
+        if not ok:
+            logging.warning(f"Could not encode snapshot {save_path}")
+            return
+        try:
+            with open(save_path, 'wb') as f:
+                f.write(buffer.tobytes())
+        except OSError as e:
+            print("Warning: Failing to save")
+            logging.warning(f"Could not save to {save_path}, please check path or memory: {e}")
+            return
+        self.encode_timer.observe_since(start)
+        self.written.inc()
+        logging.info(f"The image {save_path.name} was saved to {save_path}")
+        self._enforce_quota(len(buffer))
+
+    def _scan_usage(self):
+        # Snapshot files only, whatever else lives in data/raw and data/result is not ours
+        suffixes = {suffix for suffix, _ in ENCODINGS.values()}
+        files = []
+        for folder in (self.result_dir, self.raw_dir):
+            for entry in os.scandir(folder):
+                if (entry.name.startswith(self.prefix) and os.path.splitext(entry.name)[1] in suffixes
+                        and entry.is_file()):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _enforce_quota(self, added_bytes):
+        with self._quota_lock:
+            if self._used_bytes is None:
+                self._used_bytes = sum(size for _, size, _ in self._scan_usage())
+            else:
+                self._used_bytes += added_bytes
+            if self._used_bytes <= self.quota_bytes:
+                return
+
+            # Over quota: delete the oldest files until usage is back under 90% of the quota
+            files = sorted(self._scan_usage())
+            used = sum(size for _, size, _ in files)
+            target = self.quota_bytes * 0.9
+            for _, size, path in files:
+                if used <= target:
+                    break
+                try:
+                    os.remove(path)
+                    used -= size
+                    self.evicted.inc()
+                except OSError as e:
+                    logging.warning(f"Snapshot eviction failed for {path}: {e}")
+            self._used_bytes = used
+            logging.info(f"Snapshot quota enforced, {used / 1e6:.1f} MB in use")
+
+    def stop(self, timeout = 5):
+        # Let the workers drain the queue before returning
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout = timeout)
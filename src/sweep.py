@@ -0,0 +1,291 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import config
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def expand_space(space, max_trials = None, seed = 0):
+    # Grid over {param: [values]}, randomly sampled down to max_trials
+    names = sorted(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if max_trials and len(grid) > max_trials:
+        grid = random.Random(seed).sample(grid, max_trials)
+    return grid
+
+
+def trial_id(params):
+    # Stable id, the same parameters map to the same run folder after a restart
+    digest = hashlib.sha1(json.dumps(params, sort_keys = True).encode()).hexdigest()[:8]
+    return f"trial_{digest}"
+
+
+# --- Worker process ---
+def _init_worker(slots, threads):
+    # Each pool process takes one CPU slot for its lifetime, trials never share cores
+    slot = slots.get()
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    if hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        chosen = cpus[slot * threads:(slot + 1) * threads]
+        if chosen:
+            os.sched_setaffinity(0, chosen)
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+class MedianStopper:
+    """
+    on_fit_epoch_end callback: after `grace` epochs a trial whose metric is below the
+    median of the other trials at the same epoch is stopped (trainer.stop).
+    Every trial writes its per-epoch history, which is how trials in other
+    processes see each other.
+    """
+    def __init__(self, sweep_dir, trial, metric = None, grace = None, min_trials = None):
+        self.sweep_dir = Path(sweep_dir)
+        self.trial = trial
+        self.metric = metric or config.SWEEP_METRIC
+        self.grace = config.SWEEP_GRACE_EPOCHS if grace is None else grace
+        self.min_trials = min_trials or config.SWEEP_MIN_TRIALS_TO_PRUNE
+        self.history_path = self.sweep_dir / trial / "history.json"
+        self.history = self._read(self.history_path)
+        self.pruned = False
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _others_at(self, epoch):
+        values = []
+        for path in self.sweep_dir.glob("trial_*/history.json"):
+            if path == self.history_path:
+                continue
+            history = self._read(path)
+            if len(history) > epoch:
+                values.append(history[epoch])
+        return values
+
+    def __call__(self, trainer):
+        value = float(trainer.metrics.get(self.metric, 0.0))
+        epoch = trainer.epoch
+        # Resumed trials overwrite the epochs they repeat
+        del self.history[epoch:]
+        self.history.append(value)
+        tmp_path = self.history_path.with_suffix(".tmp")
+        self.history_path.parent.mkdir(parents = True, exist_ok = True)
+        with open(tmp_path, 'w') as f:
+            json.dump(self.history, f)
+        os.replace(tmp_path, self.history_path)
+
+        if epoch < self.grace:
+            return
+        others = self._others_at(epoch)
+        if len(others) < self.min_trials:
+            return
+        median = statistics.median(others)
+        if value < median:
+            self.pruned = True
+            trainer.stop = True
+            logging.info(f"{self.trial} stopped at epoch {epoch}: {self.metric} {value:.4f} < median {median:.4f}")
+
+
+def checkpoint_finished(last, epochs):
+    # True when last.pt belongs to a training that already ended: ultralytics sets
+    # epoch to -1 when it strips the final checkpoint, otherwise the last epoch is reached
+    import torch
+    try:
+        epoch = torch.load(last, map_location = "cpu", weights_only = False).get("epoch", -1)
+    except Exception as e:
+        logging.warning(f"Could not read {last}, the trial starts over: {e}")
+        return None
+    return epoch == -1 or epoch + 1 >= epochs
+
+
+def run_trial(sweep_dir, name, params, base_overrides):
+    # Runs in a pool process: train one trial, resuming from last.pt when it exists
+    import train_pt
+    sweep_dir = Path(sweep_dir)
+    run_dir = sweep_dir / name
+    last = run_dir / "weights" / "last.pt"
+    overrides = {**base_overrides, **params,
+                 "project": str(sweep_dir), "name": name, "exist_ok": True}
+    epochs = overrides.get("epochs", config.TRAIN_EPOCHS)
+
+    stopper = MedianStopper(sweep_dir, name)
+    start = time.time()
+    weights = None
+    finished = checkpoint_finished(last, epochs) if last.exists() else False
+    if finished:
+        # Training ended but the driver never recorded it, "resume" would fail every time
+        logging.info(f"{name} already finished training, recorded without training")
+        # A short history means it was stopped early, by the median stopper as a rule
+        status = "pruned" if len(stopper.history) < epochs else "done"
+    else:
+        # None: unreadable checkpoint, the trial starts over instead of resuming
+        if finished is False and last.exists():
+            weights = last
+            overrides["resume"] = True
+        results = train_pt.train_custom_model(overrides, {"on_fit_epoch_end": stopper}, weights)
+        status = "failed" if results is None else ("pruned" if stopper.pruned else "done")
+    record = {
+        "trial": name,
+        "params": params,
+        "status": status,
+        "epochs": len(stopper.history),
+        "best_metric": max(stopper.history) if stopper.history else None,
+        "seconds": time.time() - start,
+        "weights": None,
+    }
+
+    best = run_dir / "weights" / "best.pt"
+    if status != "failed" and best.exists():
+        # Keep the result where the rest of the project looks for weights
+        target = Path(config.WEIGHTS_PATH) / f"{sweep_dir.name}_{name}.pt"
+        shutil.copy2(best, target)
+        record["weights"] = str(target)
+    return record
+
+
+# --- Sweep driver ---
+class SweepRunner:
+    """
+    Schedules the trials of a search space over a process pool. state.json in
+    the sweep folder records every trial, so a restarted sweep skips finished
+    trials and resumes interrupted ones from their last checkpoint.
+    """
+    def __init__(self, space = None, name = None, workers = None, threads = None,
+                 max_trials = None, overrides = None):
+        self.space = space or config.SWEEP_SPACE
+        self.name = name or config.SWEEP_NAME
+        self.workers = workers or config.SWEEP_WORKERS
+        self.threads = threads or config.SWEEP_THREADS_PER_TRIAL
+        self.max_trials = max_trials or config.SWEEP_MAX_TRIALS
+        self.overrides = {"workers": config.SWEEP_DATALOADER_WORKERS, **(overrides or {})}
+        self.sweep_dir = Path(config.SWEEP_DIR) / self.name
+        self.state_path = self.sweep_dir / "state.json"
+        self.state = {}
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+    def _save_state(self):
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent = 2)
+        os.replace(tmp_path, self.state_path)
+
+    def run(self):
+        config.ensure_dirs()
+        self.sweep_dir.mkdir(parents = True, exist_ok = True)
+        self._load_state()
+
+        todo = []
+        for params in expand_space(self.space, self.max_trials):
+            name = trial_id(params)
+            entry = self.state.setdefault(name, {"trial": name, "params": params, "status": "pending"})
+            # Failed trials are retried too, they usually died with the machine
+            if entry["status"] in ("pending", "running", "failed"):
+                todo.append((name, params))
+        self._save_state()
+        print(f"Sweep {self.name}: {len(todo)} trials to run, {len(self.state) - len(todo)} already finished")
+        logging.info(f"Sweep {self.name} started with {len(todo)} trials, {self.workers} workers")
+
+        # spawn: CUDA / torch state must not be forked into the trials
+        context = multiprocessing.get_context("spawn")
+        slots = context.Queue()
+        for slot in range(self.workers):
+            slots.put(slot)
+        with ProcessPoolExecutor(max_workers = self.workers, mp_context = context,
+                                 initializer = _init_worker, initargs = (slots, self.threads)) as pool:
+            futures = {}
+            for name, params in todo:
+                self.state[name]["status"] = "running"
+                futures[pool.submit(run_trial, str(self.sweep_dir), name, params, self.overrides)] = name
+            self._save_state()
+
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    logging.error(f"Sweep trial {name} crashed: {e}")
+                    record = {**self.state[name], "status": "failed", "error": str(e)}
+                self.state[name] = record
+                self._save_state()
+                self.write_leaderboard()
+                print(f"{name}: {record['status']}, best {record.get('best_metric')}")
+        return self.write_leaderboard()
+
+    def write_leaderboard(self):
+        rows = sorted(self.state.values(), key = lambda row: row.get("best_metric") or -1.0, reverse = True)
+        path = self.sweep_dir / "leaderboard.csv"
+        with open(path, 'w', newline = '') as f:
+            writer = csv.writer(f)
+            writer.writerow(["rank", "trial", "status", config.SWEEP_METRIC, "epochs", "seconds", "weights", "params"])
+            for rank, row in enumerate(rows, 1):
+                metric = row.get("best_metric")
+                writer.writerow([rank, row["trial"], row["status"],
+                                 "" if metric is None else f"{metric:.4f}", row.get("epochs", ""),
+                                 f"{row['seconds']:.0f}" if row.get("seconds") else "",
+                                 row.get("weights") or "", json.dumps(row["params"], sort_keys = True)])
+        return rows
+
+
+def print_leaderboard(rows, top = 10):
+    print(f"{'rank':<5} {'trial':<15} {'status':<8} {'metric':>8}  params")
+    for rank, row in enumerate(rows[:top], 1):
+        metric = row.get("best_metric")
+        metric = "-" if metric is None else f"{metric:.4f}"
+        print(f"{rank:<5} {row['trial']:<15} {row['status']:<8} {metric:>8}  {json.dumps(row['params'], sort_keys = True)}")
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Hyperparameter sweep over train_pt")
+    parser.add_argument("--space", default = None, help = "JSON file {param: [values]}, config.SWEEP_SPACE otherwise")
+    parser.add_argument("--name", default = None)
+    parser.add_argument("--workers", type = int, default = None, help = "trials running at the same time")
+    parser.add_argument("--threads", type = int, default = None, help = "CPU threads per trial")
+    parser.add_argument("--trials", type = int, default = None, help = "sample the grid down to this many trials")
+    parser.add_argument("--epochs", type = int, default = None)
+    args = parser.parse_args(argv)
+
+    space = None
+    if args.space:
+        with open(args.space, 'r') as f:
+            space = json.load(f)
+    overrides = {"epochs": args.epochs} if args.epochs else None
+    runner = SweepRunner(space, args.name, args.workers, args.threads, args.trials, overrides)
+    print_leaderboard(runner.run())
+    print(f"Leaderboard: {runner.sweep_dir / 'leaderboard.csv'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
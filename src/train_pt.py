@@ -1,23 +1,34 @@
 from ultralytics import YOLO
-from src import config
 import logging
 import config
+import log_setup
+from inference_backend import detect_device
 
-def train_custom_model():
+def train_custom_model(overrides = None, callbacks = None, weights = None):
+    """
+    Train with the config defaults, `overrides` replaces any model.train argument,
+    `callbacks` maps ultralytics events to functions and `weights` starts from
+    another checkpoint (e.g. last.pt with overrides {"resume": True}).
+    Returns the ultralytics results, or None when training failed.
+    """
     # --- Log Loading ---
-    logging.basicConfig(
-        level = config.LOG_LEVEL,
-        format = config.LOG_FORMAT,
-        filename = config.LOG_FILE,
-        filemode = 'a'
-    )
+    log_setup.setup_logging()
 
     try:
     # --- Model Loading ---
         logging.info(f"Training process initialized with {str(config.YOLO_MODEL_NAME)}.")
-        model = YOLO(str(config.MODEL_PATH))
+        model = YOLO(str(weights or config.MODEL_PATH))
+        for event, callback in (callbacks or {}).items():
+            model.add_callback(event, callback)
 
-        results = model.train(
+        train_kwargs = {}
+        if config.IMAGE_CACHE_ENABLED:
+            # Epochs read pre-decoded images instead of decoding every JPEG again
+            import image_cache
+            image_cache.build_training_caches()
+            train_kwargs["trainer"] = image_cache.CachedDetectionTrainer
+
+        train_args = dict(
             # data: path to your dataset .yaml file
             data = config.TRAIN_DATA,
             
@@ -27,17 +38,22 @@ def train_custom_model():
             # imgsz: Input image size (standard is 640) 
             imgsz = config.IMG_SIZE,
 
-            # device: 'mps' leverages Apple Silicon GPU power if use Nvidia with '0'
-            device = "mps",
+            # device: CUDA '0', Apple Silicon 'mps' or 'cpu', detected at runtime
+            device = detect_device(),
             conf = 0.5,
             iou = 0.6,
+            **train_kwargs,
             )
+        train_args.update(overrides or {})
+        results = model.train(**train_args)
         
         print("Training finished successfully.")
+        return results
 
     except Exception as e:
         print(f"Error during training: {e}")
         logging.error(f"Training failed: {e}")
+        return None
 
 if __name__ == "__main__":
     train_custom_model()
\ No newline at end of file
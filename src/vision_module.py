@@ -1,15 +1,50 @@
-from ultralytics import YOLO
+import cv2
 import time
 import logging
-from src import config
+import config
+from motion_gate import MotionGate
+from box_tracker import BoxTracker
+from inference_backend import InferenceBackend
+from latency_controller import LatencyController
+from log_setup import log_event
+from metrics import REGISTRY
+from overlay import Overlay, OverlayRenderer
+from snapshot_writer import SnapshotWriter
 
-class PETDetection():
-    def __init__(self):
-        # --- Status Setting ---
-        self.prev_frame = None
+STATE_NAMES = {1: "active", 2: "idle"}
+
+class StreamState():
+    """
+    Detection state of one camera stream.
+    PETDetection keeps one for the single camera, multi-stream mode keeps one per camera.
+    """
+    def __init__(self, stream_id = 0):
+        self.stream_id = stream_id
+        self.motion_gate = None
         self.start_time = 0
         self.last_detection_time = 0
         self.current_duration = 0
+        self.camera_status = None
+        self.tracker = None
+        # Frames since the last YOLO pass, compared with the controller's frame skip
+        self.skipped_frames = 0
+        # Boxes of the latest frame, drawn by the consumer only when it shows the frame
+        self.overlay = None
+
+class PETDetection():
+    def __init__(self):
+        # --- Status Setting ---
+        self.state = StreamState()
+        self.stage_times = {}
+        self._stage_timers = {}
+
+
+        # --- Latency budget: adapts imgsz / frame skip to the measured predict time ---
+        self.controller = LatencyController() if config.LATENCY_CONTROL else None
+
+
+        # --- Snapshot Writer ---
+        self.snapshot_writer = SnapshotWriter().start() if config.SNAPSHOT_ASYNC else None
 
 
         self.class_name = {
@@ -17,104 +52,207 @@ class PETDetection():
             15: "Cat",
             16: "Dog",
         }
+        self.renderer = OverlayRenderer(self.class_name)
 
 
         # ----- Load and check Model -----
+        self.backend = InferenceBackend()
+        self.device = self.backend.device
         try:
-            self.model = YOLO(str(config.MODEL_PATH))
+            self.model = self.backend.load()
         except Exception as e:
             print(f"Critical Error: Could not load model: {e}")
             logging.error(f"Could not loaded model with {config.YOLO_MODEL_NAME}")
             self.model = None
 
-    def take_inference(self, frame, camera_status = None):
-        # Confidence threshold for image capture
-        import cv2
+    def _predict_kwargs(self):
+        # Shared by single frame and batched predict calls
+        return dict(
+            # take person, cat and dog from class setting
+            classes = config.YOLO_CLASS,
+            conf = config.CONFIDENCE_THRESHOLD,
+            stream = False,
+            verbose = config.VERBOSE_STATUS,
+            iou = 0.65,
+            imgsz = self.controller.imgsz if self.controller else config.INFERENCE_IMG_SIZE,
+            device = self.device,
+        )
+
+    def _record_stage(self, stage, start):
+        # Seconds spent per stage during the last take_inference call
+        elapsed = time.perf_counter() - start
+        self.stage_times[stage] = self.stage_times.get(stage, 0.0) + elapsed
+        timer = self._stage_timers.get(stage)
+        if timer is None:
+            timer = REGISTRY.timer("vision_stage_seconds", "Time per vision stage", {"stage": stage})
+            self._stage_timers[stage] = timer
+        timer.observe(elapsed)
+
+    def _set_status(self, state, camera_status):
+        if state.camera_status != camera_status:
+            REGISTRY.counter("vision_state_transitions", "camera_status changes",
+                             {"from": STATE_NAMES.get(state.camera_status, "none"),
+                              "to": STATE_NAMES.get(camera_status, "none")}).inc()
+            log_event("state_change", stream = state.stream_id,
+                      previous = STATE_NAMES.get(state.camera_status, "none"),
+                      state = STATE_NAMES.get(camera_status, "none"))
+        state.camera_status = camera_status
+
+    def predict(self, frames, observe = True):
+        # Run one predict call over a frame or a list of frames.
+        # observe = False keeps calls that are not full frame detections (ROI crops)
+        # out of the latency controller; a batch counts as its time per frame.
+        start = time.perf_counter()
+        results = self.model.predict(frames, **self._predict_kwargs())
+        self._record_stage("predict", start)
+        if self.controller is not None and observe:
+            count = len(frames) if isinstance(frames, list) else 1
+            self.controller.observe((time.perf_counter() - start) / max(1, count))
+        return results
+
+    def wants_detection(self, state = None):
+        # False while the tracker can carry the last boxes forward
+        # or the latency controller skips this frame
+        state = state or self.state
+        if self.controller is not None and state.skipped_frames + 1 < self.controller.frame_skip:
+            return False
+        if not config.TRACK_ENABLED or state.tracker is None:
+            return True
+        return state.tracker.needs_detection()
+
+    def render(self, frame, overlay = None, status = None, copy = False):
+        # Boxes and status text for a consumer that shows or saves the frame.
+        # The renderer reuses one buffer: call from one thread, or pass copy = True.
+        return self.renderer.render(frame, overlay, status, copy)
+
+    def _track_frame(self, frame, state):
+        # Skip YOLO, move the last detected boxes with the tracker
+        state.skipped_frames += 1
+        if state.tracker is None:
+            # Skipped by the latency controller with nothing to carry forward
+            return frame, None, 1, []
+        state.tracker.step()
+        state.overlay = state.tracker.overlay()
+        return frame, None, 1, state.tracker.detected_classes()
+
+    def apply_detection(self, frame, current_result, camera_status, state = None, elapsed = 0.0):
+        # Update the active state from one YOLO result
+        state = state or self.state
+        annotated_frame = frame
+        detected_classes = []
+        state.skipped_frames = 0
+        state.overlay = None
+
+        if config.TRACK_ENABLED:
+            if state.tracker is None:
+                state.tracker = BoxTracker()
+            boxes = current_result.boxes
+            state.tracker.update(boxes.xyxy.cpu().numpy(),
+                                 boxes.conf.cpu().numpy(),
+                                 boxes.cls.cpu().numpy().astype(int),
+                                 elapsed)
+
+        item_count = len(current_result.boxes)
+        if state.start_time == 0:
+            state.start_time = time.time()
+            camera_status = 1
+        else:
+            if item_count == 0:
+                state.last_detection_time = time.time() - state.start_time
+                time_end_1 = time.time() - state.last_detection_time
+                if time_end_1 > config.COOL_DOWN_TIME:
+                    camera_status = 2
+
+
+            else:
+                camera_status = 1
+                # No drawing here, the frame may never be shown
+                state.overlay = Overlay.from_result(current_result)
+                class_tensor = current_result.boxes.cls
+                if class_tensor is not None:
+                    detected_classes = list(set(class_tensor.cpu().numpy().astype(int)))
+
+        if camera_status != 1 and state.tracker is not None:
+            state.tracker.reset()
+        self._set_status(state, camera_status)
+        return annotated_frame, current_result, camera_status, detected_classes
+
+    def _confirm_wake(self, frame, roi):
+        # Wake-up YOLO pass on the motion region only, so lighting flicker
+        # does not switch a camera to the full frame active state.
+        if not config.MOTION_ROI_CONFIRM or roi is None:
+            return True
+        x, y, w, h = roi
+        if w < config.MOTION_ROI_MIN_SIZE or h < config.MOTION_ROI_MIN_SIZE:
+            return False
+        results_yolo = self.predict(frame[y:y + h, x:x + w], observe = False)
+        return len(results_yolo[0].boxes) > 0
+
+    def take_inference(self, frame, camera_status = None, state = None, watched = True):
+        # Confidence threshold for image capture.
+        # watched = False: nobody shows this frame, the idle motion view is not built
+        state = state or self.state
+        self.stage_times = {}
         annotated_frame = frame
         results_return = None
         detected_classes = []
 
         if self.model is None:
             logging.info("No frame input")
-            return frame, None, camera_status, 0, []
-        
-            
+            return frame, None, camera_status, []
+
+
         if camera_status == 1:
             self.detected_time = time.time()
-            results_yolo = self.model.predict(frame, 
-                                        # take person, cat and dog from class setting
-                                        classes = config.YOLO_CLASS,
-                                        conf = config.CONFIDENCE_THRESHOLD,
-                                        stream = False,
-                                        verbose = config.VERBOSE_STATUS,
-                                        iou = 0.65,
-                                        imgsz = 480,
-                                        device = "mps"
-                                        )
-            
-            current_result = results_yolo[0]
-            item_count = len(current_result.boxes)
-            if self.start_time == 0:
-                self.start_time = time.time()
-                camera_status = 1
-            else:
-                if item_count == 0:
-                    self.last_detection_time = time.time() - self.start_time
-                    time_end_1 = time.time() - self.last_detection_time
-                    if time_end_1 > config.COOL_DOWN_TIME:
-                        camera_status = 2
-                        annotated_frame = current_result.plot()
-                        
-
-                else:
-                    camera_status = 1
-                    annotated_frame = current_result.plot()
-                    class_tensor = current_result.boxes.cls
-                    if class_tensor is not None:
-                        detected_classes = list(set(class_tensor.cpu().numpy().astype(int)))
-        
-            results_return = current_result
+            if not self.wants_detection(state):
+                return self._track_frame(frame, state)
+            start = time.perf_counter()
+            results_yolo = self.predict(frame)
+            return self.apply_detection(frame, results_yolo[0], camera_status, state,
+                                        time.perf_counter() - start)
 
         elif camera_status == 2:
-            # --- Preprocessing ---
-            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            frame_gray_gaussian = cv2.GaussianBlur(frame_gray, (21, 21), 0)
-            
-            # --- Binarization ---
-            if self.prev_frame is None:
-                self.prev_frame = frame_gray_gaussian
-                return frame, None, 2, 0, []
-            
-            frame_delta = cv2.absdiff(self.prev_frame, frame_gray_gaussian)
-            
-            _, frame_threshold = cv2.threshold(frame_delta, 127, 255, cv2.THRESH_BINARY)
-            
-            white_count = cv2.countNonZero(frame_threshold)
-
-            self.prev_frame = frame_gray_gaussian
-            
-            if white_count > config.APPROACH_THRESHOLD:
-                self.last_detection_time = time.time()
-                time_end_2 = config.COOL_DOWN_TIME - self.last_detection_time
-                if time_end_2 > config.COOL_DOWN_TIME:
+            # --- Downscaled, sampled motion gate ---
+            if state.motion_gate is None:
+                state.motion_gate = MotionGate()
+            start = time.perf_counter()
+            sampled, white_count, roi = state.motion_gate.update(frame)
+            self._record_stage("motion_gate", start)
+            if watched:
+                # Full size debug view of the mask, costs more than the gate itself
+                start = time.perf_counter()
+                annotated_frame = state.motion_gate.display()
+                self._record_stage("motion_view", start)
+            state.overlay = None
+            camera_status = 2
+
+            if sampled and white_count > config.APPROACH_THRESHOLD:
+                state.last_detection_time = time.time()
+                if self._confirm_wake(frame, roi):
                     camera_status = 1
-                    annotated_frame = cv2.cvtColor(frame_threshold, cv2.COLOR_GRAY2BGR)
-            else:
-                camera_status = 2
-                annotated_frame = cv2.cvtColor(frame_threshold, cv2.COLOR_GRAY2BGR)
+                    state.start_time = 0
+                    state.motion_gate.reset()
 
             results_return = None
             detected_classes = []
-        
+
         else:
             camera_status = 1
             annotated_frame = None
             detected_classes = []
-        
 
+
+        self._set_status(state, camera_status)
         return annotated_frame, results_return, camera_status, detected_classes
 
-    def _img_save(self, frame):
+    def _img_save(self, frame, raw_frame = None, tag = "snap"):
+        # Queue to the background writer, the caller never waits for the disk
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.save(frame, raw_frame, tag)
+            print("Image save start :Queued ")
+            return
+
+        start = time.perf_counter()
         datetime = time.strftime("%Y%m%d_%H%M%S")
         img_name = f"pcb_snap_{datetime}.png"
         save_path = config.DATA_DIR / "result" / img_name
@@ -125,3 +263,8 @@ class PETDetection():
         else:
             print("Image save start :Successfully ")
             logging.info(f"The image {img_name} was saved to {save_path}")
+        REGISTRY.timer("vision_snapshot_save_seconds", "Time to save one snapshot").observe_since(start)
+
+    def close(self):
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.stop()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules under src/ import each other as top level modules (import config)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from box_tracker import BoxTracker
+
+SPEED = 2.0
+
+
+def _box_at(frame):
+    # 100 px box moving right at SPEED px per frame
+    x = 50 + SPEED * frame
+    return np.array([[x, 40, x + 100, 140]], dtype = np.float32)
+
+
+@pytest.mark.parametrize("interval", [1, 3, 5])
+def test_constant_velocity(interval):
+    tracker = BoxTracker(interval = interval, min_confidence = 0.0, decay = 1.0)
+    conf = np.array([0.9], dtype = np.float32)
+    cls = np.array([16])
+    for frame in range(40):
+        if tracker.needs_detection():
+            tracker.update(_box_at(frame), conf, cls)
+            continue
+        boxes, _, _ = tracker.step()
+        if tracker.detect_frames >= 2:
+            # From the second detection on: exact velocity, no oscillation, no drift
+            np.testing.assert_allclose(tracker.velocity[0], [SPEED, 0, SPEED, 0], atol = 1e-4)
+            np.testing.assert_allclose(boxes, _box_at(frame), atol = 1e-3)
+    assert tracker.detect_frames >= 2
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+import pytest
+
+ultralytics = pytest.importorskip("ultralytics")
+
+import config
+import image_cache
+
+IMG_SIZE = 64
+
+
+@pytest.fixture
+def tiny_dataset(tmp_path, monkeypatch):
+    # Eight random images with one box each, non-square so the resize matters
+    monkeypatch.setattr(config, "IMAGE_CACHE_DIR", tmp_path / "cache")
+    rng = np.random.default_rng(0)
+    for split in ("train", "val"):
+        (tmp_path / split / "images").mkdir(parents = True)
+        (tmp_path / split / "labels").mkdir(parents = True)
+        for i in range(8):
+            img = rng.integers(0, 255, (75, 101, 3), dtype = np.uint8)
+            cv2.imwrite(str(tmp_path / split / "images" / f"{i}.jpg"), img)
+            (tmp_path / split / "labels" / f"{i}.txt").write_text(f"{i % 3} 0.5 0.5 0.4 0.3\n")
+    data = tmp_path / "data.yaml"
+    data.write_text(f"path: {tmp_path}\ntrain: train/images\nval: val/images\n"
+                    "names:\n  0: cat\n  1: dog\n  2: person\n")
+    for split in ("train", "val"):
+        image_cache.ImageCache(tmp_path / split / "images", img_size = IMG_SIZE).build(workers = 2)
+    return tmp_path, data
+
+
+def test_cache_matches_ultralytics_decode(tiny_dataset):
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+
+    root, data = tiny_dataset
+    cfg = get_cfg(overrides = {"imgsz": IMG_SIZE})
+    dataset = build_yolo_dataset(cfg, str(root / "train" / "images"), 4, check_det_dataset(str(data)), mode = "val")
+    cache = image_cache.ImageCache(root / "train" / "images", img_size = IMG_SIZE)
+    for i, path in enumerate(dataset.im_files):
+        im, hw0, hw = dataset.load_image(i)
+        cached, cached_hw0, cached_hw = cache.get(path)
+        assert (hw0, hw) == (cached_hw0, cached_hw)
+        assert np.array_equal(im, cached)
+
+
+def test_training_smoke_with_mosaic(tiny_dataset):
+    from ultralytics import YOLO
+
+    root, data = tiny_dataset
+    model = YOLO("yolov8n.yaml")
+    model.train(data = str(data), trainer = image_cache.CachedDetectionTrainer, epochs = 1, imgsz = IMG_SIZE,
+                batch = 4, mosaic = 1.0, workers = 0, device = "cpu", val = False, plots = False,
+                amp = False, project = str(root / "runs"), name = "smoke", exist_ok = True)
+
+    dataset = model.trainer.train_loader.dataset
+    assert type(dataset).__name__ == "CachedYOLODataset"
+    # Mosaic draws from this buffer, cache hits have to fill it
+    assert len(dataset.buffer) > 0